@@ -1,3 +1,31 @@
 from django.contrib import admin
 
-# Register your models here.
+from projecto_condominio.admin import AdminEscalavel
+from .models import Gerente, Predio, Remocao
+
+
+@admin.register(Gerente)
+class GerenteAdmin(AdminEscalavel):
+    list_display = ('__str__', 'user', 'contacto')
+    list_select_related = ('user',)
+    search_fields = ('user__username', 'user__first_name', 'user__last_name', 'contacto')
+    autocomplete_fields = ('user',)
+    ordering = ('user__username',)
+
+
+@admin.register(Predio)
+class PredioAdmin(AdminEscalavel):
+    list_display = ('nome', 'localizacao', 'gerente')
+    list_select_related = ('gerente__user',)
+    search_fields = ('nome', 'localizacao')
+    autocomplete_fields = ('gerente',)
+    ordering = ('nome',)
+
+
+@admin.register(Remocao)
+class RemocaoAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'descricao', 'estado', 'linhas', 'passo', 'pedida_por', 'pedida_em', 'concluida_em')
+    list_filter = ('estado', 'modelo')
+    list_select_related = ('pedida_por',)
+    readonly_fields = [f.name for f in Remocao._meta.fields]
+    ordering = ('-pedida_em',)
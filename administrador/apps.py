@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AdministradorConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "administrador"
+
+    def ready(self):
+        # Regista os sinais que replicam utilizadores e gerentes para os shards.
+        from projecto_condominio import sharding  # noqa: F401
+        # E os que mantêm atualizado o índice da pesquisa global.
+        from projecto_condominio import pesquisa  # noqa: F401
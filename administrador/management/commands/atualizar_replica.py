@@ -0,0 +1,57 @@
+"""
+Atualiza a réplica só de leitura a partir da base de dados principal.
+
+    python manage.py atualizar_replica
+    python manage.py atualizar_replica --intervalo 60
+
+A cópia é feita com a API de backup online do SQLite (não bloqueia os
+escritores durante muito tempo) para um ficheiro temporário, que depois
+substitui a réplica de forma atómica. Os pedidos que já tinham a réplica
+aberta terminam com a cópia antiga; os seguintes abrem a nova.
+"""
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from projecto_condominio.replica import ALIAS
+
+
+class Command(BaseCommand):
+    help = 'Copia o db.sqlite3 para a réplica usada pelos relatórios e listagens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=int, default=0,
+            help='Repete a cópia a cada N segundos (0 = copia uma vez e sai).',
+        )
+        parser.add_argument('--paginas', type=int, default=1024, help='Páginas copiadas por passo do backup.')
+
+    def handle(self, *args, **options):
+        if ALIAS not in settings.DATABASES:
+            raise CommandError(f'A base de dados "{ALIAS}" não está configurada.')
+        origem = str(settings.DATABASES['default']['NAME'])
+        destino = str(settings.DATABASES[ALIAS]['NAME'])
+
+        while True:
+            inicio = time.monotonic()
+            self._copiar(origem, destino, options['paginas'])
+            self.stdout.write(f'Réplica atualizada em {time.monotonic() - inicio:.2f}s.')
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
+
+    def _copiar(self, origem, destino, paginas):
+        temporario = f'{destino}.tmp'
+        fonte = sqlite3.connect(origem)
+        copia = sqlite3.connect(temporario)
+        try:
+            # Copia em passos de N páginas, libertando o bloqueio de leitura
+            # entre passos para não atrasar as escritas na base principal.
+            fonte.backup(copia, pages=paginas, sleep=0.005)
+        finally:
+            copia.close()
+            fonte.close()
+        os.replace(temporario, destino)
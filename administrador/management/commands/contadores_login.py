@@ -0,0 +1,29 @@
+"""
+Mostra os contadores da limitação de tentativas de login.
+
+    python manage.py contadores_login
+    python manage.py contadores_login --reiniciar
+
+Útil para acompanhar o volume de ataques de força bruta (ver
+projecto_condominio/throttling.py).
+"""
+from django.core.management.base import BaseCommand
+
+from projecto_condominio import throttling
+
+
+class Command(BaseCommand):
+    help = 'Mostra (e opcionalmente reinicia) os contadores de tentativas de login.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reiniciar', action='store_true', help='Põe os contadores a zero depois de os mostrar.')
+
+    def handle(self, *args, **options):
+        valores = throttling.contadores()
+        for nome in throttling.CONTADORES:
+            self.stdout.write(f'{nome}: {valores[nome]}')
+        if valores['tentativas']:
+            self.stdout.write(f"rejeitadas sem calcular o hash: {100 * valores['rejeitadas'] / valores['tentativas']:.1f}%")
+        if options['reiniciar']:
+            throttling.reiniciar_contadores()
+            self.stdout.write(self.style.SUCCESS('Contadores reiniciados.'))
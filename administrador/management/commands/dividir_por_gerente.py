@@ -0,0 +1,141 @@
+"""
+Divide a base de dados atual num ficheiro SQLite por gerente.
+
+    python manage.py dividir_por_gerente
+    python manage.py dividir_por_gerente --gerente 3 --apagar-origem
+
+Para cada gerente cria SHARDS_DIR/gerente_<id>.sqlite3, aplica as migrações e
+copia o seu portfólio (prédios, casas, inquilinos, contratos, manutenções,
+ocupações, pagamentos e fotos, incluindo os arquivados), mais as cópias das linhas centrais que esse portfólio
+referencia (utilizadores e gerentes). Com --apagar-origem, o portfólio copiado
+é removido da base central (as fotos e as transições das manutenções, que não
+seguem a cascata, também; os ficheiros das fotos ficam, porque o shard os usa).
+
+Os shards passam a ser usados automaticamente no arranque seguinte (ver
+projecto_condominio/settings.py e projecto_condominio/sharding.py).
+"""
+from itertools import islice
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from administrador.models import Gerente, Predio
+from gerente.models import (
+    Casa, Contratos, FotoManutencao, Inquilino, Manutencao, ManutencaoArquivo, Ocupacao, ResolucaoDiaria,
+    TransicaoManutencao,
+)
+from inquilino.models import PagamentoRenda, PagamentoRendaArquivo
+from projecto_condominio.pesquisa import pedir_reconstrucao
+from projecto_condominio.sharding import registar_shard
+
+
+class Command(BaseCommand):
+    help = 'Copia o portfólio de cada gerente para a sua própria base de dados SQLite.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gerente', type=int, action='append', help='Só este gerente (pode repetir).')
+        parser.add_argument('--lote', type=int, default=2000, help='Linhas por INSERT em massa.')
+        parser.add_argument('--apagar-origem', action='store_true', help='Remove o portfólio copiado da base central.')
+
+    def handle(self, *args, **options):
+        gerentes = Gerente.objects.all()
+        if options['gerente']:
+            gerentes = gerentes.filter(id__in=options['gerente'])
+            if not gerentes:
+                raise CommandError('Nenhum gerente encontrado com esses ids.')
+
+        settings.SHARDS_DIR.mkdir(exist_ok=True)
+        for gerente in gerentes:
+            inicio = time.monotonic()
+            alias = registar_shard(gerente.id)
+            call_command('migrate', database=alias, verbosity=0)
+            copiadas = self._copiar(gerente, alias, options['lote'])
+            if options['apagar_origem']:
+                self._apagar_origem(gerente)
+            self.stdout.write(
+                f'{alias}: {copiadas} linhas copiadas em {time.monotonic() - inicio:.2f}s.'
+            )
+        # As cópias são feitas com bulk_create, sem sinais.
+        pedir_reconstrucao()
+        self.stdout.write(self.style.SUCCESS('Divisão concluída. Reinicie os workers para usar os shards.'))
+
+    def _manutencoes(self, gerente):
+        """
+        Manutenções (abertas e arquivadas) do portfólio, na base central.
+        """
+        return (
+            Manutencao.objects.filter(Q(casa__predio__gerente=gerente) | Q(predio__gerente=gerente)),
+            ManutencaoArquivo.objects.filter(Q(casa__predio__gerente=gerente) | Q(predio__gerente=gerente)),
+        )
+
+    def _anexos(self, model, gerente):
+        # Fotos ou transições: ligadas à manutenção (aberta ou arquivada) só pelo id.
+        manutencoes, arquivadas = self._manutencoes(gerente)
+        return model.objects.filter(
+            Q(manutencao_id__in=manutencoes.values('id')) | Q(manutencao_id__in=arquivadas.values('id'))
+        )
+
+    def _portfolio(self, gerente):
+        """
+        Querysets (na base central) do portfólio de um gerente, pela ordem em
+        que têm de ser inseridos para respeitar as chaves estrangeiras.
+        """
+        inquilinos = Inquilino.objects.filter(
+            Q(gerente=gerente) | Q(casas_alugadas__predio__gerente=gerente)
+        ).distinct()
+        manutencoes, arquivadas = self._manutencoes(gerente)
+        gerente_ids = {gerente.id}
+        gerente_ids.update(inquilinos.exclude(gerente=None).values_list('gerente_id', flat=True))
+        gerente_ids.update(manutencoes.exclude(solicitado_por_gerente=None).values_list('solicitado_por_gerente_id', flat=True))
+        gerentes = Gerente.objects.filter(id__in=gerente_ids)
+        users = User.objects.filter(Q(gerente__in=gerentes) | Q(inquilino__in=inquilinos)).distinct()
+
+        return [
+            users,
+            gerentes,
+            Predio.objects.filter(gerente=gerente),
+            inquilinos,
+            Casa.objects.filter(predio__gerente=gerente),
+            Contratos.objects.filter(Q(casa__predio__gerente=gerente) | Q(inquilino__gerente=gerente)).distinct(),
+            manutencoes,
+            arquivadas,
+            self._anexos(FotoManutencao, gerente),
+            self._anexos(TransicaoManutencao, gerente),
+            ResolucaoDiaria.objects.filter(predio__gerente=gerente),
+            Ocupacao.objects.filter(casa__predio__gerente=gerente),
+            PagamentoRenda.objects.filter(contrato__casa__predio__gerente=gerente),
+            PagamentoRendaArquivo.objects.filter(contrato__casa__predio__gerente=gerente),
+        ]
+
+    def _copiar(self, gerente, alias, lote):
+        total = 0
+        with transaction.atomic(using=alias):
+            for queryset in self._portfolio(gerente):
+                destino = queryset.model._default_manager.using(alias)
+                linhas = queryset.using('default').order_by('pk').iterator(chunk_size=lote)
+                while True:
+                    bloco = list(islice(linhas, lote))
+                    if not bloco:
+                        break
+                    # ignore_conflicts torna o comando seguro para voltar a correr:
+                    # as linhas que já existem no shard são mantidas.
+                    destino.bulk_create(bloco, ignore_conflicts=True)
+                    total += len(bloco)
+        return total
+
+    def _apagar_origem(self, gerente):
+        with transaction.atomic(using='default'):
+            # Antes das manutenções, que identificam as fotos e as transições.
+            # _raw_delete não dispara o post_delete das fotos, que apagaria os
+            # ficheiros ainda usados pelas fotos copiadas para o shard.
+            for model in (FotoManutencao, TransicaoManutencao):
+                anexos = self._anexos(model, gerente).using('default')
+                anexos._raw_delete(anexos.db)
+            # Os prédios arrastam casas, contratos, manutenções e pagamentos em cascata.
+            Predio.objects.using('default').filter(gerente=gerente).delete()
+            Inquilino.objects.using('default').filter(gerente=gerente).delete()
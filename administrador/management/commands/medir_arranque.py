@@ -0,0 +1,219 @@
+"""
+Mede o tempo de arranque: manage.py, e o tempo até ao primeiro pedido de um
+worker WSGI e ASGI.
+
+    python manage.py medir_arranque
+    python manage.py medir_arranque --repeticoes 9 --importacoes 15
+    python manage.py medir_arranque --guardar-referencia
+    python manage.py medir_arranque --tolerancia 0.25
+
+Cada medição corre num interpretador novo (como um worker reciclado ou uma
+tarefa do cron) e o resultado é a mediana das repetições. Mostra também a
+repartição do tempo de importação (python -X importtime) por pacote e os
+módulos mais lentos.
+
+Com --guardar-referencia, as medianas ficam em ARRANQUE_REFERENCIA; nas
+execuções seguintes o comando termina com erro se alguma métrica passar a
+referência mais a tolerância, para que o arranque não volte a crescer sem
+ninguém reparar (por exemplo, numa verificação antes do deploy).
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Métricas comparadas com a referência (as restantes são só informativas).
+VERIFICADAS = ('manage_setup', 'wsgi_ate_primeiro_pedido', 'asgi_ate_primeiro_pedido')
+
+# Corre num processo novo: importa o ponto de entrada e faz dois pedidos.
+SCRIPT_WSGI = '''
+import io, json, sys, time
+inicio = time.perf_counter()
+from projecto_condominio.wsgi import application
+carregado = time.perf_counter()
+
+def pedido():
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    estado = []
+    corpo = b''.join(application(environ, lambda status, headers: estado.append(status)))
+    return estado[0]
+
+estado = pedido()
+primeiro = time.perf_counter()
+pedido()
+segundo = time.perf_counter()
+print(json.dumps({
+    'estado': estado, 'carregar': carregado - inicio,
+    'primeiro_pedido': primeiro - carregado, 'segundo_pedido': segundo - primeiro,
+}))
+'''
+
+SCRIPT_ASGI = '''
+import asyncio, json, sys, time
+inicio = time.perf_counter()
+from projecto_condominio.asgi import application
+carregado = time.perf_counter()
+
+async def pedido():
+    caminho = sys.argv[1]
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': caminho, 'raw_path': caminho.encode(), 'query_string': b'',
+        'root_path': '', 'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    estado = []
+    pedidos = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    terminado = asyncio.Event()
+
+    async def receive():
+        if pedidos:
+            return pedidos.pop()
+        # O cliente "desliga" depois de receber a resposta completa.
+        await terminado.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(mensagem):
+        if mensagem['type'] == 'http.response.start':
+            estado.append(mensagem['status'])
+        elif not mensagem.get('more_body'):
+            terminado.set()
+
+    await application(scope, receive, send)
+    return estado[0]
+
+estado = asyncio.run(pedido())
+primeiro = time.perf_counter()
+asyncio.run(pedido())
+segundo = time.perf_counter()
+print(json.dumps({
+    'estado': estado, 'carregar': carregado - inicio,
+    'primeiro_pedido': primeiro - carregado, 'segundo_pedido': segundo - primeiro,
+}))
+'''
+
+SCRIPT_MANAGE = '''
+import json, sys, time
+inicio = time.perf_counter()
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'projecto_condominio.settings')
+import django
+django.setup()
+print(json.dumps({'setup': time.perf_counter() - inicio}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Mede o arranque (manage.py, WSGI e ASGI) e compara com a referência guardada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=5, help='Processos por medição (usa-se a mediana).')
+        parser.add_argument('--caminho', default='/', help='URL do pedido de teste.')
+        parser.add_argument('--importacoes', type=int, default=10, help='Módulos mais lentos a mostrar.')
+        parser.add_argument('--guardar-referencia', action='store_true', help='Guarda as medianas como nova referência.')
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.20,
+            help='Aumento máximo aceite em relação à referência (0.20 = 20%%).',
+        )
+
+    def handle(self, *args, **options):
+        self._importacoes(options['importacoes'])
+
+        metricas = {}
+        for nome, script in (('wsgi', SCRIPT_WSGI), ('asgi', SCRIPT_ASGI)):
+            medicoes = [self._correr(script, options['caminho']) for _ in range(options['repeticoes'])]
+            if medicoes[0]['estado'] not in (200, '200 OK'):
+                self.stderr.write(f'{nome}: o pedido de teste devolveu {medicoes[0]["estado"]}.')
+            for campo in ('carregar', 'primeiro_pedido', 'segundo_pedido'):
+                metricas[f'{nome}_{campo}'] = statistics.median(m[campo] for m in medicoes)
+            metricas[f'{nome}_ate_primeiro_pedido'] = statistics.median(
+                m['carregar'] + m['primeiro_pedido'] for m in medicoes
+            )
+        metricas['manage_setup'] = statistics.median(
+            self._correr(SCRIPT_MANAGE)['setup'] for _ in range(options['repeticoes'])
+        )
+
+        self.stdout.write('\nTempos (mediana, ms):')
+        for nome, valor in metricas.items():
+            self.stdout.write(f'  {nome:<28} {valor * 1000:8.1f}')
+        self._comparar(metricas, options)
+
+    def _ambiente(self):
+        ambiente = dict(os.environ)
+        ambiente.setdefault('DJANGO_SETTINGS_MODULE', 'projecto_condominio.settings')
+        # Mede os workers como em produção, com a preparação no arranque.
+        ambiente.setdefault('DJANGO_PREPARAR_NO_ARRANQUE', '1')
+        ambiente['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [str(settings.BASE_DIR), ambiente.get('PYTHONPATH')])
+        )
+        return ambiente
+
+    def _correr(self, script, *argumentos):
+        resultado = subprocess.run(
+            [sys.executable, '-c', script, *argumentos],
+            capture_output=True, text=True, env=self._ambiente(), cwd=settings.BASE_DIR,
+        )
+        if resultado.returncode != 0:
+            raise CommandError(f'Falha ao medir o arranque:\n{resultado.stderr}')
+        return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+    def _importacoes(self, quantos):
+        """
+        Repartição do tempo de importação do ponto de entrada WSGI, por
+        pacote de topo e por módulo (tempo próprio, sem os submódulos).
+        """
+        resultado = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'from projecto_condominio.wsgi import application'],
+            capture_output=True, text=True, env=self._ambiente(), cwd=settings.BASE_DIR,
+        )
+        modulos = []
+        for linha in resultado.stderr.splitlines():
+            if not linha.startswith('import time:') or 'self [us]' in linha:
+                continue
+            proprio, _, nome = linha[len('import time:'):].split('|')
+            modulos.append((int(proprio), nome.strip()))
+
+        por_pacote = {}
+        for proprio, nome in modulos:
+            pacote = nome.split('.')[0]
+            por_pacote[pacote] = por_pacote.get(pacote, 0) + proprio
+        total = sum(por_pacote.values())
+        self.stdout.write(f'Importação do wsgi.py: {total / 1000:.1f} ms ({len(modulos)} módulos)')
+        for pacote, tempo in sorted(por_pacote.items(), key=lambda p: -p[1])[:quantos]:
+            self.stdout.write(f'  {pacote:<28} {tempo / 1000:8.1f} ms')
+        self.stdout.write('Módulos mais lentos (tempo próprio):')
+        for proprio, nome in sorted(modulos, reverse=True)[:quantos]:
+            self.stdout.write(f'  {nome:<50} {proprio / 1000:8.1f} ms')
+
+    def _comparar(self, metricas, options):
+        caminho = settings.ARRANQUE_REFERENCIA
+        if options['guardar_referencia']:
+            with open(caminho, 'w') as ficheiro:
+                json.dump(metricas, ficheiro, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Referência guardada em {caminho}.'))
+            return
+        if not os.path.exists(caminho):
+            self.stdout.write('Sem referência: use --guardar-referencia para a criar.')
+            return
+
+        with open(caminho) as ficheiro:
+            referencia = json.load(ficheiro)
+        piores = []
+        for nome in VERIFICADAS:
+            valor = metricas[nome]
+            if nome in referencia and valor > referencia[nome] * (1 + options['tolerancia']):
+                piores.append(f'{nome}: {valor * 1000:.1f} ms (referência {referencia[nome] * 1000:.1f} ms)')
+        if piores:
+            raise CommandError('O arranque ficou mais lento:\n  ' + '\n  '.join(piores))
+        self.stdout.write(self.style.SUCCESS('Arranque dentro da referência.'))
@@ -0,0 +1,90 @@
+"""
+Remoção em massa de prédios, casas, inquilinos e gerentes, com tudo o que
+depende deles (ver projecto_condominio/remocao.py).
+
+    python manage.py remover_em_massa predio 12
+    python manage.py remover_em_massa casa 40 41 --base gerente_3 --lote 5000
+    python manage.py remover_em_massa inquilino 7 --dry-run
+    python manage.py remover_em_massa --pendentes
+
+Com --pendentes, executa as remoções agendadas pelas views (e as que ficaram
+a meio, por exemplo num processo que terminou). Tem de estar no cron mesmo
+com REMOCOES_EM_FUNDO = True: as threads do processo perdem-se quando o
+worker é reciclado. Cada remoção é reclamada antes de ser executada, por isso
+uma que esteja a correr noutro processo é ignorada.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import ProtectedError
+
+from projecto_condominio import remocao
+from projecto_condominio.remocao import LOTE, MODELOS
+
+
+class Command(BaseCommand):
+    help = 'Apaga prédios, casas, inquilinos ou gerentes (e os dados dependentes) por lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('modelo', nargs='?', choices=sorted(MODELOS), help='Tipo dos objetos a apagar.')
+        parser.add_argument('ids', nargs='*', type=int, help='Ids dos objetos.')
+        parser.add_argument('--base', default='default', help='Base de dados dos objetos (por omissão, a central).')
+        parser.add_argument('--lote', type=int, default=LOTE, help='Linhas por instrução.')
+        parser.add_argument('--pendentes', action='store_true', help='Executa as remoções agendadas.')
+        parser.add_argument('--dry-run', action='store_true', help='Só mostra os passos e as linhas de cada um.')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('O tamanho do lote tem de ser positivo.')
+        if options['pendentes']:
+            self._pendentes(options)
+            return
+        if not options['modelo'] or not options['ids']:
+            raise CommandError('Indique o tipo e os ids dos objetos, ou use --pendentes.')
+
+        modelo, ids, base = options['modelo'], options['ids'], options['base']
+        if options['dry_run']:
+            raiz = MODELOS[modelo]._base_manager.using(base).filter(pk__in=ids)
+            try:
+                passos = remocao.planear(raiz)
+            except ProtectedError as erro:
+                raise CommandError(erro.args[0])
+            for passo, linhas in remocao.contar(passos):
+                self.stdout.write(f'  {passo:<50} {linhas:>9}')
+            return
+
+        inicio = time.monotonic()
+        try:
+            linhas = remocao.remover(modelo, ids, base, options['lote'], self._progresso)
+        except ProtectedError as erro:
+            raise CommandError(erro.args[0])
+        self._concluido(linhas, inicio)
+
+    def _pendentes(self, options):
+        remocoes = list(remocao.por_processar())
+        if options['dry_run']:
+            for pedida in remocoes:
+                self.stdout.write(f'  {pedida} - {pedida.descricao}')
+            return
+        for pedida in remocoes:
+            self.stdout.write(f'{pedida.get_modelo_display()} {pedida.objeto_id} ({pedida.descricao}):')
+            inicio = time.monotonic()
+            try:
+                linhas = remocao.processar(pedida, options['lote'], self._progresso)
+            except Exception as erro:
+                self.stderr.write(f'  Falhou: {erro}')
+                continue
+            if linhas is None:
+                self.stdout.write('  Já está a ser executada noutro processo.')
+                continue
+            self._concluido(linhas, inicio)
+
+    def _progresso(self, passo, linhas):
+        self.stdout.write(f'  {linhas} linhas ({passo})...')
+
+    def _concluido(self, linhas, inicio):
+        duracao = time.monotonic() - inicio
+        ritmo = linhas / duracao if duracao > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{linhas} linhas apagadas ou atualizadas em {duracao:.2f}s ({ritmo:.0f} linhas/s).'
+        ))
@@ -0,0 +1,56 @@
+"""
+Passa prédios (com os inquilinos, os contratos e as manutenções) para outro
+gerente (ver administrador/transferencia.py).
+
+    python manage.py transferir_predios 3 --predios 12 13 --dry-run
+    python manage.py transferir_predios 3 --de 2
+
+Com --de, transfere todos os prédios desse gerente.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from administrador.models import Gerente, Predio
+from administrador.transferencia import TransferenciaInvalida, simular, transferir
+
+
+class Command(BaseCommand):
+    help = 'Transfere prédios, com os inquilinos, contratos e manutenções, para outro gerente.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('destino', type=int, help='Id do gerente que fica com os prédios.')
+        origem = parser.add_mutually_exclusive_group(required=True)
+        origem.add_argument('--predios', type=int, nargs='+', help='Ids dos prédios.')
+        origem.add_argument('--de', type=int, help='Todos os prédios deste gerente.')
+        parser.add_argument('--dry-run', action='store_true', help='Só mostra o que muda.')
+
+    def handle(self, *args, **options):
+        destino = Gerente.objects.filter(pk=options['destino']).first()
+        if destino is None:
+            raise CommandError(f"Gerente {options['destino']} não encontrado.")
+        if options['de'] is not None:
+            predio_ids = list(Predio.objects.filter(gerente_id=options['de']).values_list('id', flat=True))
+        else:
+            predio_ids = options['predios']
+
+        try:
+            impacto = simular(predio_ids, destino)
+            self.stdout.write(
+                f"{impacto['predios']} prédios, {impacto['casas']} casas ({impacto['casas_ocupadas']} ocupadas), "
+                f"{impacto['contratos_ativos']} contratos ativos, {impacto['inquilinos']} inquilinos, "
+                f"{impacto['manutencoes']} manutenções ({impacto['manutencoes_abertas']} abertas) e "
+                f"{impacto['manutencoes_arquivadas']} arquivadas."
+            )
+            for inquilino in impacto['divididos']:
+                self.stdout.write(f'  Fica com o gerente atual: {inquilino.user.username} (casa noutro prédio).')
+            if options['dry_run']:
+                return
+
+            inicio = time.monotonic()
+            predios, inquilinos = transferir(predio_ids, destino)
+        except TransferenciaInvalida as erro:
+            raise CommandError(str(erro))
+        self.stdout.write(self.style.SUCCESS(
+            f'{predios} prédios e {inquilinos} inquilinos transferidos em {time.monotonic() - inicio:.2f}s.'
+        ))
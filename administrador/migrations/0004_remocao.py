@@ -0,0 +1,82 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("administrador", "0003_remove_predio_nr_casas"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Remocao",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "modelo",
+                    models.CharField(
+                        choices=[
+                            ("predio", "Prédio"),
+                            ("casa", "Casa"),
+                            ("inquilino", "Inquilino"),
+                            ("gerente", "Gerente"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("objeto_id", models.BigIntegerField()),
+                ("base", models.CharField(default="default", max_length=100)),
+                ("descricao", models.CharField(blank=True, max_length=255)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("em_curso", "Em curso"),
+                            ("concluida", "Concluída"),
+                            ("falhou", "Falhou"),
+                        ],
+                        default="pendente",
+                        max_length=10,
+                    ),
+                ),
+                ("linhas", models.PositiveIntegerField(default=0)),
+                ("passo", models.CharField(blank=True, max_length=100)),
+                ("erro", models.TextField(blank=True)),
+                ("pedida_em", models.DateTimeField(auto_now_add=True)),
+                ("concluida_em", models.DateTimeField(blank=True, null=True)),
+                (
+                    "pedida_por",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "remoção",
+                "verbose_name_plural": "remoções",
+                "indexes": [
+                    models.Index(
+                        fields=["modelo", "estado"], name="remocao_modelo_estado_idx"
+                    )
+                ],
+            },
+        ),
+    ]
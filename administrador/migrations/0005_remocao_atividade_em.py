@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("administrador", "0004_remocao"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="remocao",
+            name="atividade_em",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
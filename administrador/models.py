@@ -21,4 +21,52 @@ class Predio(models.Model):
     gerente = models.ForeignKey(Gerente, on_delete=models.PROTECT, related_name='predios')
 
     def __str__(self):
-        return f'{self.nome} ({self.localizacao})'
\ No newline at end of file
+        return f'{self.nome} ({self.localizacao})'
+
+class Remocao(models.Model):
+    """
+    Remoção em massa de um prédio, casa, inquilino ou gerente (ver
+    projecto_condominio/remocao.py). Enquanto está pendente ou em curso, o
+    objeto fica escondido das listagens; a remoção física corre em segundo
+    plano ou no comando remover_em_massa.
+    """
+    MODELO_CHOICES = [
+        ('predio', 'Prédio'),
+        ('casa', 'Casa'),
+        ('inquilino', 'Inquilino'),
+        ('gerente', 'Gerente'),
+    ]
+    ESTADO_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('em_curso', 'Em curso'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+
+    modelo = models.CharField(max_length=10, choices=MODELO_CHOICES)
+    objeto_id = models.BigIntegerField()
+    # Base de dados do objeto ('default' ou o shard do gerente).
+    base = models.CharField(max_length=100, default='default')
+    descricao = models.CharField(max_length=255, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='pendente')
+    # Progresso: linhas apagadas ou atualizadas até agora e o modelo em curso.
+    linhas = models.PositiveIntegerField(default=0)
+    passo = models.CharField(max_length=100, blank=True)
+    erro = models.TextField(blank=True)
+    pedida_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    pedida_em = models.DateTimeField(auto_now_add=True)
+    # Última atividade do processo que a executa (reclamada ou lote gravado):
+    # uma remoção em curso parada há muito pode ser retomada por outro.
+    atividade_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'remoção'
+        verbose_name_plural = 'remoções'
+        indexes = [
+            # Objetos escondidos das listagens (remoções pendentes ou em curso).
+            models.Index(fields=['modelo', 'estado'], name='remocao_modelo_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_modelo_display()} {self.objeto_id} ({self.get_estado_display()})'
@@ -0,0 +1,108 @@
+"""
+Resumo do portfólio de cada gerente (prédios, casas, ocupação, inquilinos,
+manutenções abertas e rendas em atraso) para a listagem ver_gerentes.
+
+Cada coluna é uma subconsulta correlacionada (COUNT/SUM ... WHERE
+gerente_id = gerente.id), por isso a página inteira é uma única consulta,
+ordenável e paginável no SQL, em vez de várias contagens por gerente.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from gerente.models import Casa, Inquilino, Manutencao
+from inquilino.models import PagamentoRenda
+from .models import Predio
+from projecto_condominio.sharding import alias_do_gerente, gerentes_com_base_propria
+
+ZERO = Value(Decimal('0'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+# Parâmetro ?ordem= -> campo (o prefixo '-' inverte).
+ORDENACOES = {
+    'nome': 'user__username',
+    'predios': 'total_predios',
+    'casas': 'total_casas',
+    'ocupacao': 'taxa_ocupacao',
+    'inquilinos': 'total_inquilinos',
+    'manutencoes': 'manutencoes_abertas',
+    'atraso': 'valor_em_atraso',
+}
+
+CONTAGENS = ('total_predios', 'total_casas', 'casas_ocupadas', 'total_inquilinos', 'manutencoes_abertas')
+
+
+def _agregado(queryset, campo_gerente, funcao):
+    """
+    Subconsulta com o agregado das linhas do gerente da linha exterior.
+    """
+    linhas = queryset.filter(**{campo_gerente: OuterRef('pk')}).order_by().values(campo_gerente)
+    return Subquery(linhas.annotate(valor=funcao).values('valor'))
+
+
+def anotar_resumo(gerentes, hoje=None):
+    """
+    Acrescenta a cada gerente as colunas de ORDENACOES (e casas_ocupadas).
+    taxa_ocupacao é nula quando o gerente não tem casas.
+    """
+    hoje = hoje or date.today()
+    contar = Count('pk')
+    return gerentes.annotate(
+        total_predios=Coalesce(_agregado(Predio.objects.all(), 'gerente', contar), 0),
+        total_casas=Coalesce(_agregado(Casa.objects.all(), 'predio__gerente', contar), 0),
+        casas_ocupadas=Coalesce(
+            _agregado(Casa.objects.filter(inquilino__isnull=False), 'predio__gerente', contar), 0
+        ),
+        total_inquilinos=Coalesce(_agregado(Inquilino.objects.all(), 'gerente', contar), 0),
+        manutencoes_abertas=Coalesce(
+            _agregado(Manutencao.objects.filter(estado__in=['pendente', 'em_progresso']), 'gerente', contar), 0
+        ),
+        valor_em_atraso=Coalesce(
+            _agregado(
+                PagamentoRenda.objects.filter(estado='nao_pago', mes_referencia__lte=hoje),
+                'contrato__casa__predio__gerente', Sum('valor'),
+            ),
+            ZERO,
+        ),
+    ).annotate(
+        taxa_ocupacao=Cast('casas_ocupadas', FloatField()) * 100 / NullIf('total_casas', Value(0)),
+    )
+
+
+def ordenar(gerentes, ordem):
+    """
+    Ordena o queryset pelo parâmetro ?ordem= (desconhecido -> por nome). Os
+    gerentes sem casas (taxa nula) ficam sempre no fim.
+    """
+    campo = ORDENACOES.get(ordem.lstrip('-'), ORDENACOES['nome'])
+    expressao = F(campo).desc(nulls_last=True) if ordem.startswith('-') else F(campo).asc(nulls_last=True)
+    return gerentes.order_by(expressao, 'pk')
+
+
+def resumo_em_todas_as_bases(gerentes, ordem):
+    """
+    Com shards, o portfólio de um gerente com base própria está todo nessa
+    base: as colunas dele são lidas lá (os shards têm cópias dos gerentes) e
+    substituem as da base central, que pode ainda ter cópias antigas (sem
+    --apagar-origem). A ordenação é feita em Python. Devolve uma lista.
+    """
+    por_id = {gerente.pk: gerente for gerente in gerentes}
+    for gerente_id in gerentes_com_base_propria():
+        gerente = por_id.get(gerente_id)
+        if gerente is None:
+            continue
+        copia = gerentes.using(alias_do_gerente(gerente_id)).filter(pk=gerente_id)
+        for campo, valor in (copia.values(*CONTAGENS, 'valor_em_atraso').first() or {}).items():
+            setattr(gerente, campo, valor)
+    resultado = list(por_id.values())
+    for gerente in resultado:
+        gerente.taxa_ocupacao = (
+            gerente.casas_ocupadas * 100 / gerente.total_casas if gerente.total_casas else None
+        )
+
+    campo = ORDENACOES.get(ordem.lstrip('-'), ORDENACOES['nome'])
+    valor = (lambda g: g.user.username) if campo == 'user__username' else (lambda g: getattr(g, campo))
+    resultado.sort(key=lambda g: g.pk)
+    com_valor = sorted((g for g in resultado if valor(g) is not None), key=valor, reverse=ordem.startswith('-'))
+    return com_valor + [g for g in resultado if valor(g) is None]
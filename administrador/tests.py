@@ -1,3 +1,702 @@
-from django.test import TestCase
+from datetime import date, timedelta
+import importlib
+from io import StringIO
+import os
+from pathlib import Path
+import tempfile
+import sys
+import threading
+import time
+from unittest import mock, skipUnless
+import warnings
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.db.models import ProtectedError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from gerente import fotos
+from gerente.models import Casa, Contratos, FotoManutencao, Inquilino, Manutencao, Ocupacao, TransicaoManutencao
+from inquilino.models import PagamentoRenda
+from inquilino.services import novos_pagamentos
+from projecto_condominio import pesquisa, remocao, replica, throttling
+from projecto_condominio.cache import SQLiteCache
+from projecto_condominio.sharding import alias_do_gerente, usar_gerente
+from . import transferencia
+from .portfolio import anotar_resumo, resumo_em_todas_as_bases
+from .models import Gerente, Predio, Remocao
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def criar_gerente(nome='gerente'):
+    return Gerente.objects.create(user=User.objects.create_user(nome), contacto=f'g-{nome}')
+
+
+def criar_inquilino(nome, gerente):
+    return Inquilino.objects.create(user=User.objects.create_user(nome), contacto=f'i-{nome}', gerente=gerente)
+
+
+def ocupar(predio, numero, inquilino, data_inicio=date(2026, 1, 1)):
+    """
+    Casa do prédio com o inquilino, contrato ativo e plano de pagamentos.
+    """
+    casa = Casa.objects.create(numero=numero, predio=predio, inquilino=inquilino)
+    contrato = Contratos.objects.create(
+        inquilino=inquilino, casa=casa, data_inicio=data_inicio, valor_renda=500, duracao_meses=12
+    )
+    PagamentoRenda.objects.bulk_create(novos_pagamentos(contrato))
+    return casa, contrato
+
+
+def criar_administrador(nome='admin'):
+    user = User.objects.create_user(nome)
+    user.groups.add(Group.objects.get_or_create(name='Administrador')[0])
+    return user
+
+
+def pedido(ip='10.0.0.1'):
+    return RequestFactory().post('/', REMOTE_ADDR=ip)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class LimiteDeLoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_rajada_e_rejeitada_e_nao_consome_tentativas(self):
+        capacidade = throttling._config('UTILIZADOR_CAPACIDADE')
+        agora = 1_000_000.0
+
+        for _ in range(capacidade):
+            self.assertEqual(throttling._consumir_token('utilizador', 'ana', agora), 0)
+        for _ in range(3):
+            self.assertGreater(throttling._consumir_token('utilizador', 'ana', agora), 0)
+
+        # Passada uma janela inteira (o tempo de encher o bucket), há de novo tentativas.
+        janela = capacidade / (throttling._config('UTILIZADOR_POR_MINUTO') / 60)
+        self.assertEqual(throttling._consumir_token('utilizador', 'ana', agora + janela * 2), 0)
+
+    def test_espera_indicada_chega_para_a_tentativa_seguinte(self):
+        capacidade = throttling._config('UTILIZADOR_CAPACIDADE')
+        agora = 1_000_000.0
+        for _ in range(capacidade):
+            throttling._consumir_token('utilizador', 'ana', agora)
+
+        espera = throttling._consumir_token('utilizador', 'ana', agora)
+
+        self.assertGreater(throttling._consumir_token('utilizador', 'ana', agora + espera - 1), 0)
+        self.assertEqual(throttling._consumir_token('utilizador', 'ana', agora + espera), 0)
+
+    def test_sucesso_so_limpa_as_falhas_do_utilizador(self):
+        for _ in range(2):
+            throttling.registar_resultado(pedido(), 'vitima', sucesso=False)
+        throttling.registar_resultado(pedido(), 'atacante', sucesso=True)
+
+        ip, vitima = throttling._chaves(pedido(), 'vitima')
+        self.assertEqual(cache.get(f'login:falhas:ip:{ip[1]}'), 2)
+        self.assertEqual(cache.get(f'login:falhas:utilizador:{vitima[1]}'), 2)
+
+        throttling.registar_resultado(pedido(), 'vitima', sucesso=True)
+        self.assertIsNone(cache.get(f'login:falhas:utilizador:{vitima[1]}'))
+        self.assertEqual(cache.get(f'login:falhas:ip:{ip[1]}'), 2)
+
+    def test_falhas_seguidas_bloqueiam_o_login(self):
+        livres = throttling._config('FALHAS_LIVRES')
+        for _ in range(livres + 1):
+            self.client.post(reverse('login_admin'), {'username': 'ana', 'password': 'errada'})
+
+        resposta = self.client.post(reverse('login_admin'), {'username': 'ana', 'password': 'errada'})
+
+        self.assertEqual(resposta.status_code, 429)
+        self.assertEqual(throttling.contadores()['rejeitadas'], 1)
+
+
+class CacheSQLiteTests(SimpleTestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.cache = SQLiteCache(Path(pasta.name) / 'cache.sqlite3', {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}})
+
+    def test_entradas_expiradas_contam_como_ausentes(self):
+        self.cache.set('a', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.add('a', 2))
+        self.assertFalse(self.cache.add('a', 3))
+        self.assertEqual(self.cache.incr('a', 5), 7)
+        with self.assertRaises(ValueError):
+            self.cache.incr('b')
+
+    def test_despejo_remove_as_menos_usadas(self):
+        self.cache.CULL_CHECK_EVERY = 1
+        with mock.patch('projecto_condominio.cache.time.time', side_effect=range(1000, 2000, 10)):
+            for numero in range(10):
+                self.cache.set(f'chave-{numero}', numero, timeout=None)
+            self.cache.get('chave-0')
+            self.cache.set('chave-10', 10, timeout=None)
+
+        self.assertTrue(self.cache.has_key('chave-0'))
+        self.assertFalse(self.cache.has_key('chave-1'))
+        self.assertTrue(self.cache.has_key('chave-10'))
+
+
+class PreparacaoNoArranqueTests(SimpleTestCase):
+    def importar_wsgi(self):
+        with mock.patch('projecto_condominio.arranque.aquecer') as aquecer, \
+                mock.patch('projecto_condominio.arranque.preparar_em_fundo') as preparar_em_fundo:
+            sys.modules.pop('projecto_condominio.wsgi', None)
+            importlib.import_module('projecto_condominio.wsgi')
+        return aquecer.called, preparar_em_fundo.called
+
+    @override_settings(PREPARAR_NO_ARRANQUE=False)
+    def test_importar_o_wsgi_sem_a_opcao_nao_tem_efeitos(self):
+        self.assertEqual(self.importar_wsgi(), (False, False))
+
+    @override_settings(PREPARAR_NO_ARRANQUE=True)
+    def test_com_a_opcao_aquece_e_constroi_o_indice(self):
+        self.assertEqual(self.importar_wsgi(), (True, True))
+
+
+class ReplicaTests(SimpleTestCase):
+    """
+    A réplica é simulada pelo instante da cópia (instante_da_replica); nos
+    testes, 'replica' espelha a base de testes principal (TEST MIRROR).
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.instante = time.time()
+        self.enterContext(mock.patch.object(replica, 'instante_da_replica', side_effect=lambda: self.instante))
+        self.enterContext(mock.patch.object(replica, '_verificacao', (None, 0.0, False)))
+        self.enterContext(mock.patch.object(replica, '_avisada', None))
+
+    def base_de_leitura(self, sessao, metodo='get'):
+        """
+        Base usada para ler um Predio numa view @leitura_em_replica, com a
+        sessão `sessao` (depois do pedido, tem o registo das escritas).
+        """
+        lidas = []
+
+        @replica.leitura_em_replica
+        def view(request):
+            lidas.append(router.db_for_read(Predio))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), metodo)('/')
+        request.session = sessao
+        replica.RegistoDeEscritasMiddleware(view)(request)
+        return lidas[0]
+
+    def test_leituras_vao_para_a_replica_e_escritas_para_a_principal(self):
+        with replica.em_replica():
+            self.assertEqual(router.db_for_read(Predio), replica.ALIAS)
+            # Sessões e utilizadores nunca vêm da réplica.
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_write(Predio), 'default')
+        self.assertEqual(router.db_for_read(Predio), 'default')
+
+    def test_depois_de_escrever_le_da_principal_ate_a_replica_apanhar(self):
+        sessao = {}
+        self.assertEqual(self.base_de_leitura(sessao), replica.ALIAS)
+
+        self.assertEqual(self.base_de_leitura(sessao, 'post'), replica.ALIAS)
+        self.assertGreaterEqual(sessao[replica.CHAVE_ULTIMA_ESCRITA], self.instante)
+        self.assertEqual(self.base_de_leitura(sessao), 'default')
+
+        # Nova cópia, feita depois da escrita.
+        self.instante = time.time() + 1
+        self.assertEqual(self.base_de_leitura(sessao), replica.ALIAS)
+
+    @override_settings(REPLICA_IDADE_MAXIMA=60)
+    def test_replica_atrasada_nao_e_usada(self):
+        self.instante = time.time() - 120
+
+        with self.assertLogs('projecto_condominio.replica', 'WARNING'):
+            self.assertEqual(self.base_de_leitura({}), 'default')
+        with replica.em_replica():
+            self.assertEqual(router.db_for_read(Predio), 'default')
+
+    def test_replica_sem_as_ultimas_migracoes_nao_e_usada(self):
+        migracoes = {'default': {('gerente', '0001'), ('gerente', '0002')}, replica.ALIAS: {('gerente', '0001')}}
+
+        with mock.patch.object(replica, '_migracoes', side_effect=migracoes.get) as consultar:
+            with self.assertLogs('projecto_condominio.replica', 'WARNING') as aviso:
+                self.assertEqual(self.base_de_leitura({}), 'default')
+            self.assertIn('gerente.0002', aviso.output[0])
+            # O resultado é reutilizado para a mesma cópia.
+            self.assertEqual(self.base_de_leitura({}), 'default')
+            self.assertEqual(consultar.call_count, 2)
+
+            # A cópia seguinte já tem a migração.
+            migracoes[replica.ALIAS].add(('gerente', '0002'))
+            self.instante += 1
+            self.assertEqual(self.base_de_leitura({}), replica.ALIAS)
+
+    def test_migracoes_reais_da_replica_espelhada_estao_em_dia(self):
+        self.assertEqual(self.base_de_leitura({}), replica.ALIAS)
+
+
+class LimiteDeLoginConcorrenteTests(SimpleTestCase):
+    """
+    Vários threads (cada um com a sua ligação ao ficheiro da cache, como
+    workers diferentes) a gastar o mesmo bucket ao mesmo tempo.
+    """
+    def test_tentativas_simultaneas_nao_passam_da_capacidade(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            caches = {'default': {'BACKEND': 'projecto_condominio.cache.SQLiteCache', 'LOCATION': f'{pasta}/cache.sqlite3'}}
+            with override_settings(CACHES=caches):
+                capacidade = throttling._config('IP_CAPACIDADE')
+                agora = 1_000_000.0
+                barreira = threading.Barrier(capacidade * 2)
+                resultados = []
+
+                def tentar():
+                    barreira.wait()
+                    resultados.append(throttling._consumir_token('ip', '10.0.0.1', agora))
+
+                threads = [threading.Thread(target=tentar) for _ in range(capacidade * 2)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                self.assertEqual(resultados.count(0), capacidade)
+                janela = capacidade / (throttling._config('IP_POR_MINUTO') / 60)
+                self.assertEqual(cache.get(f'login:bucket:ip:10.0.0.1:{int(agora // janela)}'), capacidade)
+
+
+@override_settings(CACHES=CACHE_LOCAL, REMOCOES_EM_FUNDO=False)
+class IndiceDePesquisaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.predio = Predio.objects.create(nome='Girassol', localizacao='Porto', gerente=criar_gerente())
+        self.casa = Casa.objects.create(numero='7C', predio=self.predio)
+
+    def encontrados(self, indice):
+        return sorted((d.tipo, d.id) for d in indice.pesquisar('girassol', pesquisa.TODOS))
+
+    def test_construcao_ignora_objetos_a_remover(self):
+        remocao.agendar('predio', self.predio)
+
+        indice = pesquisa.Indice()
+        indice.construir()
+
+        self.assertEqual(self.encontrados(indice), [])
+
+    def test_diario_tira_e_repoe_objetos_a_remover(self):
+        indice = pesquisa.Indice()
+        indice.sincronizar()
+        visiveis = [('casa', self.casa.id), ('predio', self.predio.id)]
+        self.assertEqual(self.encontrados(indice), visiveis)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido = remocao.agendar('predio', self.predio)
+        indice.sincronizar()
+        self.assertEqual(self.encontrados(indice), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(remocao, 'remover', side_effect=RuntimeError('falhou')):
+                with self.assertRaises(RuntimeError):
+                    remocao.processar(pedido)
+        indice.sincronizar()
+        self.assertEqual(self.encontrados(indice), visiveis)
+
+    @skipUnless(hasattr(os, 'fork'), 'Só em sistemas com fork().')
+    def test_fork_durante_a_construcao(self):
+        # Uma thread a meio da construção, com o lock, no momento do fork.
+        indice = pesquisa.indice
+        ocupado, libertar = threading.Event(), threading.Event()
+
+        def construir():
+            with indice._lock:
+                indice._construindo = True
+                ocupado.set()
+                libertar.wait()
+                indice._construindo = False
+
+        thread = threading.Thread(target=construir)
+        thread.start()
+        ocupado.wait()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            pid = os.fork()
+        if pid == 0:
+            livre = indice._lock.acquire(timeout=5)
+            os._exit(0 if livre and indice.sequencia is None else 1)
+        libertar.set()
+        thread.join()
+        _, estado = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(estado), 0)
+
+
+@override_settings(CACHES=CACHE_LOCAL, REMOCOES_EM_FUNDO=False)
+class GerenteComShardTests(TestCase):
+    """
+    Um gerente com o portfólio numa base própria (dividir_por_gerente
+    --apagar-origem, para uma pasta temporária) e outro na base central.
+    """
+    def setUp(self):
+        cache.clear()
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.enterContext(override_settings(SHARDS_DIR=Path(pasta.name)))
+
+        self.dividido = criar_gerente('dividido')
+        self.central = criar_gerente('central')
+        predio = Predio.objects.create(nome='Girassol', localizacao='Porto', gerente=self.dividido)
+        self.manutencao = Manutencao.objects.create(tipo='geral', descricao='Porta', predio=predio)
+        FotoManutencao.objects.create(manutencao=self.manutencao, sha256='a' * 64, extensao='jpg', tamanho=1)
+
+        # O shard só existe durante o teste; o Django só deixa usar as bases
+        # indicadas em `databases`.
+        self.alias = alias_do_gerente(self.dividido.id)
+        self.addCleanup(setattr, type(self), 'databases', self.databases)
+        type(self).databases = self.databases | {self.alias}
+        self.addCleanup(self.remover_shard)
+        call_command('dividir_por_gerente', '--gerente', str(self.dividido.id), '--apagar-origem', stdout=StringIO())
+        self.client.force_login(criar_administrador())
+
+    def remover_shard(self):
+        if self.alias in connections.settings:
+            connections[self.alias].close()
+            del connections[self.alias]
+            del connections.settings[self.alias]
+        settings.DATABASES.pop(self.alias, None)
+
+    def test_apagar_origem_leva_as_fotos_e_as_transicoes(self):
+        for model in (FotoManutencao, TransicaoManutencao):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.using('default').filter(manutencao_id=self.manutencao.id).exists())
+                self.assertTrue(model.objects.using(self.alias).filter(manutencao_id=self.manutencao.id).exists())
+
+    def test_predio_novo_e_criado_na_base_do_gerente(self):
+        self.client.post(
+            reverse('adicionar_predio'), {'nome': 'Novo', 'localizacao': 'Braga', 'gerente': self.dividido.id}
+        )
+
+        self.assertFalse(Predio.objects.using('default').filter(nome='Novo').exists())
+        self.assertTrue(Predio.objects.using(self.alias).filter(nome='Novo', gerente=self.dividido).exists())
+
+    def test_copias_na_base_central_nao_sao_alteradas(self):
+        copia = Predio.objects.using('default').create(nome='Copia', localizacao='Porto', gerente=self.dividido)
+
+        self.client.post(
+            reverse('editar_predio', args=[copia.id]), {'nome': 'Outro', 'localizacao': 'Faro', 'gerente': self.central.id}
+        )
+        self.client.post(reverse('deletar_predio', args=[copia.id]))
+
+        copia.refresh_from_db()
+        self.assertEqual((copia.nome, copia.gerente_id), ('Copia', self.dividido.id))
+        self.assertFalse(Remocao.objects.exists())
+
+    def test_predio_do_shard_e_listado_editado_e_apagado(self):
+        predio = Predio.objects.using(self.alias).get(nome='Girassol')
+        url = f"?gerente={self.dividido.id}"
+        # O prédio só está no shard, e impede na mesma a remoção do gerente.
+        self.client.post(reverse('deletar_gerente', args=[self.dividido.id]))
+        self.assertFalse(Remocao.objects.filter(modelo='gerente').exists())
+        # Uma cópia antiga na base central não aparece em duplicado.
+        Predio.objects.using('default').create(nome='Girassol', localizacao='Porto', gerente=self.dividido)
+
+        resposta = self.client.get(reverse('ver_predios'))
+        self.assertEqual([p.pk for p in resposta.context['predios']], [predio.pk])
+        self.assertContains(resposta, reverse('editar_predio', args=[predio.pk]) + url)
+
+        dados = {'nome': 'Girassol II', 'localizacao': 'Porto', 'gerente': self.dividido.id}
+        self.client.post(reverse('editar_predio', args=[predio.pk]) + url, dados)
+        self.client.post(reverse('editar_predio', args=[predio.pk]) + url, dict(dados, nome='Outro', gerente=self.central.id))
+        predio.refresh_from_db()
+        self.assertEqual((predio.nome, predio.gerente_id), ('Girassol II', self.dividido.id))
+
+        self.client.post(reverse('deletar_predio', args=[predio.pk]) + url)
+        pedido = Remocao.objects.get(modelo='predio')
+        self.assertEqual((pedido.objeto_id, pedido.base), (predio.pk, self.alias))
+        self.assertEqual(self.client.get(reverse('ver_predios')).context['predios'], [])
+
+        call_command('remover_em_massa', '--pendentes', stdout=StringIO())
+        self.assertFalse(Predio.objects.using(self.alias).filter(pk=predio.pk).exists())
+        self.assertFalse(Manutencao.objects.using(self.alias).exists())
+
+    def test_resumo_do_portfolio_soma_cada_gerente_uma_vez(self):
+        predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=self.central)
+        ocupar(predio, '1A', criar_inquilino('ana', self.central))
+        Casa.objects.create(numero='1B', predio=predio)
+        # Cópia antiga do portfólio do gerente dividido na base central.
+        Predio.objects.using('default').create(nome='Girassol', localizacao='Porto', gerente=self.dividido)
+
+        gerentes = anotar_resumo(Gerente.objects.select_related('user'), hoje=date(2026, 3, 15))
+        central, dividido = resumo_em_todas_as_bases(gerentes, 'nome')
+
+        self.assertEqual(
+            (central.total_predios, central.total_casas, central.casas_ocupadas, central.total_inquilinos),
+            (1, 2, 1, 1),
+        )
+        self.assertEqual((central.taxa_ocupacao, central.valor_em_atraso), (50, 1500))
+        self.assertEqual((dividido.total_predios, dividido.total_casas, dividido.manutencoes_abertas), (1, 0, 1))
+        self.assertIsNone(dividido.taxa_ocupacao)
+
+    def test_transferencia_recusa_gerentes_com_shard(self):
+        predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=self.central)
+
+        with self.assertRaises(transferencia.TransferenciaInvalida):
+            transferencia.transferir([predio.id], self.dividido)
+        self.client.post(
+            reverse('editar_predio', args=[predio.id]), {'nome': 'Central', 'localizacao': 'Lisboa', 'gerente': self.dividido.id}
+        )
+
+        predio.refresh_from_db()
+        self.assertEqual(predio.gerente, self.central)
+        with usar_gerente(self.dividido.id):
+            self.assertFalse(Predio.objects.filter(nome='Central').exists())
+
+
+@override_settings(CACHES=CACHE_LOCAL, REMOCOES_EM_FUNDO=False)
+class RemocaoEmMassaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=pasta.name))
+
+        self.gerente = criar_gerente()
+        self.predio = Predio.objects.create(nome='Girassol', localizacao='Porto', gerente=self.gerente)
+        self.inquilino = criar_inquilino('ana', self.gerente)
+        self.casa, self.contrato = ocupar(self.predio, '1A', self.inquilino)
+        self.manutencao = Manutencao.objects.create(
+            tipo='geral', descricao='Porta', casa=self.casa, solicitado_por_inquilino=self.inquilino
+        )
+
+        self.outro_predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=self.gerente)
+        self.outro_inquilino = criar_inquilino('rui', self.gerente)
+        self.outra_casa, self.outro_contrato = ocupar(self.outro_predio, '2B', self.outro_inquilino)
+        self.outra_manutencao = Manutencao.objects.create(tipo='geral', descricao='Luz', casa=self.outra_casa)
+
+        # A mesma imagem nas duas manutenções, e outra só na do prédio a apagar.
+        self.partilhada = self.foto(self.manutencao, 'a' * 64)
+        self.foto(self.outra_manutencao, 'a' * 64)
+        self.so_desta = self.foto(self.manutencao, 'b' * 64)
+
+    def foto(self, manutencao, sha256):
+        foto = FotoManutencao.objects.create(manutencao=manutencao, sha256=sha256, extensao='jpg', tamanho=1)
+        os.makedirs(os.path.dirname(fotos.caminho(foto)), exist_ok=True)
+        open(fotos.caminho(foto), 'wb').close()
+        return foto
+
+    def contagens(self, **filtros):
+        return {
+            'casas': Casa.objects.filter(**filtros).count(),
+            'contratos': Contratos.objects.filter(**{f'casa__{k}': v for k, v in filtros.items()}).count(),
+            'pagamentos': PagamentoRenda.objects.filter(**{f'contrato__casa__{k}': v for k, v in filtros.items()}).count(),
+            'manutencoes': Manutencao.objects.filter(**{f'casa__{k}': v for k, v in filtros.items()}).count(),
+            'ocupacoes': Ocupacao.objects.filter(**{f'casa__{k}': v for k, v in filtros.items()}).count(),
+        }
+
+    def test_remover_predio_apaga_os_dependentes_e_mais_nada(self):
+        outro_antes = self.contagens(predio=self.outro_predio)
+
+        remocao.remover('predio', [self.predio.id], lote=2)
+
+        self.assertFalse(Predio.objects.filter(pk=self.predio.pk).exists())
+        self.assertEqual(set(self.contagens(predio=self.predio).values()), {0})
+        self.assertFalse(PagamentoRenda.objects.filter(contrato=self.contrato).exists())
+        self.assertFalse(FotoManutencao.objects.filter(manutencao_id=self.manutencao.id).exists())
+        self.assertFalse(TransicaoManutencao.objects.filter(manutencao_id=self.manutencao.id).exists())
+        self.assertEqual(self.contagens(predio=self.outro_predio), outro_antes)
+        self.assertTrue(TransicaoManutencao.objects.filter(manutencao_id=self.outra_manutencao.id).exists())
+
+        # O inquilino fica, sem contrato ativo.
+        self.inquilino.refresh_from_db()
+        self.assertTrue(self.inquilino.disponivel)
+        # O ficheiro partilhado com outra foto fica; o outro é apagado.
+        self.assertTrue(os.path.exists(fotos.caminho(self.partilhada)))
+        self.assertFalse(os.path.exists(fotos.caminho(self.so_desta)))
+
+    def test_gerente_com_predios_nao_e_apagado(self):
+        with self.assertRaises(ProtectedError):
+            remocao.remover('gerente', [self.gerente.id])
+
+        self.assertTrue(Gerente.objects.filter(pk=self.gerente.pk).exists())
+        self.assertEqual(Predio.objects.count(), 2)
+        self.assertEqual(Casa.objects.count(), 2)
+
+    def test_remover_inquilino_liberta_a_casa(self):
+        versao = Casa.objects.get(pk=self.casa.pk).versao
+        user_id = self.inquilino.user_id
+
+        remocao.remover('inquilino', [self.inquilino.id])
+
+        casa = Casa.objects.get(pk=self.casa.pk)
+        self.assertIsNone(casa.inquilino)
+        self.assertEqual(casa.versao, versao + 1)
+        self.assertFalse(Contratos.objects.filter(pk=self.contrato.pk).exists())
+        self.assertFalse(User.objects.filter(pk=user_id).exists())
+        ocupacao = Ocupacao.objects.get(casa=casa)
+        self.assertIsNone(ocupacao.inquilino)
+        self.assertIsNotNone(ocupacao.data_fim)
+        self.manutencao.refresh_from_db()
+        self.assertIsNone(self.manutencao.solicitado_por_inquilino)
+        self.assertTrue(Contratos.objects.filter(pk=self.outro_contrato.pk).exists())
+
+    def test_remocao_agendada_esconde_o_predio_ate_ser_processada(self):
+        self.client.force_login(criar_administrador())
+
+        self.client.post(reverse('deletar_predio', args=[self.predio.id]))
+
+        pedido = Remocao.objects.get()
+        self.assertEqual((pedido.modelo, pedido.objeto_id, pedido.estado), ('predio', self.predio.id, 'pendente'))
+        self.assertNotIn(self.predio, self.client.get(reverse('ver_predios')).context['predios'])
+        self.assertTrue(Predio.objects.filter(pk=self.predio.pk).exists())
+
+        remocao.processar(pedido)
+
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.estado, 'concluida')
+        self.assertGreater(pedido.linhas, 0)
+        self.assertFalse(Predio.objects.filter(pk=self.predio.pk).exists())
+
+
+    def test_remocao_so_e_executada_por_quem_a_reclama(self):
+        pedido = remocao.agendar('predio', self.predio)
+        self.assertTrue(remocao.reclamar(pedido))
+
+        # Outro processo (o cron ou outra thread) não a apanha enquanto está ativa.
+        self.assertIsNone(remocao.processar(pedido))
+        call_command('remover_em_massa', '--pendentes', stdout=StringIO())
+        self.assertTrue(Predio.objects.filter(pk=self.predio.pk).exists())
+
+        # Parada há mais do que ABANDONADA_APOS: o cron retoma-a.
+        Remocao.objects.filter(pk=pedido.pk).update(
+            atividade_em=timezone.now() - remocao.ABANDONADA_APOS - timedelta(minutes=1)
+        )
+        call_command('remover_em_massa', '--pendentes', stdout=StringIO())
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.estado, 'concluida')
+        self.assertFalse(Predio.objects.filter(pk=self.predio.pk).exists())
+
+    def test_remocao_agendada_esconde_os_dependentes_do_predio(self):
+        self.gerente.user.groups.add(Group.objects.get_or_create(name='Gerente')[0])
+        self.inquilino.user.groups.add(Group.objects.get_or_create(name='Inquilino')[0])
+        self.client.force_login(self.inquilino.user)
+        # O contexto do inquilino fica na cache antes da remoção ser pedida.
+        self.assertEqual(self.client.get(reverse('dados_pessoais_inquilino')).context['casa'], self.casa)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            remocao.agendar('predio', self.predio)
+
+        self.assertIsNone(self.client.get(reverse('dados_pessoais_inquilino')).context['casa'])
+        self.assertEqual(self.client.get(reverse('ver_financas')).context['contratos'], [])
+        self.assertEqual(list(self.client.get(reverse('ver_manutencoes_inquilino')).context['manutencoes']), [])
+
+        self.client.force_login(self.gerente.user)
+        self.assertEqual(list(self.client.get(reverse('ver_casas')).context['casas']), [self.outra_casa])
+        self.assertEqual(list(self.client.get(reverse('ver_contratos')).context['contratos']), [self.outro_contrato])
+        manutencoes = self.client.get(reverse('ver_manutencoes')).context['manutencoes']
+        self.assertEqual([m.id for m in manutencoes], [self.outra_manutencao.id])
+        self.assertEqual(
+            [c['id'] for c in self.client.get(reverse('procurar_casas')).json()['resultados']], []
+        )
+        self.assertEqual(
+            [p.id for p in self.client.get(reverse('adicionar_casa')).context['predios']], [self.outro_predio.id]
+        )
+
+@override_settings(CACHES=CACHE_LOCAL)
+class TransferenciaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.origem = criar_gerente('origem')
+        self.destino = criar_gerente('destino')
+        self.predio = Predio.objects.create(nome='Girassol', localizacao='Porto', gerente=self.origem)
+        self.fica = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=self.origem)
+
+        self.ana = criar_inquilino('ana', self.origem)
+        self.casa, _ = ocupar(self.predio, '1A', self.ana)
+        # O rui tem casa nos dois prédios: fica com o gerente atual.
+        self.rui = criar_inquilino('rui', self.origem)
+        Casa.objects.create(numero='1B', predio=self.predio, inquilino=self.rui)
+        Casa.objects.create(numero='2A', predio=self.fica, inquilino=self.rui)
+        self.manutencao = Manutencao.objects.create(tipo='geral', descricao='Porta', casa=self.casa)
+
+    def test_simular_nao_altera_nada(self):
+        impacto = transferencia.simular([self.predio.id], self.destino)
+
+        self.assertEqual(impacto['predios'], 1)
+        self.assertEqual((impacto['casas'], impacto['casas_ocupadas']), (2, 2))
+        self.assertEqual(impacto['contratos_ativos'], 1)
+        self.assertEqual(impacto['inquilinos'], 1)
+        self.assertEqual(impacto['manutencoes_abertas'], 1)
+        self.assertEqual(impacto['divididos'], [self.rui])
+        self.predio.refresh_from_db()
+        self.assertEqual(self.predio.gerente, self.origem)
+
+    def test_transferir_leva_inquilinos_e_manutencoes(self):
+        self.assertEqual(transferencia.transferir([self.predio.id], self.destino), (1, 1))
+
+        self.predio.refresh_from_db()
+        self.manutencao.refresh_from_db()
+        self.ana.refresh_from_db()
+        self.rui.refresh_from_db()
+        self.assertEqual(self.predio.gerente, self.destino)
+        self.assertEqual(self.manutencao.gerente, self.destino)
+        self.assertEqual(self.ana.gerente, self.destino)
+        self.assertEqual(self.rui.gerente, self.origem)
+        self.assertEqual(Predio.objects.get(pk=self.fica.pk).gerente, self.origem)
+
+        # Uma segunda vez não muda nada.
+        self.assertEqual(transferencia.transferir([self.predio.id], self.destino), (0, 0))
+
+    def test_editar_predio_transfere_os_inquilinos(self):
+        self.client.force_login(criar_administrador())
+
+        self.client.post(
+            reverse('editar_predio', args=[self.predio.id]),
+            {'nome': 'Girassol II', 'localizacao': 'Porto', 'gerente': self.destino.id},
+        )
+
+        self.predio.refresh_from_db()
+        self.ana.refresh_from_db()
+        self.assertEqual((self.predio.nome, self.predio.gerente), ('Girassol II', self.destino))
+        self.assertEqual(self.ana.gerente, self.destino)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class AdminEscalavelTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gerente = criar_gerente()
+        self.predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=self.gerente)
+        self.client.force_login(User.objects.create_superuser('root'))
+
+    def contratos(self, quantos):
+        for _ in range(quantos):
+            numero = Casa.objects.count()
+            ocupar(self.predio, f'{numero}A', criar_inquilino(f'inquilino{numero}', self.gerente))
+
+    def listar(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('admin:gerente_contratos_changelist'))
+        self.assertEqual(resposta.status_code, 200)
+        return resposta, len(consultas)
+
+    def test_contagem_limitada(self):
+        self.contratos(4)
+
+        with mock.patch('projecto_condominio.admin.LIMITE_CONTAGEM', 3):
+            resposta, _ = self.listar()
+
+        self.assertEqual(resposta.context['cl'].result_count, 3)
+
+    def test_consultas_nao_crescem_com_as_linhas(self):
+        self.contratos(1)
+        _, com_uma = self.listar()
+        self.contratos(5)
+
+        _, com_seis = self.listar()
+
+        self.assertEqual(com_seis, com_uma)
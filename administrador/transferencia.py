@@ -0,0 +1,133 @@
+"""
+Transferência de prédios (com as casas, os inquilinos, os contratos e as
+manutenções) de um gerente para outro.
+
+Inquilino.gerente, Manutencao.gerente, ManutencaoArquivo.gerente e
+ResolucaoDiaria.gerente são cópias do gerente do prédio; mudar só
+Predio.gerente deixava o novo gerente com as casas mas sem os inquilinos
+(ver_inquilinos, editar_contrato) nem o histórico. transferir() muda tudo
+numa transação, com um UPDATE por tabela:
+- Predio.gerente dos prédios indicados;
+- Manutencao/ManutencaoArquivo/ResolucaoDiaria.gerente desses prédios;
+- Inquilino.gerente de quem mora ou tem contrato ativo nesses prédios e não
+  tem casa nem contrato ativo noutro prédio que fique com outro gerente.
+Os inquilinos que ficam divididos entre gerentes não mudam; simular()
+mostra-os antes da transferência. Os contratos e as casas não guardam o
+gerente e acompanham os prédios.
+
+As atualizações em massa não disparam sinais: o índice de pesquisa e o
+contexto dos inquilinos em cache são atualizados aqui (ver
+projecto_condominio/pesquisa.py e inquilino/contexto.py).
+
+Com shards, o portfólio de um gerente com base própria teria de ser copiado
+entre bases; esse caso é recusado (ver dividir_por_gerente).
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from gerente.models import Casa, Contratos, Inquilino, Manutencao, ManutencaoArquivo, ResolucaoDiaria
+from inquilino.contexto import invalidar_contextos
+from projecto_condominio import pesquisa
+from projecto_condominio.sharding import alias_do_gerente, shards_configurados
+from .models import Predio
+
+
+class TransferenciaInvalida(Exception):
+    """
+    Os prédios ou o gerente de destino estão numa base de dados própria.
+    """
+
+
+def _predios(predio_ids, destino):
+    # Os prédios que já são do gerente de destino não mudam.
+    return Predio.objects.using('default').filter(pk__in=predio_ids).exclude(gerente=destino)
+
+
+def _verificar_shards(gerentes, destino):
+    """
+    Recusa a transferência se algum dos gerentes envolvidos (os atuais dos
+    prédios e dos inquilinos, e o de destino) tiver base própria: as
+    escritas abaixo são todas na base central.
+    """
+    shards = set(shards_configurados())
+    gerentes = set(gerentes) - {None}
+    if not shards or not gerentes:
+        return
+    if any(alias_do_gerente(gerente_id) in shards for gerente_id in gerentes | {destino.pk}):
+        raise TransferenciaInvalida(
+            'Um dos gerentes tem uma base de dados própria (shard); a transferência só é possível entre gerentes da base central.'
+        )
+
+
+def _inquilinos(predio_ids, destino):
+    """
+    (a transferir, divididos): os inquilinos com casa ou contrato ativo nos
+    prédios, separados pelos que têm ou não casa ou contrato ativo noutro
+    prédio de outro gerente.
+    """
+    casas = Casa.objects.using('default').filter(inquilino=OuterRef('pk'))
+    contratos = Contratos.objects.using('default').filter(inquilino=OuterRef('pk'), estado='ativo')
+    fora = Q(predio__in=predio_ids) | Q(predio__gerente=destino)
+    contratos_fora = Q(casa__predio__in=predio_ids) | Q(casa__predio__gerente=destino) | Q(casa__isnull=True)
+    # Partir das casas e dos contratos dos prédios (índices) e não de todos os inquilinos.
+    abrangidos = Inquilino.objects.using('default').filter(
+        Q(pk__in=Casa.objects.using('default').filter(predio__in=predio_ids).values('inquilino'))
+        | Q(pk__in=Contratos.objects.using('default').filter(estado='ativo', casa__predio__in=predio_ids).values('inquilino'))
+    )
+    divididos = Exists(casas.exclude(fora)) | Exists(contratos.exclude(contratos_fora))
+    return abrangidos.exclude(divididos).exclude(gerente=destino), abrangidos.filter(divididos)
+
+
+def simular(predio_ids, destino):
+    """
+    O que muda de gerente, sem alterar nada: prédios, casas (e ocupadas),
+    contratos ativos, inquilinos, manutenções (abertas, arquivadas) e os
+    inquilinos que ficam com o gerente atual por terem casa noutro prédio.
+    """
+    predios = _predios(predio_ids, destino)
+    ids = list(predios.values_list('id', flat=True))
+    casas = Casa.objects.using('default').filter(predio__in=ids)
+    manutencoes = Manutencao.objects.using('default').filter(predio__in=ids)
+    inquilinos, divididos = _inquilinos(ids, destino)
+    _verificar_shards(
+        set(predios.values_list('gerente_id', flat=True)) | set(inquilinos.values_list('gerente_id', flat=True)), destino
+    )
+    return {
+        'predios': len(ids),
+        'casas': casas.count(),
+        'casas_ocupadas': casas.filter(inquilino__isnull=False).count(),
+        'contratos_ativos': Contratos.objects.using('default').filter(estado='ativo', casa__predio__in=ids).count(),
+        'inquilinos': inquilinos.count(),
+        'manutencoes': manutencoes.count(),
+        'manutencoes_abertas': manutencoes.filter(estado__in=['pendente', 'em_progresso']).count(),
+        'manutencoes_arquivadas': ManutencaoArquivo.objects.using('default').filter(predio__in=ids).count(),
+        'divididos': list(divididos.select_related('user').order_by('user__username')),
+    }
+
+
+def transferir(predio_ids, destino):
+    """
+    Passa os prédios para o gerente `destino`. Devolve (prédios,
+    inquilinos) transferidos.
+    """
+    with transaction.atomic(using='default'):
+        predios = _predios(predio_ids, destino).select_for_update()
+        atuais = dict(predios.values_list('id', 'gerente_id'))
+        ids = list(atuais)
+        if not ids:
+            return 0, 0
+        inquilinos, _ = _inquilinos(ids, destino)
+        movidos = list(inquilinos.values_list('id', 'user_id', 'gerente_id'))
+        _verificar_shards(set(atuais.values()) | {gerente_id for _, _, gerente_id in movidos}, destino)
+
+        Predio.objects.using('default').filter(pk__in=ids).update(gerente=destino)
+        for model in (Manutencao, ManutencaoArquivo, ResolucaoDiaria):
+            model.objects.using('default').filter(predio__in=ids).update(gerente=destino)
+        Inquilino.objects.using('default').filter(pk__in=[id for id, _, _ in movidos]).update(gerente=destino)
+
+        # O gerente aparece nos documentos dos prédios, das casas e dos inquilinos.
+        pesquisa.registar_alteracao('default', 'predio', ids)
+        pesquisa.registar_alteracao('default', 'inquilino', [id for id, _, _ in movidos])
+        moradores = Inquilino.objects.using('default').filter(casas_alugadas__predio__in=ids).values_list('user_id', flat=True)
+        invalidar_contextos([user_id for _, user_id, _ in movidos] + list(moradores), using='default')
+    return len(ids), len(movidos)
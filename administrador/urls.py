@@ -20,4 +20,9 @@ urlpatterns = [
     path('predios-adicionar/', views.adicionar_predio, name='adicionar_predio'),
     path('predios-editar/<int:predio_id>/', views.editar_predio, name='editar_predio'),
     path('predios-deletar/<int:predio_id>/', views.deletar_predio, name='deletar_predio'),
+    path('predios-transferir/', views.transferir_predios, name='transferir_predios'),
+
+    # Relatórios
+    path('relatorio-ocupacao/', views.relatorio_ocupacao, name='relatorio_ocupacao'),
+    path('relatorio-manutencoes/', views.relatorio_manutencoes, name='relatorio_manutencoes'),
 ]
\ No newline at end of file
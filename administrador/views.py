@@ -1,11 +1,33 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User, Group
-from django.db.models import ProtectedError
 from django.contrib import messages
 from django.shortcuts import get_object_or_404
+from django.http import Http404
+from django.urls import reverse
 from .models import Gerente, Predio
+from .portfolio import ORDENACOES, anotar_resumo, ordenar, resumo_em_todas_as_bases
+from . import transferencia
 from django.contrib.auth.decorators import user_passes_test
+from django.core.paginator import Paginator
+from django.db import transaction
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from gerente.models import Manutencao, ResolucaoDiaria
+from gerente.ocupacao import estatisticas_por_predio
+from gerente.resolucao import estatisticas as estatisticas_de_resolucao
+from projecto_condominio.sharding import (
+    alias_do_gerente, em_todas_as_bases, gerentes_com_base_propria, shards_configurados, tem_base_propria,
+    usar_gerente,
+)
+from projecto_condominio.replica import leitura_em_replica
+from projecto_condominio import remocao, throttling
+
+# Os prédios de um gerente com base própria (shard) são lidos e alterados
+# nessa base; as transferências só são possíveis entre gerentes da central.
+PREDIO_EM_SHARD = (
+    'Este prédio pertence a um gerente com base de dados própria (shard) e não pode passar para outro gerente.'
+)
 
 # --- Funções auxiliares para verificação de permissões ---
 def is_admin(user):
@@ -23,8 +45,15 @@ def login_admin(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
 
+        # Rejeita as rajadas de tentativas antes de calcular o hash da password.
+        espera = throttling.tempo_de_espera(request, username)
+        if espera:
+            messages.error(request, f'Demasiadas tentativas de login. Tente novamente dentro de {espera} segundos.')
+            return render(request, 'administrador/login_admin.html', status=429)
+
         # 1. Autenticar o utilizador com as credenciais fornecidas
         user = authenticate(request, username=username, password=password)
+        throttling.registar_resultado(request, username, sucesso=user is not None)
 
         if user is not None:
             # 2. Verificar se o utilizador pertence ao grupo 'Administrador'
@@ -50,35 +79,89 @@ def logout_admin(request):
     messages.success(request, 'Logout realizado com sucesso.')
     return redirect('login_admin')
 
+# Como agrupar as linhas de ResolucaoDiaria no relatório de manutenções.
+AGRUPAMENTOS_RESOLUCAO = {
+    'tipo': lambda linha: linha.get_tipo_display(),
+    'predio': lambda linha: linha.predio.nome,
+    'gerente': lambda linha: linha.gerente.user.username if linha.gerente else 'Sem gerente',
+}
+
+GERENTES_POR_PAGINA = 25
+
+def _predios_de_todas_as_bases():
+    """
+    Prédios da base central e de todos os shards, por nome, sem os que estão a
+    ser removidos. Os de um gerente com base própria vêm só dessa base: os que
+    ainda estejam na central são cópias de antes da divisão.
+    """
+    predios = list(
+        Predio.objects.exclude(gerente_id__in=gerentes_com_base_propria())
+        .exclude(pk__in=remocao.ocultos('predio', 'default')).select_related('gerente__user')
+    )
+    for alias in shards_configurados():
+        predios.extend(
+            Predio.objects.using(alias).exclude(pk__in=remocao.ocultos('predio', alias)).select_related('gerente__user')
+        )
+    predios.sort(key=lambda predio: predio.nome)
+    return predios
+
+def _obter_predio(request, predio_id):
+    """
+    O prédio, lido da base onde está: a do gerente indicado em ?gerente= (os
+    links das listagens indicam-no, porque os ids de bases diferentes podem
+    repetir-se) ou, sem ele, a do gerente da linha na base central.
+    """
+    gerente_id = request.GET.get('gerente', '')
+    if gerente_id.isdigit():
+        gerente_id = int(gerente_id)
+    else:
+        gerente_id = get_object_or_404(Predio.objects.using('default'), pk=predio_id).gerente_id
+    alias = alias_do_gerente(gerente_id) if tem_base_propria(gerente_id) else 'default'
+    predio = get_object_or_404(Predio.objects.using(alias), pk=predio_id)
+    if alias != 'default' and predio.gerente_id != gerente_id:
+        raise Http404('Prédio não encontrado.')
+    return predio
+
 # --- Views protegidas por login e permissão ---
 
 @user_passes_test(is_admin, login_url='login_admin')
+@leitura_em_replica
 def dashboard_admin(request):
     """
     Renderiza o dashboard principal com a tabela de prédios.
+    Junta os prédios da base central e de todos os shards dos gerentes.
     """
-    predios = Predio.objects.all()
-    context = {'predios': predios}
+    context = {'predios': _predios_de_todas_as_bases()}
     return render(request, 'administrador/dashboard_admin.html', context)
 
 @user_passes_test(is_admin, login_url='login_admin')
+@leitura_em_replica
 def ver_gerentes(request):
     """
     Renderiza a página para gerenciar gerentes.
-    Exibe a lista de gerentes e botões de ação.
+    Exibe a lista de gerentes, com o resumo do portfólio de cada um
+    (ordenável por ?ordem= e paginada), e botões de ação.
     """
-    gerentes = Gerente.objects.all()
-    context = {'gerentes': gerentes}
+    ordem = request.GET.get('ordem', 'nome')
+    if ordem.lstrip('-') not in ORDENACOES:
+        ordem = 'nome'
+    gerentes = anotar_resumo(Gerente.objects.exclude(pk__in=remocao.ocultos('gerente')).select_related('user'))
+    if shards_configurados():
+        gerentes = resumo_em_todas_as_bases(gerentes, ordem)
+    else:
+        gerentes = ordenar(gerentes, ordem)
+    pagina = Paginator(gerentes, GERENTES_POR_PAGINA).get_page(request.GET.get('pagina'))
+    context = {'gerentes': pagina.object_list, 'pagina': pagina, 'ordem': ordem}
     return render(request, 'administrador/ver_gerentes.html', context)
 
 @user_passes_test(is_admin, login_url='login_admin')
+@leitura_em_replica
 def ver_predios(request):
     """
     Renderiza a página para gerenciar prédios.
     Exibe a lista de prédios e botões de ação.
     """
-    predios = Predio.objects.all()
-    context = {'predios': predios}
+    context = {'predios': _predios_de_todas_as_bases()}
     return render(request, 'administrador/ver_predios.html', context)
 
 # Views de Adição
@@ -123,11 +206,13 @@ def adicionar_predio(request):
         gerente_id = request.POST.get('gerente')
         gerente = get_object_or_404(Gerente, pk=gerente_id)
         try:
-            Predio.objects.create(
-                nome=nome,
-                localizacao=localizacao,
-                gerente=gerente
-            )
+            # Criado na base do gerente, se tiver uma própria.
+            with usar_gerente(gerente.id):
+                Predio.objects.create(
+                    nome=nome,
+                    localizacao=localizacao,
+                    gerente=gerente
+                )
             messages.success(request, 'Prédio criado com sucesso!')
         except Exception as e:
             messages.error(request, f'Erro ao criar o prédio: {e}')
@@ -169,38 +254,90 @@ def editar_predio(request, predio_id):
     """
     View para o administrador editar um prédio.
     """
-    predio = get_object_or_404(Predio, pk=predio_id)
+    predio = _obter_predio(request, predio_id)
     gerentes = Gerente.objects.all()
     if request.method == 'POST':
         nome = request.POST.get('nome')
         localizacao = request.POST.get('localizacao')
         gerente_id = request.POST.get('gerente')
         gerente = get_object_or_404(Gerente, pk=gerente_id)
+        voltar = redirect(f"{reverse('editar_predio', args=[predio_id])}?gerente={predio.gerente_id}")
+        alias = predio._state.db
+        if alias != 'default' and gerente.pk != predio.gerente_id:
+            messages.error(request, PREDIO_EM_SHARD)
+            return voltar
         try:
             predio.nome = nome
             predio.localizacao = localizacao
-            predio.gerente = gerente
-            predio.save()
+            with usar_gerente(predio.gerente_id), transaction.atomic(using=alias):
+                predio.save()
+                if alias == 'default':
+                    # Os inquilinos, as manutenções e as resoluções acompanham o prédio.
+                    transferencia.transferir([predio.id], gerente)
             messages.success(request, 'Prédio atualizado com sucesso!')
+        except transferencia.TransferenciaInvalida as e:
+            messages.error(request, str(e))
         except Exception as e:
             messages.error(request, f'Erro ao atualizar o prédio: {e}')
-        return redirect('editar_predio', predio_id=predio_id)
+        return voltar
     context = {'predio': predio, 'gerentes': gerentes}
     return render(request, 'administrador/editar_predio.html', context)
 
+@user_passes_test(is_admin, login_url='login_admin')
+def transferir_predios(request):
+    """
+    Passa prédios de um gerente para outro, com os inquilinos, os contratos
+    e as manutenções. "Simular" mostra o que muda; "Transferir" aplica tudo
+    numa transação (ver administrador/transferencia.py).
+    """
+    gerentes = Gerente.objects.select_related('user').order_by('user__username')
+    origem = request.POST.get('origem') or request.GET.get('origem', '')
+    predios = Predio.objects.exclude(pk__in=remocao.ocultos('predio')).order_by('nome')
+    if origem:
+        predios = predios.filter(gerente_id=origem)
+    dados = {'origem': origem, 'destino': '', 'predios': []}
+    impacto = None
+
+    if request.method == 'POST':
+        dados['destino'] = request.POST.get('destino', '')
+        dados['predios'] = [int(i) for i in request.POST.getlist('predios') if i.isdigit()]
+        if not dados['destino'] or not dados['predios']:
+            messages.error(request, 'Escolha os prédios e o gerente de destino.')
+            return redirect('transferir_predios')
+        destino = get_object_or_404(Gerente, pk=dados['destino'])
+        try:
+            if request.POST.get('acao') == 'transferir':
+                total_predios, total_inquilinos = transferencia.transferir(dados['predios'], destino)
+                messages.success(
+                    request, f'{total_predios} prédios e {total_inquilinos} inquilinos transferidos para {destino.user.username}.'
+                )
+                return redirect('ver_predios')
+            impacto = transferencia.simular(dados['predios'], destino)
+        except transferencia.TransferenciaInvalida as e:
+            messages.error(request, str(e))
+
+    context = {'gerentes': gerentes, 'predios': predios, 'dados': dados, 'impacto': impacto}
+    return render(request, 'administrador/transferir_predios.html', context)
+
 # Views de Deleção
 @user_passes_test(is_admin, login_url='login_admin')
 def deletar_gerente(request, gerente_id):
     """
-    Deleta um gerente via requisição POST.
+    Deleta um gerente via requisição POST. O gerente sai logo da lista; o
+    utilizador e as referências ao gerente são tratados em segundo plano
+    (ver projecto_condominio/remocao.py).
     """
     if request.method == 'POST':
         gerente_perfil = get_object_or_404(Gerente, pk=gerente_id)
+        # O Predio.gerente é PROTECT: verificado já, para a resposta o indicar
+        # (também na base própria do gerente, se tiver uma).
+        bases = ['default'] + ([alias_do_gerente(gerente_perfil.pk)] if tem_base_propria(gerente_perfil.pk) else [])
+        if any(Predio.objects.using(alias).filter(gerente=gerente_perfil).exists() for alias in bases):
+            messages.error(request, 'Este gerente não pode ser deletado porque está associado a um ou mais prédios.')
+            return redirect('ver_gerentes')
         try:
-            gerente_perfil.user.delete()
+            remocao.agendar('gerente', gerente_perfil, request.user)
             messages.success(request, 'Gerente deletado com sucesso!')
-        except ProtectedError:
-            messages.error(request, 'Este gerente não pode ser deletado porque está associado a um ou mais prédios.')
         except Exception as e:
             messages.error(request, f'Erro ao deletar o gerente: {e}')
     return redirect('ver_gerentes')
@@ -208,13 +345,87 @@ def deletar_gerente(request, gerente_id):
 @user_passes_test(is_admin, login_url='login_admin')
 def deletar_predio(request, predio_id):
     """
-    Deleta um prédio via requisição POST.
+    Deleta um prédio via requisição POST. O prédio sai logo da lista; as
+    casas, contratos, pagamentos e manutenções são apagados por lotes em
+    segundo plano (ver projecto_condominio/remocao.py).
     """
     if request.method == 'POST':
-        predio = get_object_or_404(Predio, pk=predio_id)
+        predio = _obter_predio(request, predio_id)
         try:
-            predio.delete()
+            # Registada com a base do prédio (a do gerente, se tiver uma própria).
+            with usar_gerente(predio.gerente_id):
+                remocao.agendar('predio', predio, request.user)
             messages.success(request, 'Prédio deletado com sucesso!')
         except Exception as e:
             messages.error(request, f'Erro ao deletar o prédio: {e}')
-    return redirect('ver_predios')
\ No newline at end of file
+    return redirect('ver_predios')
+
+# Relatórios
+@user_passes_test(is_admin, login_url='login_admin')
+@leitura_em_replica
+def relatorio_ocupacao(request):
+    """
+    Taxa de vacância, rotatividade e tempo até arrendar por prédio num período.
+    Por omissão, os últimos 12 meses.
+    """
+    fim = date.today()
+    inicio = fim - relativedelta(years=1)
+    try:
+        if request.GET.get('inicio'):
+            inicio = date.fromisoformat(request.GET['inicio'])
+        if request.GET.get('fim'):
+            fim = date.fromisoformat(request.GET['fim'])
+    except ValueError:
+        messages.error(request, 'Datas inválidas. Use o formato AAAA-MM-DD.')
+
+    if inicio >= fim:
+        messages.error(request, 'A data de início tem de ser anterior à data de fim.')
+        predios = []
+    else:
+        predios = []
+        for queryset in [Predio.objects.all()] + [Predio.objects.using(alias) for alias in shards_configurados()]:
+            predios.extend(estatisticas_por_predio(inicio, fim, queryset))
+        predios.sort(key=lambda predio: predio.nome)
+
+    context = {'predios': predios, 'inicio': inicio, 'fim': fim}
+    return render(request, 'administrador/relatorio_ocupacao.html', context)
+
+
+@user_passes_test(is_admin, login_url='login_admin')
+@leitura_em_replica
+def relatorio_manutencoes(request):
+    """
+    Tempos de resolução (média, p50 e p90, em horas) das manutenções
+    concluídas num período, agrupados por tipo, prédio ou gerente.
+    Lê os agregados diários (ResolucaoDiaria), não as manutenções.
+    Por omissão, os últimos 90 dias agrupados por tipo.
+    """
+    fim = date.today()
+    inicio = fim - relativedelta(days=90)
+    try:
+        if request.GET.get('inicio'):
+            inicio = date.fromisoformat(request.GET['inicio'])
+        if request.GET.get('fim'):
+            fim = date.fromisoformat(request.GET['fim'])
+    except ValueError:
+        messages.error(request, 'Datas inválidas. Use o formato AAAA-MM-DD.')
+
+    agrupar = request.GET.get('agrupar', 'tipo')
+    if agrupar not in AGRUPAMENTOS_RESOLUCAO:
+        agrupar = 'tipo'
+    tipo = request.GET.get('tipo', '')
+
+    linhas = ResolucaoDiaria.objects.filter(dia__gte=inicio, dia__lte=fim).select_related('predio', 'gerente__user')
+    if tipo:
+        linhas = linhas.filter(tipo=tipo)
+    grupos = estatisticas_de_resolucao(em_todas_as_bases(linhas), AGRUPAMENTOS_RESOLUCAO[agrupar])
+
+    context = {
+        'grupos': grupos,
+        'inicio': inicio,
+        'fim': fim,
+        'agrupar': agrupar,
+        'tipo': tipo,
+        'tipo_choices': Manutencao.TIPO_CHOICES,
+    }
+    return render(request, 'administrador/relatorio_manutencoes.html', context)
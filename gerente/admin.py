@@ -1,3 +1,121 @@
 from django.contrib import admin
 
-# Register your models here.
+from projecto_condominio.admin import AdminEscalavel
+from .models import (
+    Casa, Contratos, FotoManutencao, Inquilino, Manutencao, ManutencaoArquivo, Ocupacao, ResolucaoDiaria,
+    TransicaoManutencao,
+)
+
+
+@admin.register(Inquilino)
+class InquilinoAdmin(AdminEscalavel):
+    list_display = ('__str__', 'user', 'contacto', 'gerente', 'disponivel')
+    list_select_related = ('user', 'gerente__user')
+    list_filter = ('disponivel',)
+    search_fields = ('user__username', 'user__first_name', 'user__last_name', 'contacto')
+    autocomplete_fields = ('user', 'gerente')
+    ordering = ('-pk',)
+
+
+@admin.register(Casa)
+class CasaAdmin(AdminEscalavel):
+    list_display = ('numero', 'predio', 'inquilino')
+    list_select_related = ('predio', 'inquilino__user')
+    search_fields = ('numero', 'predio__nome')
+    autocomplete_fields = ('predio', 'inquilino')
+    ordering = ('-pk',)
+
+
+@admin.register(Ocupacao)
+class OcupacaoAdmin(AdminEscalavel):
+    list_display = ('casa', 'inquilino', 'data_inicio', 'data_fim', 'dias_vago_antes')
+    list_select_related = ('casa__predio', 'inquilino__user')
+    date_hierarchy = 'data_inicio'
+    raw_id_fields = ('casa', 'inquilino')
+
+
+@admin.register(Contratos)
+class ContratosAdmin(AdminEscalavel):
+    list_display = ('__str__', 'inquilino', 'casa', 'data_inicio', 'data_fim', 'valor_renda', 'estado')
+    list_select_related = ('inquilino__user', 'casa__predio')
+    list_filter = ('estado',)
+    date_hierarchy = 'data_fim'
+    search_fields = ('inquilino__user__username', 'casa__numero')
+    autocomplete_fields = ('inquilino', 'casa')
+
+
+class TransicaoManutencaoInline(admin.TabularInline):
+    model = TransicaoManutencao
+    fields = ('estado_anterior', 'estado_novo', 'data', 'alterado_por')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('alterado_por')
+
+
+class FotoManutencaoInline(admin.TabularInline):
+    model = FotoManutencao
+    fields = ('nome_original', 'extensao', 'tamanho', 'variantes_prontas', 'data_envio')
+    readonly_fields = fields
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Manutencao)
+class ManutencaoAdmin(AdminEscalavel):
+    list_display = ('id', 'tipo', 'estado', 'casa', 'predio', 'gerente', 'data_solicitacao', 'data_conclusao')
+    list_select_related = ('casa__predio', 'predio', 'gerente__user')
+    list_filter = ('estado', 'tipo')
+    date_hierarchy = 'data_solicitacao'
+    search_fields = ('=id', 'descricao')
+    raw_id_fields = ('casa', 'predio', 'solicitado_por_inquilino', 'solicitado_por_gerente')
+    # Resolvidos em Manutencao.save().
+    readonly_fields = ('gerente', 'data_conclusao')
+    inlines = [FotoManutencaoInline, TransicaoManutencaoInline]
+
+    def save_model(self, request, obj, form, change):
+        # Fica registado em TransicaoManutencao (ver gerente/signals.py).
+        obj._alterado_por = request.user
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(ManutencaoArquivo)
+class ManutencaoArquivoAdmin(AdminEscalavel):
+    list_display = ('id', 'tipo', 'estado', 'casa', 'predio', 'gerente', 'data_solicitacao', 'data_arquivo')
+    list_select_related = ('casa__predio', 'predio', 'gerente__user')
+    list_filter = ('estado', 'tipo')
+    date_hierarchy = 'data_solicitacao'
+    search_fields = ('=id',)
+    raw_id_fields = ('casa', 'predio', 'solicitado_por_inquilino', 'solicitado_por_gerente', 'gerente')
+
+
+@admin.register(FotoManutencao)
+class FotoManutencaoAdmin(AdminEscalavel):
+    list_display = ('id', 'manutencao_id', 'nome_original', 'extensao', 'tamanho', 'variantes_prontas', 'data_envio')
+    search_fields = ('=sha256',)
+    raw_id_fields = ('manutencao',)
+    readonly_fields = ('sha256', 'extensao', 'tamanho', 'data_envio')
+
+
+@admin.register(TransicaoManutencao)
+class TransicaoManutencaoAdmin(AdminEscalavel):
+    list_display = ('manutencao_id', 'estado_anterior', 'estado_novo', 'data', 'alterado_por')
+    list_select_related = ('alterado_por',)
+    search_fields = ('=manutencao__id',)
+    raw_id_fields = ('manutencao', 'alterado_por')
+
+
+@admin.register(ResolucaoDiaria)
+class ResolucaoDiariaAdmin(AdminEscalavel):
+    list_display = ('dia', 'tipo', 'predio', 'gerente', 'total', 'soma_horas')
+    list_select_related = ('predio', 'gerente__user')
+    list_filter = ('tipo',)
+    date_hierarchy = 'dia'
+    raw_id_fields = ('predio', 'gerente')
@@ -0,0 +1,191 @@
+"""
+Atribuição de casas nos contratos sem atualizações perdidas.
+
+As views validam a casa e o inquilino com leituras normais, fora da
+transação. A escrita é um UPDATE condicional que só passa se a casa estiver
+como foi lida: mesmo inquilino (nenhum, se estava vaga) e mesma
+Casa.versao, que aumenta em cada gravação. Se a contagem de linhas vier a
+zero, outro pedido chegou primeiro. Se a casa continua disponível e só
+mudou a versão (por exemplo, o número foi editado), volta-se a ler e tenta-se
+de novo. Se já não está disponível, é levantado Indisponivel.
+
+O UPDATE condicional é a primeira instrução de cada transação. Assim, no
+SQLite, o bloqueio de escrita é pedido logo no início (e espera pelo
+timeout). Não há transações que começam a ler e falham com "database is
+locked" ao tentar passar a escrever. Se ainda assim a base de dados estiver
+bloqueada, a transação, que é curta, é repetida.
+"""
+import random
+import time
+
+from django.db import OperationalError, router, transaction
+from django.db.models import F
+
+from inquilino.contexto import invalidar_contextos_de_inquilinos
+from .models import Casa, Contratos, Inquilino
+from .ocupacao import registar_mudanca
+
+TENTATIVAS = 5
+# Espera base entre tentativas, em segundos (cresce a cada tentativa).
+ESPERA = 0.05
+
+
+class Indisponivel(Exception):
+    """
+    A casa ou o inquilino deixou de estar livre entre a leitura e a escrita.
+    """
+
+
+def _base_de_dados():
+    # Com shards, a casa vive no shard do gerente atual (ver sharding.py).
+    return router.db_for_write(Casa) or 'default'
+
+
+def _bloqueada(erro):
+    return 'locked' in str(erro) or 'busy' in str(erro)
+
+
+def _com_tentativas(operacao):
+    """
+    Executa operacao(alias) numa transação e repete-a se a casa mudou
+    entretanto (operacao devolve False) ou se a base de dados estava
+    bloqueada.
+    """
+    alias = _base_de_dados()
+    for tentativa in range(TENTATIVAS):
+        try:
+            with transaction.atomic(using=alias):
+                resultado = operacao(alias)
+        except OperationalError as erro:
+            if not _bloqueada(erro) or tentativa == TENTATIVAS - 1:
+                raise
+            # Espera com variação aleatória, para os pedidos não voltarem todos ao mesmo tempo.
+            time.sleep(ESPERA * (2 ** tentativa) * random.uniform(0.5, 1.5))
+            continue
+        if resultado is not False:
+            return resultado
+        # Só mudou a versão: tenta logo de novo com a versão relida.
+    raise Indisponivel('A casa está a ser alterada por outro utilizador. Tente novamente.')
+
+
+def _trocar_inquilino(alias, casa_id, versao, esperado, novo):
+    """
+    UPDATE casa SET inquilino = novo, versao = versao + 1
+    WHERE id = casa_id AND versao = versao AND inquilino = esperado.
+    Devolve True se a linha foi alterada.
+    """
+    alterada = Casa.objects.using(alias).filter(pk=casa_id, versao=versao, inquilino_id=esperado).update(
+        inquilino_id=novo, versao=F('versao') + 1
+    )
+    if alterada:
+        # O update() não dispara os sinais de Casa (ver gerente/signals.py).
+        registar_mudanca(casa_id, novo, using=alias)
+        invalidar_contextos_de_inquilinos([esperado, novo], using=alias)
+    return bool(alterada)
+
+
+def _reler(alias, casa, esperado):
+    """
+    Depois de um UPDATE sem efeito: Indisponivel se a casa já não tem o
+    inquilino esperado, senão atualiza casa.versao para a próxima tentativa.
+    """
+    atual = Casa.objects.using(alias).filter(pk=casa.pk).values('inquilino_id', 'versao').first()
+    if atual is None or atual['inquilino_id'] != esperado:
+        raise Indisponivel('Esta casa já não está vaga.')
+    casa.versao = atual['versao']
+
+
+def _libertar(alias, casa_id, inquilino_id):
+    """
+    Liberta a casa só se ainda estiver com o inquilino do contrato. Sem casa
+    (contratos antigos, anteriores a Contratos.casa), liberta as casas do
+    inquilino.
+    """
+    casas = Casa.objects.using(alias).filter(inquilino_id=inquilino_id)
+    if casa_id is not None:
+        # O UPDATE condicional continua a ser a primeira instrução da transação.
+        ids = [casa_id] if casas.filter(pk=casa_id).update(inquilino_id=None, versao=F('versao') + 1) else []
+    else:
+        ids = list(casas.values_list('pk', flat=True))
+        casas.filter(pk__in=ids).update(inquilino_id=None, versao=F('versao') + 1)
+    if not ids:
+        return
+    for casa_id in ids:
+        registar_mudanca(casa_id, None, using=alias)
+    invalidar_contextos_de_inquilinos([inquilino_id], using=alias)
+
+
+def _reservar_inquilino(alias, inquilino_id):
+    # Dois contratos ao mesmo tempo para o mesmo inquilino: só o primeiro passa.
+    # O sinal de Contratos recalcula depois o valor definitivo.
+    if not Inquilino.objects.using(alias).filter(pk=inquilino_id, disponivel=True).update(disponivel=False):
+        raise Indisponivel('Este inquilino já tem um contrato ativo.')
+
+
+def criar_contrato(inquilino, casa, duracao_meses, valor_renda, data_inicio):
+    """
+    Cria o contrato e atribui a casa (que estava vaga quando foi lida) ao
+    inquilino. Levanta Indisponivel se a casa ou o inquilino foram ocupados
+    entretanto.
+    """
+    def operacao(alias):
+        if not _trocar_inquilino(alias, casa.pk, casa.versao, None, inquilino.pk):
+            _reler(alias, casa, None)
+            return False
+        _reservar_inquilino(alias, inquilino.pk)
+        return Contratos.objects.using(alias).create(
+            inquilino=inquilino,
+            casa=casa,
+            data_inicio=data_inicio,
+            valor_renda=valor_renda,
+            duracao_meses=duracao_meses,
+        )
+
+    return _com_tentativas(operacao)
+
+
+def alterar_contrato(contrato, novo_inquilino, nova_casa, duracao_meses, valor_renda):
+    """
+    Atualiza o contrato. Se mudar de casa, liberta a anterior (se ainda for
+    do inquilino do contrato) e ocupa a nova, que tem de estar vaga. Se
+    mantiver a casa e mudar de inquilino, a casa passa diretamente para o
+    novo inquilino.
+    """
+    inquilino_anterior = contrato.inquilino_id
+    casa_anterior = contrato.casa_id
+
+    def operacao(alias):
+        if nova_casa.pk == casa_anterior:
+            # A casa do contrato: tem de continuar com o inquilino do contrato.
+            esperado = inquilino_anterior
+        else:
+            esperado = None
+        if esperado != novo_inquilino.pk or nova_casa.pk != casa_anterior:
+            if not _trocar_inquilino(alias, nova_casa.pk, nova_casa.versao, esperado, novo_inquilino.pk):
+                _reler(alias, nova_casa, esperado)
+                return False
+        if novo_inquilino.pk != inquilino_anterior:
+            _reservar_inquilino(alias, novo_inquilino.pk)
+        if casa_anterior is not None and casa_anterior != nova_casa.pk:
+            _libertar(alias, casa_anterior, inquilino_anterior)
+
+        contrato.inquilino = novo_inquilino
+        contrato.casa = nova_casa
+        contrato.duracao_meses = duracao_meses
+        contrato.valor_renda = valor_renda
+        contrato.save(using=alias)
+        return contrato
+
+    return _com_tentativas(operacao)
+
+
+def apagar_contrato(contrato):
+    """
+    Apaga o contrato e liberta a casa, se ainda for do inquilino do contrato.
+    """
+    def operacao(alias):
+        _libertar(alias, contrato.casa_id, contrato.inquilino_id)
+        contrato.delete(using=alias)
+        return True
+
+    return _com_tentativas(operacao)
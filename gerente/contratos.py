@@ -0,0 +1,56 @@
+"""
+Aritmética de datas dos contratos: tempo que falta até ao fim de um contrato
+(coluna "Duração restante" em ver_contratos).
+
+Dá o mesmo resultado que relativedelta(data_fim, hoje), mas com aritmética
+de inteiros sobre (ano, mês, dia), sem criar objetos relativedelta por
+contrato.
+
+`python manage.py medir_calculos` mede estas funções (e o plano de
+pagamentos de inquilino/services.py) e falha se ficarem mais lentas.
+"""
+from calendar import monthrange
+from datetime import date
+
+
+def _somar_meses(dia, meses):
+    """
+    dia + relativedelta(months=meses): o dia é limitado ao fim do mês.
+    """
+    ano, mes = divmod(dia.month - 1 + meses, 12)
+    ano += dia.year
+    return date(ano, mes + 1, min(dia.day, monthrange(ano, mes + 1)[1]))
+
+
+def tempo_restante(data_fim, hoje):
+    """
+    (anos, meses, dias) de hoje até data_fim, como relativedelta(data_fim,
+    hoje). Um contrato que já terminou (ou termina hoje) dá (0, 0, 0).
+    """
+    if data_fim <= hoje:
+        return 0, 0, 0
+    meses = (data_fim.year - hoje.year) * 12 + data_fim.month - hoje.month
+    limite = _somar_meses(hoje, meses)
+    if limite > data_fim:
+        # Ainda não se chegou ao dia do mês de hoje no mês do fim.
+        meses -= 1
+        limite = _somar_meses(hoje, meses)
+    anos, meses = divmod(meses, 12)
+    return anos, meses, (data_fim - limite).days
+
+
+def tempos_restantes(datas_fim, hoje):
+    """
+    tempo_restante() para uma lista de datas de fim.
+    """
+    return [tempo_restante(data_fim, hoje) for data_fim in datas_fim]
+
+
+def descrever_tempo_restante(anos, meses, dias):
+    if anos > 0:
+        return f'{anos} anos e {meses} meses'
+    if meses > 0:
+        return f'{meses} meses'
+    if dias > 0:
+        return f'{dias} dias'
+    return 'Expirado'
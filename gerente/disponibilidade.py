@@ -0,0 +1,55 @@
+"""
+Casas vagas e inquilinos disponíveis para os formulários de contratos.
+
+Uma casa está vaga quando não tem inquilino (índice parcial casa_vaga_idx).
+Um inquilino está disponível quando não tem nenhum contrato ativo; como isso
+exigiria um anti-join em cada procura, o valor é guardado em
+Inquilino.disponivel (índice parcial inquilino_disponivel_idx) e recalculado
+aqui sempre que os contratos de um inquilino mudam.
+"""
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Casa, Contratos, Inquilino
+
+# Número máximo de sugestões devolvidas por cada procura.
+LIMITE = 10
+
+
+def atualizar_disponibilidade(inquilino_ids, using=None):
+    """
+    Recalcula Inquilino.disponivel para os inquilinos indicados, com um
+    único UPDATE. Deve ser chamado por quem altera contratos com update()
+    ou bulk_create() (os sinais só cobrem save() e delete()).
+    """
+    ids = {i for i in inquilino_ids if i is not None}
+    if not ids:
+        return
+    contrato_ativo = Contratos.objects.using(using).filter(inquilino=OuterRef('pk'), estado='ativo')
+    Inquilino.objects.using(using).filter(id__in=ids).update(disponivel=~Exists(contrato_ativo))
+
+
+def procurar_casas_vagas(gerente, termo, limite=LIMITE):
+    """
+    Casas vagas do gerente cujo número ou nome do prédio começa por `termo`.
+    """
+    # O remocao importa este módulo.
+    from projecto_condominio.remocao import visiveis
+
+    casas = visiveis(Casa.objects.filter(predio__gerente=gerente, inquilino__isnull=True), casa='pk', predio='predio')
+    if termo:
+        casas = casas.filter(Q(numero__istartswith=termo) | Q(predio__nome__istartswith=termo))
+    casas = casas.order_by('predio__nome', 'numero').values('id', 'numero', 'predio__nome')[:limite]
+    return [{'id': c['id'], 'texto': f"{c['predio__nome']} - Casa {c['numero']}"} for c in casas]
+
+
+def procurar_inquilinos_disponiveis(gerente, termo, limite=LIMITE):
+    """
+    Inquilinos disponíveis do gerente cujo nome de utilizador começa por `termo`.
+    """
+    from projecto_condominio.remocao import visiveis
+
+    inquilinos = visiveis(Inquilino.objects.filter(gerente=gerente, disponivel=True), inquilino='pk')
+    if termo:
+        inquilinos = inquilinos.filter(user__username__istartswith=termo)
+    inquilinos = inquilinos.order_by('user__username').values('id', 'user__username')[:limite]
+    return [{'id': i['id'], 'texto': i['user__username']} for i in inquilinos]
@@ -0,0 +1,216 @@
+"""
+Fotos anexadas às manutenções.
+
+- O upload é gravado num ficheiro temporário em blocos (nunca fica todo em
+  memória) e o SHA-256 é calculado à medida que os blocos chegam
+  (FotoUploadHandler).
+- Cada foto é guardada em MEDIA_ROOT/manutencoes/<ab>/<sha256>.<ext>: enviar
+  duas vezes a mesma imagem não ocupa espaço a dobrar.
+- A miniatura e a versão reduzida são geradas numa thread de fundo depois do
+  commit, fora do pedido. Usam o Pillow, que é opcional: sem ele, as fotos
+  ficam com variantes_prontas=False e as listagens mostram apenas ligações
+  para o original. `python manage.py gerar_miniaturas` processa as
+  pendentes (por exemplo, depois de instalar o Pillow).
+- Uma imagem que o Pillow não consegue ler (corrompida, ou WebP num Pillow
+  sem suporte para o formato) fica sem variantes e é registada no log; as
+  restantes do lote são processadas na mesma.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import close_old_connections, transaction
+
+from .models import FotoManutencao
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_MAXIMO = 10 * 1024 * 1024
+MAXIMO_POR_PEDIDO = 5
+
+# Assinaturas (primeiros bytes) dos formatos aceites.
+ASSINATURAS = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF8', 'gif'),
+]
+
+# Lado maior (em píxeis) de cada variante.
+VARIANTES = {'mini': 240, 'media': 1280}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='miniaturas')
+
+
+class FotoUploadHandler(TemporaryFileUploadHandler):
+    """
+    Grava cada ficheiro num temporário, em blocos, e calcula o SHA-256 ao
+    mesmo tempo. Ficheiros acima de TAMANHO_MAXIMO são descartados.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hash = hashlib.sha256()
+        self.recebido = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.recebido += len(raw_data)
+        if self.recebido > TAMANHO_MAXIMO:
+            raise SkipFile()
+        self.hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        ficheiro = super().file_complete(file_size)
+        ficheiro.sha256 = self.hash.hexdigest()
+        return ficheiro
+
+
+def _diretorio(sha256):
+    return os.path.join(settings.MEDIA_ROOT, 'manutencoes', sha256[:2])
+
+
+def caminho(foto, variante=None):
+    """
+    Caminho do original ou de uma variante ('mini', 'media').
+    """
+    if variante:
+        return os.path.join(_diretorio(foto.sha256), f'{foto.sha256}_{variante}.jpg')
+    return os.path.join(_diretorio(foto.sha256), f'{foto.sha256}.{foto.extensao}')
+
+
+def _extensao(ficheiro):
+    ficheiro.seek(0)
+    inicio = ficheiro.read(16)
+    ficheiro.seek(0)
+    for assinatura, extensao in ASSINATURAS:
+        if inicio.startswith(assinatura):
+            return extensao
+    if inicio[:4] == b'RIFF' and inicio[8:12] == b'WEBP' and _le_webp():
+        return 'webp'
+    return None
+
+
+def _le_webp():
+    """
+    O WebP só é aceite se o Pillow o conseguir ler (o suporte depende da
+    libwebp com que foi compilado). Sem o Pillow, nenhuma imagem tem
+    variantes e o WebP é aceite como os outros formatos.
+    """
+    try:
+        from PIL import features
+    except ImportError:
+        return True
+    return features.check('webp')
+
+
+def guardar_fotos(manutencao, ficheiros):
+    """
+    Move os uploads (já em disco) para o armazenamento por conteúdo e cria
+    as FotoManutencao. Devolve (fotos criadas, nomes rejeitados).
+    """
+    fotos, rejeitados = [], []
+    for ficheiro in ficheiros[:MAXIMO_POR_PEDIDO]:
+        extensao = _extensao(ficheiro)
+        sha256 = getattr(ficheiro, 'sha256', None)
+        if extensao is None or sha256 is None:
+            rejeitados.append(ficheiro.name)
+            continue
+        foto = FotoManutencao(
+            manutencao=manutencao, sha256=sha256, extensao=extensao,
+            tamanho=ficheiro.size, nome_original=ficheiro.name[:255],
+        )
+        destino = caminho(foto)
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            file_move_safe(ficheiro.temporary_file_path(), destino, allow_overwrite=True)
+        fotos.append(foto)
+    rejeitados.extend(f.name for f in ficheiros[MAXIMO_POR_PEDIDO:])
+
+    # Uma imagem já conhecida reaproveita as variantes existentes.
+    prontas = set(
+        FotoManutencao.objects.filter(sha256__in={f.sha256 for f in fotos}, variantes_prontas=True)
+        .values_list('sha256', flat=True)
+    )
+    for foto in fotos:
+        foto.variantes_prontas = foto.sha256 in prontas
+    FotoManutencao.objects.bulk_create(fotos)
+
+    pendentes = [f.sha256 for f in fotos if not f.variantes_prontas]
+    if pendentes:
+        transaction.on_commit(lambda: _executor.submit(_gerar_em_fundo, pendentes))
+    return fotos, rejeitados
+
+
+def _gerar_em_fundo(hashes):
+    try:
+        gerar_variantes(hashes)
+    except Exception:
+        logger.exception('Falha ao gerar miniaturas das fotos de manutenção.')
+    finally:
+        close_old_connections()
+
+
+def gerar_variantes(hashes):
+    """
+    Gera as variantes de cada imagem (uma vez por conteúdo) e marca as
+    fotos correspondentes como prontas. Devolve o número de imagens
+    processadas (as que não se conseguiram ler não contam), ou None se o
+    Pillow não estiver instalado.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    # Uma foto por conteúdo: as restantes partilham os mesmos ficheiros.
+    uma_por_hash = {f.sha256: f for f in FotoManutencao.objects.filter(sha256__in=set(hashes))}
+    feitas = []
+    for foto in uma_por_hash.values():
+        try:
+            with Image.open(caminho(foto)) as imagem:
+                imagem = ImageOps.exif_transpose(imagem).convert('RGB')
+                for variante, lado in VARIANTES.items():
+                    copia = imagem.copy()
+                    copia.thumbnail((lado, lado))
+                    copia.save(caminho(foto, variante), 'JPEG', quality=80, optimize=True)
+        except Exception:
+            # Uma imagem ilegível não impede as restantes; fica sem variantes.
+            logger.exception('Não foi possível gerar as variantes da foto %s (%s).', foto.id, foto.sha256)
+            continue
+        feitas.append(foto.sha256)
+    FotoManutencao.objects.filter(sha256__in=feitas).update(variantes_prontas=True)
+    return len(feitas)
+
+
+def anexar_fotos(manutencoes):
+    """
+    Junta a cada manutenção (ativa ou arquivada) a lista das suas fotos em
+    `lista_fotos`, com uma única consulta. Devolve a lista de manutenções.
+    """
+    manutencoes = list(manutencoes)
+    por_manutencao = {}
+    fotos = FotoManutencao.objects.filter(manutencao_id__in=[m.id for m in manutencoes]).order_by('id')
+    for foto in fotos:
+        por_manutencao.setdefault(foto.manutencao_id, []).append(foto)
+    for manutencao in manutencoes:
+        manutencao.lista_fotos = por_manutencao.get(manutencao.id, [])
+    return manutencoes
+
+
+def apagar_ficheiros_sem_uso(sha256):
+    """
+    Remove o original e as variantes de uma imagem que já não é usada por
+    nenhuma foto.
+    """
+    if FotoManutencao.objects.filter(sha256=sha256).exists():
+        return
+    diretorio = _diretorio(sha256)
+    if not os.path.isdir(diretorio):
+        return
+    for nome in os.listdir(diretorio):
+        if nome.startswith(sha256):
+            os.remove(os.path.join(diretorio, nome))
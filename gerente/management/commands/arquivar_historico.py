@@ -0,0 +1,88 @@
+"""
+Move o histórico antigo para as tabelas de arquivo.
+
+    python manage.py arquivar_historico
+    python manage.py arquivar_historico --antes-de 2024-01-01 --lote 5000
+
+- Manutenções 'concluido' ou 'cancelado' fechadas (ou, sem data de
+  conclusão, pedidas) antes da data de corte passam para ManutencaoArquivo.
+- Pagamentos 'pago' de contratos já terminados (ou renovados) antes da data
+  de corte passam para PagamentoRendaArquivo.
+
+Cada lote é copiado e apagado da tabela principal na mesma transação, por
+isso o comando pode ser interrompido e voltar a correr sem perder dados. Com
+shards configurados, cada base é arquivada à vez (o arquivo fica na mesma
+base que as linhas de origem).
+"""
+from datetime import date
+import time
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from gerente.models import Manutencao, ManutencaoArquivo
+from inquilino.models import PagamentoRenda, PagamentoRendaArquivo
+from projecto_condominio.sharding import todas_as_bases
+
+
+class Command(BaseCommand):
+    help = 'Arquiva manutenções fechadas e pagamentos de contratos terminados antes de uma data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--antes-de', help='Data de corte (AAAA-MM-DD). Por omissão, há um ano.')
+        parser.add_argument('--lote', type=int, default=2000, help='Linhas movidas por transação.')
+        parser.add_argument('--dry-run', action='store_true', help='Só conta as linhas a arquivar.')
+
+    def handle(self, *args, **options):
+        try:
+            corte = date.fromisoformat(options['antes_de']) if options['antes_de'] else date.today() - relativedelta(years=1)
+        except ValueError:
+            raise CommandError('Data inválida. Use o formato AAAA-MM-DD.')
+        if options['lote'] < 1:
+            raise CommandError('O tamanho do lote tem de ser positivo.')
+
+        for alias in todas_as_bases():
+            manutencoes, pagamentos = self._a_arquivar(alias, corte)
+            if options['dry_run']:
+                self.stdout.write(
+                    f'{alias}: {manutencoes.count()} manutenções e {pagamentos.count()} pagamentos a arquivar '
+                    f'(antes de {corte}).'
+                )
+                continue
+            for origem, destino in [(manutencoes, ManutencaoArquivo), (pagamentos, PagamentoRendaArquivo)]:
+                inicio = time.monotonic()
+                total = self._mover(alias, origem, destino, options['lote'])
+                self.stdout.write(
+                    f'{alias}: {destino._meta.verbose_name_plural}: {total} linhas arquivadas '
+                    f'em {time.monotonic() - inicio:.2f}s.'
+                )
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Arquivo concluído.'))
+
+    def _a_arquivar(self, alias, corte):
+        # Conta a data de conclusão quando existe; as manutenções canceladas
+        # (ou concluídas antes de a data ser registada) usam a da solicitação.
+        manutencoes = Manutencao.objects.using(alias).filter(estado__in=['concluido', 'cancelado']).filter(
+            Q(data_conclusao__date__lt=corte)
+            | Q(data_conclusao__isnull=True, data_solicitacao__date__lt=corte)
+        )
+        pagamentos = PagamentoRenda.objects.using(alias).filter(
+            estado='pago', contrato__estado__in=['terminado', 'renovado'], contrato__data_fim__lt=corte
+        )
+        return manutencoes, pagamentos
+
+    def _mover(self, alias, origem, destino, lote):
+        campos = [f.attname for f in destino._meta.concrete_fields if f.name != 'data_arquivo']
+        total = 0
+        while True:
+            # Cada lote apaga o anterior da origem, por isso basta ler o início.
+            ids = list(origem.order_by('id').values_list('id', flat=True)[:lote])
+            if not ids:
+                return total
+            with transaction.atomic(using=alias):
+                linhas = origem.model.objects.using(alias).filter(id__in=ids).values(*campos)
+                destino.objects.using(alias).bulk_create([destino(**linha) for linha in linhas], ignore_conflicts=True)
+                origem.model.objects.using(alias).filter(id__in=ids).delete()
+            total += len(ids)
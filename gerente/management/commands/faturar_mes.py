@@ -0,0 +1,124 @@
+"""
+Gera os pagamentos de renda de um mês para todos os contratos ativos.
+
+    python manage.py faturar_mes
+    python manage.py faturar_mes --mes 2025-11 --lote 5000 --workers 4
+
+Até aqui os pagamentos só eram criados quando o inquilino abria as finanças;
+com este comando (mensal, via cron) todos os contratos ativos que cobrem o
+mês passam a ter a respetiva referência, e o administrador vê a receita
+prevista. Os contratos que já têm o pagamento do mês são ignorados e a
+restrição única (contrato, mes_referencia) impede duplicados, por isso o
+comando pode voltar a correr sem efeitos.
+
+Os contratos são divididos em blocos de ids consecutivos. Um conjunto de
+threads lê cada bloco e constrói os pagamentos (referências incluídas),
+enquanto a thread principal grava os blocos já prontos com bulk_create, uma
+transação por bloco. O SQLite só aceita um escritor de cada vez, por isso as
+escritas não são repartidas pelos workers.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import time
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
+
+from gerente.models import Contratos
+from inquilino.financas import invalidar_resumos
+from inquilino.models import PagamentoRenda
+from inquilino.services import pagamentos_do_mes
+from projecto_condominio.sharding import todas_as_bases
+
+
+class Command(BaseCommand):
+    help = 'Gera o pagamento do mês para cada contrato ativo (idempotente).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Mês a faturar (AAAA-MM). Por omissão, o mês atual.')
+        parser.add_argument('--lote', type=int, default=5000, help='Contratos por bloco (uma transação cada).')
+        parser.add_argument('--workers', type=int, default=2, help='Threads a processar blocos em paralelo.')
+        parser.add_argument('--dry-run', action='store_true', help='Só conta os pagamentos a gerar.')
+
+    def handle(self, *args, **options):
+        try:
+            mes = date.fromisoformat(f"{options['mes']}-01") if options['mes'] else date.today().replace(day=1)
+        except ValueError:
+            raise CommandError('Mês inválido. Use o formato AAAA-MM.')
+        if options['lote'] < 1 or options['workers'] < 1:
+            raise CommandError('O lote e o número de workers têm de ser positivos.')
+
+        inicio = time.monotonic()
+        total = 0
+        for alias in todas_as_bases():
+            a_faturar = self._a_faturar(alias, mes)
+            if options['dry_run']:
+                self.stdout.write(f'{alias}: {a_faturar.count()} pagamentos a gerar para {mes:%m/%Y}.')
+                continue
+            gerados = self._faturar(alias, a_faturar, mes, options['lote'], options['workers'])
+            self.stdout.write(f'{alias}: {gerados} pagamentos gerados.')
+            total += gerados
+
+        if options['dry_run']:
+            return
+        duracao = time.monotonic() - inicio
+        ritmo = total / duracao if duracao > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Faturação de {mes:%m/%Y}: {total} pagamentos gerados em {duracao:.2f}s ({ritmo:.0f} pagamentos/s).'
+        ))
+
+    def _a_faturar(self, alias, mes):
+        """
+        Contratos ativos que cobrem o mês e ainda não têm o pagamento desse mês.
+        O mês em que uma renovação começa a meio fica com o contrato anterior
+        (a mesma regra de primeiro_mes_da_renovacao em processar_contratos).
+        """
+        ja_faturado = PagamentoRenda.objects.using(alias).filter(contrato=OuterRef('pk'), mes_referencia=mes)
+        cobrado_pelo_anterior = Contratos.objects.using(alias).filter(
+            casa=OuterRef('casa'),
+            inquilino=OuterRef('inquilino'),
+            data_inicio__lt=OuterRef('data_inicio'),
+            data_fim__gt=mes,
+        )
+        return Contratos.objects.using(alias).filter(
+            estado='ativo',
+            data_inicio__lt=mes + relativedelta(months=1),
+            data_fim__gt=mes,
+        ).exclude(Exists(ja_faturado)).exclude(Exists(cobrado_pelo_anterior))
+
+    def _faturar(self, alias, a_faturar, mes, lote, workers):
+        ids = list(a_faturar.order_by('id').values_list('id', flat=True))
+        # Cada bloco é um intervalo de ids (e não uma lista em IN), para que
+        # a consulta do worker use a chave primária.
+        blocos = [(ids[i], ids[min(i + lote, len(ids)) - 1]) for i in range(0, len(ids), lote)]
+
+        def construir(bloco):
+            try:
+                contratos = a_faturar.filter(id__gte=bloco[0], id__lte=bloco[1]).values_list('id', 'valor_renda')
+                return pagamentos_do_mes(contratos, mes)
+            finally:
+                # Cada thread abre a sua ligação; fecha-a antes de terminar.
+                connections[alias].close()
+
+        total = 0
+        pendentes = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for bloco in blocos:
+                pendentes.append(executor.submit(construir, bloco))
+                # Mantém só alguns blocos construídos em memória à espera de escrita.
+                if len(pendentes) > workers:
+                    total += self._gravar(alias, pendentes.popleft().result())
+            while pendentes:
+                total += self._gravar(alias, pendentes.popleft().result())
+        return total
+
+    def _gravar(self, alias, pagamentos):
+        # Só esta thread escreve: no SQLite, duas transações de escrita
+        # concorrentes falham com "database is locked" em vez de esperar.
+        with transaction.atomic(using=alias):
+            PagamentoRenda.objects.using(alias).bulk_create(pagamentos, ignore_conflicts=True)
+        invalidar_resumos(p.contrato_id for p in pagamentos)
+        return len(pagamentos)
@@ -0,0 +1,43 @@
+"""
+Gera as miniaturas e versões reduzidas das fotos de manutenção pendentes.
+
+    python manage.py gerar_miniaturas
+
+As variantes são normalmente geradas em segundo plano logo após o envio
+(ver gerente/fotos.py). Este comando apanha as que ficaram por fazer: fotos
+enviadas antes de o Pillow estar instalado ou cujo processo terminou a meio.
+As imagens que não se conseguem ler ficam pendentes e são indicadas no fim.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from gerente.fotos import gerar_variantes
+from gerente.models import FotoManutencao
+
+
+class Command(BaseCommand):
+    help = 'Gera as variantes (miniatura e média) das fotos de manutenção que ainda não as têm.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=200, help='Imagens processadas de cada vez.')
+
+    def handle(self, *args, **options):
+        total = falhadas = 0
+        ultimo = ''
+        while True:
+            # Paginação por chave: as imagens que falham continuam pendentes e
+            # não podem ser pedidas outra vez.
+            hashes = list(
+                FotoManutencao.objects.filter(variantes_prontas=False, sha256__gt=ultimo)
+                .order_by('sha256').values_list('sha256', flat=True).distinct()[:options['lote']]
+            )
+            if not hashes:
+                break
+            ultimo = hashes[-1]
+            feitas = gerar_variantes(hashes)
+            if feitas is None:
+                raise CommandError('O Pillow não está instalado (pip install Pillow).')
+            total += feitas
+            falhadas += len(hashes) - feitas
+        self.stdout.write(self.style.SUCCESS(f'{total} imagens processadas.'))
+        if falhadas:
+            self.stdout.write(self.style.WARNING(f'{falhadas} imagens não puderam ser lidas (ver o log).'))
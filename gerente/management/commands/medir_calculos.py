@@ -0,0 +1,119 @@
+"""
+Micro-benchmark dos cálculos de datas dos contratos, sobre contratos
+sintéticos (não toca na base de dados):
+
+- plano de pagamentos: os meses de cada contrato (meses_do_contrato, usado
+  por gerar_pagamentos_em_falta e processar_contratos);
+- duração restante (gerente/contratos.py, usada em ver_contratos).
+
+    python manage.py medir_calculos
+    python manage.py medir_calculos --tamanhos 10000 100000 --repeticoes 5
+    python manage.py medir_calculos --guardar-referencia
+    python manage.py medir_calculos --tolerancia 0.30
+
+Cada medição é o melhor de --repeticoes. Com --guardar-referencia os tempos
+ficam em CALCULOS_REFERENCIA; nas execuções seguintes o comando termina com
+erro se algum passar a referência mais a tolerância.
+"""
+from collections import namedtuple
+from datetime import date, timedelta
+import gc
+import json
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gerente.contratos import tempos_restantes
+from inquilino.services import meses_do_contrato
+
+# Só os campos que os cálculos leem.
+ContratoSintetico = namedtuple('ContratoSintetico', 'data_inicio duracao_meses data_fim')
+
+
+def contratos_sinteticos(quantos, hoje, semente=0):
+    """
+    Contratos com início nos últimos cinco anos e duração de 6 a 60 meses
+    (alguns já terminados, como na base de dados real).
+    """
+    aleatorio = random.Random(semente)
+    contratos = []
+    for _ in range(quantos):
+        inicio = hoje - timedelta(days=aleatorio.randrange(5 * 365))
+        duracao = aleatorio.randrange(6, 61)
+        ano, mes = divmod(inicio.month - 1 + duracao, 12)
+        ano += inicio.year
+        # Fim ao dia 28 no máximo: aqui só interessa ter datas válidas.
+        contratos.append(ContratoSintetico(inicio, duracao, date(ano, mes + 1, min(inicio.day, 28))))
+    return contratos
+
+
+class Command(BaseCommand):
+    help = 'Mede o plano de pagamentos e a duração restante dos contratos e compara com a referência guardada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamanhos', type=int, nargs='+', default=[10000, 100000], help='Números de contratos sintéticos.',
+        )
+        parser.add_argument('--repeticoes', type=int, default=5, help='Repetições por medição (usa-se a melhor).')
+        parser.add_argument('--guardar-referencia', action='store_true', help='Guarda os tempos como nova referência.')
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.25,
+            help='Aumento máximo aceite em relação à referência (0.25 = 25%%).',
+        )
+
+    def handle(self, *args, **options):
+        hoje = date.today()
+        metricas = {}
+        for tamanho in options['tamanhos']:
+            contratos = contratos_sinteticos(tamanho, hoje)
+            datas_fim = [c.data_fim for c in contratos]
+
+            metricas[f'plano_pagamentos_{tamanho}'] = self._medir(
+                options['repeticoes'], lambda: sum(1 for c in contratos for _ in meses_do_contrato(c))
+            )
+            metricas[f'duracao_restante_{tamanho}'] = self._medir(
+                options['repeticoes'], lambda: tempos_restantes(datas_fim, hoje)
+            )
+
+        self.stdout.write('Tempos (melhor de {}, ms):'.format(options['repeticoes']))
+        for nome, valor in metricas.items():
+            self.stdout.write(f'  {nome:<34} {valor * 1000:9.1f}')
+        self._comparar(metricas, options)
+
+    def _medir(self, repeticoes, funcao):
+        # Como o timeit: sem o coletor de lixo a meio, que torna as listas
+        # grandes muito irregulares de medir.
+        gc.disable()
+        try:
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                funcao()
+                tempos.append(time.perf_counter() - inicio)
+        finally:
+            gc.enable()
+        return min(tempos)
+
+    def _comparar(self, metricas, options):
+        caminho = settings.CALCULOS_REFERENCIA
+        if options['guardar_referencia']:
+            with open(caminho, 'w') as ficheiro:
+                json.dump(metricas, ficheiro, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Referência guardada em {caminho}.'))
+            return
+        if not os.path.exists(caminho):
+            self.stdout.write('Sem referência: use --guardar-referencia para a criar.')
+            return
+
+        with open(caminho) as ficheiro:
+            referencia = json.load(ficheiro)
+        piores = []
+        for nome, valor in metricas.items():
+            if nome in referencia and valor > referencia[nome] * (1 + options['tolerancia']):
+                piores.append(f'{nome}: {valor * 1000:.1f} ms (referência {referencia[nome] * 1000:.1f} ms)')
+        if piores:
+            raise CommandError('Os cálculos ficaram mais lentos:\n  ' + '\n  '.join(piores))
+        self.stdout.write(self.style.SUCCESS('Cálculos dentro da referência.'))
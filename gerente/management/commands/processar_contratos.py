@@ -0,0 +1,172 @@
+"""
+Processa os contratos que chegaram ao fim.
+
+Pensado para correr periodicamente (cron):
+
+    python manage.py processar_contratos
+    python manage.py processar_contratos --renovar --lote 2000
+
+Cada contrato ativo com data_fim <= hoje é marcado como 'terminado' e a casa
+é libertada, ou, com --renovar, é criado um novo contrato com o mesmo valor e
+duração (e o respetivo plano de pagamentos) e o antigo fica 'renovado'.
+Um contrato já processado deixa de estar 'ativo', por isso correr o comando
+várias vezes não repete trabalho. Com shards configurados, cada base é
+processada à vez, na sua própria transação.
+"""
+from datetime import date
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Subquery
+
+from gerente.disponibilidade import atualizar_disponibilidade
+from gerente.models import Casa, Contratos, Ocupacao
+from inquilino.contexto import invalidar_contextos_de_inquilinos
+from inquilino.models import PagamentoRenda
+from inquilino.services import novos_pagamentos, primeiro_mes_da_renovacao
+from projecto_condominio.replica import em_replica
+from projecto_condominio.sharding import todas_as_bases
+
+
+class Command(BaseCommand):
+    help = 'Termina (ou renova) os contratos cuja data de fim já passou e liberta as casas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Data de referência (AAAA-MM-DD). Por omissão, hoje.')
+        parser.add_argument('--lote', type=int, default=1000, help='Contratos por transação.')
+        parser.add_argument('--renovar', action='store_true', help='Renova os contratos em vez de os terminar.')
+        parser.add_argument('--dry-run', action='store_true', help='Só conta os contratos a processar.')
+
+    def handle(self, *args, **options):
+        try:
+            hoje = date.fromisoformat(options['data']) if options['data'] else date.today()
+        except ValueError:
+            raise CommandError('Data inválida. Use o formato AAAA-MM-DD.')
+        lote = options['lote']
+        if lote < 1:
+            raise CommandError('O tamanho do lote tem de ser positivo.')
+
+        inicio = time.monotonic()
+        total = renovados = pagamentos = 0
+        for alias in todas_as_bases():
+            if options['dry_run']:
+                # Na base principal a contagem vai à réplica (using=None deixa
+                # o router decidir); os shards não têm réplica.
+                with em_replica():
+                    expirados = self._expirados(None if alias == 'default' else alias, hoje)
+                    self.stdout.write(f'{alias}: {expirados.count()} contratos expirados até {hoje}.')
+                continue
+            n_total, n_renovados, n_pagamentos = self._processar(alias, hoje, lote, options['renovar'])
+            self.stdout.write(f'{alias}: {n_total} contratos processados.')
+            total += n_total
+            renovados += n_renovados
+            pagamentos += n_pagamentos
+
+        if options['dry_run']:
+            return
+        duracao = time.monotonic() - inicio
+        ritmo = total / duracao if duracao > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} contratos processados ({renovados} renovados, {pagamentos} pagamentos gerados) '
+            f'em {duracao:.2f}s ({ritmo:.0f} contratos/s).'
+        ))
+
+    def _expirados(self, alias, hoje):
+        # Consulta por intervalo servida pelo índice (estado, data_fim).
+        return Contratos.objects.using(alias).filter(estado='ativo', data_fim__lte=hoje)
+
+    def _processar(self, alias, hoje, lote, renovar):
+        expirados = self._expirados(alias, hoje)
+        total = renovados = pagamentos = 0
+        ultimo_id = 0
+        while True:
+            # Paginação por chave (id > último) em vez de OFFSET.
+            ids = list(
+                expirados.filter(id__gt=ultimo_id).order_by('id').values_list('id', flat=True)[:lote]
+            )
+            if not ids:
+                break
+            ultimo_id = ids[-1]
+
+            with transaction.atomic(using=alias):
+                if renovar:
+                    n_renovados, n_pagamentos = self._renovar(alias, ids, hoje)
+                    renovados += n_renovados
+                    pagamentos += n_pagamentos
+                else:
+                    self._terminar(alias, ids)
+            total += len(ids)
+            self.stdout.write(f'  {total} contratos processados...')
+        return total, renovados, pagamentos
+
+    def _terminar(self, alias, ids):
+        """
+        Liberta as casas ainda ocupadas pelo inquilino do contrato e marca os
+        contratos como terminados, com instruções UPDATE por lote.
+        """
+        contratos_do_lote = Contratos.objects.filter(
+            id__in=ids, casa=OuterRef('pk'), inquilino=OuterRef('inquilino')
+        )
+        casas = Casa.objects.using(alias).filter(Exists(contratos_do_lote))
+
+        # O update() não dispara os sinais de Casa, por isso o histórico de
+        # ocupação é fechado aqui, na data de fim do respetivo contrato.
+        fim_do_contrato = Contratos.objects.filter(
+            id__in=ids, casa=OuterRef('casa'), inquilino=OuterRef('inquilino')
+        ).values('data_fim')[:1]
+        Ocupacao.objects.using(alias).filter(casa__in=casas, data_fim__isnull=True).update(
+            data_fim=Subquery(fim_do_contrato)
+        )
+
+        casas.update(inquilino=None, versao=F('versao') + 1)
+        Contratos.objects.using(alias).filter(id__in=ids, estado='ativo').update(estado='terminado')
+        inquilino_ids = list(Contratos.objects.using(alias).filter(id__in=ids).values_list('inquilino_id', flat=True))
+        atualizar_disponibilidade(inquilino_ids, using=alias)
+        invalidar_contextos_de_inquilinos(inquilino_ids, using=alias)
+
+    def _renovar(self, alias, ids, hoje):
+        """
+        Cria um contrato novo (a começar na data de fim do anterior) para cada
+        contrato do lote, com o respetivo plano de pagamentos. A casa mantém-se
+        atribuída ao mesmo inquilino.
+
+        Um contrato que acabou há mais de uma duração (o comando não correu
+        durante esse tempo) é renovado diretamente para o período que cobre
+        `hoje`, e não para o seguinte ao fim: de outro modo cada execução
+        criaria só mais um período, com um plano de meses já passados.
+
+        Os contratos sem duração positiva (anteriores à validação em
+        Contratos.clean) não são renovados: o novo acabaria antes de começar e
+        seria renovado outra vez em cada execução. São terminados.
+        """
+        invalidos = list(
+            Contratos.objects.using(alias).filter(id__in=ids, duracao_meses__lte=0).values_list('id', flat=True)
+        )
+        if invalidos:
+            self._terminar(alias, invalidos)
+        antigos = list(Contratos.objects.using(alias).filter(id__in=ids, estado='ativo', duracao_meses__gt=0))
+        novos = []
+        for antigo in antigos:
+            data_inicio = antigo.data_fim
+            # bulk_create não chama save(), por isso a data de fim é calculada aqui.
+            data_fim = Contratos.calcular_data_fim(data_inicio, antigo.duracao_meses)
+            while data_fim <= hoje:
+                data_inicio, data_fim = data_fim, Contratos.calcular_data_fim(data_fim, antigo.duracao_meses)
+            novos.append(Contratos(
+                inquilino_id=antigo.inquilino_id,
+                casa_id=antigo.casa_id,
+                data_inicio=data_inicio,
+                data_fim=data_fim,
+                valor_renda=antigo.valor_renda,
+                duracao_meses=antigo.duracao_meses,
+            ))
+        Contratos.objects.using(alias).bulk_create(novos)
+        Contratos.objects.using(alias).filter(id__in=[a.id for a in antigos]).update(estado='renovado')
+        invalidar_contextos_de_inquilinos([a.inquilino_id for a in antigos], using=alias)
+
+        plano = []
+        for novo in novos:
+            plano.extend(novos_pagamentos(novo, a_partir_de=primeiro_mes_da_renovacao(novo.data_inicio)))
+        PagamentoRenda.objects.using(alias).bulk_create(plano, batch_size=1000)
+        return len(novos), len(plano)
@@ -0,0 +1,59 @@
+"""
+Reajusta as rendas dos contratos ativos a partir de um mês (ver
+gerente/reajuste.py).
+
+    python manage.py reajustar_rendas --percentagem 2.5 --a-partir-de 2026-01 --dry-run
+    python manage.py reajustar_rendas --percentagem 2.5 --a-partir-de 2026-01
+    python manage.py reajustar_rendas --valor 15 --a-partir-de 2026-03 --predio 4
+    python manage.py reajustar_rendas --percentagem 3 --a-partir-de 2026-01 --gerente 2
+
+Sem --predio nem --gerente, o reajuste abrange todo o portfólio. As rendas
+por pagar a partir do mês indicado passam a ter o novo valor; as pagas e as
+anteriores não mudam.
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gerente.reajuste import PERCENTAGEM, VALOR, reajustar, simular
+
+
+class Command(BaseCommand):
+    help = 'Reajusta as rendas (percentagem ou valor fixo) por prédio, gerente ou em todo o portfólio.'
+
+    def add_arguments(self, parser):
+        tipo = parser.add_mutually_exclusive_group(required=True)
+        tipo.add_argument('--percentagem', help='Aumento em percentagem (negativo para reduzir).')
+        tipo.add_argument('--valor', help='Aumento em meticais (MZN) por mês (negativo para reduzir).')
+        parser.add_argument('--a-partir-de', required=True, help='Primeiro mês com a nova renda (AAAA-MM).')
+        ambito = parser.add_mutually_exclusive_group()
+        ambito.add_argument('--predio', type=int, help='Só os contratos das casas deste prédio.')
+        ambito.add_argument('--gerente', type=int, help='Só os contratos das casas deste gerente.')
+        parser.add_argument('--dry-run', action='store_true', help='Só mostra o impacto.')
+
+    def handle(self, *args, **options):
+        tipo = PERCENTAGEM if options['percentagem'] is not None else VALOR
+        try:
+            montante = Decimal(options['percentagem'] if tipo == PERCENTAGEM else options['valor'])
+            mes = date.fromisoformat(f"{options['a_partir_de']}-01")
+        except (InvalidOperation, ValueError):
+            raise CommandError('Montante ou mês inválido (use AAAA-MM para o mês).')
+        ambito = {'predio_id': options['predio'], 'gerente_id': options['gerente']}
+
+        impacto = simular(tipo, montante, mes, **ambito)
+        self.stdout.write(
+            f"{impacto['contratos']} contratos: renda mensal total {impacto['renda_atual']} → "
+            f"{impacto['renda_nova']} ({impacto['diferenca_mensal']:+}).\n"
+            f"{impacto['prestacoes']} rendas por pagar desde {mes:%m/%Y}: {impacto['prestacoes_atual']} → "
+            f"{impacto['prestacoes_nova']} ({impacto['diferenca_prestacoes']:+})."
+        )
+        if options['dry_run']:
+            return
+
+        inicio = time.monotonic()
+        contratos, prestacoes = reajustar(tipo, montante, mes, **ambito)
+        self.stdout.write(self.style.SUCCESS(
+            f'{contratos} contratos e {prestacoes} rendas reajustados em {time.monotonic() - inicio:.2f}s.'
+        ))
@@ -0,0 +1,512 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:20
+
+from datetime import date
+
+import django.db.models.deletion
+import django.utils.timezone
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Subquery
+
+
+def preencher_data_fim(apps, schema_editor):
+    Contratos = apps.get_model("gerente", "Contratos")
+    db_alias = schema_editor.connection.alias
+    contratos = Contratos.objects.using(db_alias)
+    for contrato in contratos.only("id", "data_inicio", "duracao_meses").iterator():
+        contratos.filter(pk=contrato.pk).update(
+            data_fim=contrato.data_inicio + relativedelta(months=contrato.duracao_meses)
+        )
+
+
+def preencher_ocupacoes_atuais(apps, schema_editor):
+    """
+    Abre uma ocupação para cada casa atualmente atribuída, a começar no
+    contrato mais antigo entre essa casa e esse inquilino (ou hoje).
+    """
+    Casa = apps.get_model("gerente", "Casa")
+    Contratos = apps.get_model("gerente", "Contratos")
+    Ocupacao = apps.get_model("gerente", "Ocupacao")
+    db_alias = schema_editor.connection.alias
+    ocupacoes = []
+    for casa in Casa.objects.using(db_alias).filter(inquilino__isnull=False).iterator():
+        primeiro = (
+            Contratos.objects.using(db_alias)
+            .filter(casa=casa, inquilino_id=casa.inquilino_id)
+            .order_by("data_inicio")
+            .first()
+        )
+        ocupacoes.append(
+            Ocupacao(
+                casa=casa,
+                inquilino_id=casa.inquilino_id,
+                data_inicio=primeiro.data_inicio if primeiro else date.today(),
+            )
+        )
+    Ocupacao.objects.using(db_alias).bulk_create(ocupacoes, batch_size=1000)
+
+
+def preencher_predio_e_gerente(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Casa = apps.get_model("gerente", "Casa")
+    Predio = apps.get_model("administrador", "Predio")
+    for nome in ("Manutencao", "ManutencaoArquivo"):
+        manutencoes = apps.get_model("gerente", nome).objects.using(db_alias)
+        manutencoes.filter(casa__isnull=False).update(
+            predio=Subquery(
+                Casa.objects.filter(pk=OuterRef("casa_id")).values("predio_id")[:1]
+            )
+        )
+        manutencoes.filter(predio__isnull=False).update(
+            gerente=Subquery(
+                Predio.objects.filter(pk=OuterRef("predio_id")).values("gerente_id")[:1]
+            )
+        )
+
+
+def preencher_disponivel(apps, schema_editor):
+    Inquilino = apps.get_model("gerente", "Inquilino")
+    Contratos = apps.get_model("gerente", "Contratos")
+    db_alias = schema_editor.connection.alias
+    contrato_ativo = Contratos.objects.using(db_alias).filter(
+        inquilino=OuterRef("pk"), estado="ativo"
+    )
+    Inquilino.objects.using(db_alias).update(disponivel=~Exists(contrato_ativo))
+
+
+def registar_criacao(apps, schema_editor):
+    # Cada manutenção existente começa com a transição da sua criação; as
+    # conclusões anteriores não têm data e ficam fora dos tempos de resolução.
+    Manutencao = apps.get_model("gerente", "Manutencao")
+    TransicaoManutencao = apps.get_model("gerente", "TransicaoManutencao")
+    db_alias = schema_editor.connection.alias
+    TransicaoManutencao.objects.using(db_alias).bulk_create(
+        [
+            TransicaoManutencao(
+                manutencao_id=manutencao_id, estado_novo="pendente", data=data
+            )
+            for manutencao_id, data in Manutencao.objects.using(db_alias)
+            .values_list("id", "data_solicitacao")
+            .iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("administrador", "0003_remove_predio_nr_casas"),
+        ("gerente", "0005_inquilino_gerente"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contratos",
+            name="data_fim",
+            field=models.DateField(
+                blank=True, editable=False, null=True, verbose_name="Data de Fim"
+            ),
+        ),
+        migrations.AddField(
+            model_name="contratos",
+            name="estado",
+            field=models.CharField(
+                choices=[
+                    ("ativo", "Ativo"),
+                    ("terminado", "Terminado"),
+                    ("renovado", "Renovado"),
+                ],
+                default="ativo",
+                max_length=10,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contratos",
+            index=models.Index(
+                fields=["estado", "data_fim"], name="contrato_estado_fim_idx"
+            ),
+        ),
+        migrations.RunPython(
+            code=preencher_data_fim,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.CreateModel(
+            name="Ocupacao",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data_inicio", models.DateField()),
+                ("data_fim", models.DateField(blank=True, null=True)),
+                ("dias_vago_antes", models.IntegerField(blank=True, null=True)),
+                (
+                    "casa",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ocupacoes",
+                        to="gerente.casa",
+                    ),
+                ),
+                (
+                    "inquilino",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ocupacoes",
+                        to="gerente.inquilino",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["casa", "data_fim"], name="ocupacao_casa_fim_idx"
+                    ),
+                    models.Index(
+                        fields=["data_inicio", "data_fim"], name="ocupacao_periodo_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(
+            code=preencher_ocupacoes_atuais,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.AddField(
+            model_name="manutencao",
+            name="gerente",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="manutencoes",
+                to="administrador.gerente",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ManutencaoArquivo",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[
+                            ("eletrico", "Elétrico"),
+                            ("hidraulico", "Hidráulico"),
+                            ("estrutural", "Estrutural"),
+                            ("geral", "Geral"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("descricao", models.TextField()),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("em_progresso", "Em Progresso"),
+                            ("concluido", "Concluído"),
+                            ("cancelado", "Cancelado"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("data_solicitacao", models.DateTimeField()),
+                ("data_arquivo", models.DateTimeField(auto_now_add=True)),
+                (
+                    "casa",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="gerente.casa",
+                    ),
+                ),
+                (
+                    "predio",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="administrador.predio",
+                    ),
+                ),
+                (
+                    "solicitado_por_gerente",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="administrador.gerente",
+                    ),
+                ),
+                (
+                    "solicitado_por_inquilino",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="gerente.inquilino",
+                    ),
+                ),
+                (
+                    "gerente",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="administrador.gerente",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "manutenção arquivada",
+                "verbose_name_plural": "manutenções arquivadas",
+                "indexes": [
+                    models.Index(
+                        fields=["solicitado_por_inquilino", "data_solicitacao"],
+                        name="manut_arq_inquilino_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="manutencao",
+            index=models.Index(
+                fields=["gerente", "-data_solicitacao"],
+                name="manutencao_gerente_data_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="manutencaoarquivo",
+            index=models.Index(
+                fields=["gerente", "data_solicitacao"], name="manut_arq_gerente_idx"
+            ),
+        ),
+        migrations.RunPython(
+            code=preencher_predio_e_gerente,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.AddField(
+            model_name="inquilino",
+            name="disponivel",
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="casa",
+            index=models.Index(
+                condition=models.Q(("inquilino__isnull", True)),
+                fields=["predio", "numero"],
+                name="casa_vaga_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inquilino",
+            index=models.Index(
+                condition=models.Q(("disponivel", True)),
+                fields=["gerente"],
+                name="inquilino_disponivel_idx",
+            ),
+        ),
+        migrations.RunPython(
+            code=preencher_disponivel,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.CreateModel(
+            name="FotoManutencao",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256", models.CharField(db_index=True, max_length=64)),
+                ("extensao", models.CharField(max_length=5)),
+                ("tamanho", models.PositiveIntegerField()),
+                ("nome_original", models.CharField(blank=True, max_length=255)),
+                ("variantes_prontas", models.BooleanField(default=False)),
+                ("data_envio", models.DateTimeField(auto_now_add=True)),
+                (
+                    "manutencao",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="fotos",
+                        to="gerente.manutencao",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "foto de manutenção",
+                "verbose_name_plural": "fotos de manutenção",
+            },
+        ),
+        migrations.AddField(
+            model_name="manutencao",
+            name="data_conclusao",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="manutencaoarquivo",
+            name="data_conclusao",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="ResolucaoDiaria",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dia", models.DateField()),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[
+                            ("eletrico", "Elétrico"),
+                            ("hidraulico", "Hidráulico"),
+                            ("estrutural", "Estrutural"),
+                            ("geral", "Geral"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("total", models.PositiveIntegerField(default=0)),
+                ("soma_horas", models.FloatField(default=0)),
+                ("histograma", models.JSONField(default=list)),
+                (
+                    "gerente",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="administrador.gerente",
+                    ),
+                ),
+                (
+                    "predio",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="administrador.predio",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "resolução diária",
+                "verbose_name_plural": "resoluções diárias",
+                "indexes": [
+                    models.Index(fields=["dia", "tipo"], name="resolucao_dia_tipo_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("dia", "tipo", "predio"), name="resolucao_dia_unica"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="TransicaoManutencao",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "estado_anterior",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("em_progresso", "Em Progresso"),
+                            ("concluido", "Concluído"),
+                            ("cancelado", "Cancelado"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "estado_novo",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("em_progresso", "Em Progresso"),
+                            ("concluido", "Concluído"),
+                            ("cancelado", "Cancelado"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("data", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "alterado_por",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "manutencao",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="transicoes",
+                        to="gerente.manutencao",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "transição de manutenção",
+                "verbose_name_plural": "transições de manutenção",
+                "indexes": [
+                    models.Index(
+                        fields=["manutencao", "data"], name="transicao_manutencao_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(
+            code=registar_criacao,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name="manutencao",
+            index=models.Index(
+                fields=["estado", "data_solicitacao"], name="manutencao_estado_data_idx"
+            ),
+        ),
+    ]
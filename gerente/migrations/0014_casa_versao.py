@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gerente", "0006_squashed_0013"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="casa",
+            name="versao",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
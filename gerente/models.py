@@ -1,6 +1,9 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from administrador.models import Predio, Gerente
 from django.contrib.auth.models import User, Group
+from dateutil.relativedelta import relativedelta
 
 class Inquilino(models.Model):
     """
@@ -9,7 +12,16 @@ class Inquilino(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     contacto = models.CharField(max_length=15, unique=True)
     gerente = models.ForeignKey(Gerente, on_delete=models.SET_NULL, null=True, blank=True, related_name='inquilinos_registrados')
-    
+    # Verdadeiro enquanto o inquilino não tem nenhum contrato ativo. Mantido
+    # pelos sinais de Contratos (ver gerente/disponibilidade.py) para que a
+    # procura de inquilinos livres use o índice parcial em vez de um anti-join.
+    disponivel = models.BooleanField(default=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['gerente'], condition=models.Q(disponivel=True), name='inquilino_disponivel_idx'),
+        ]
+
     def __str__(self):
         return self.user.get_full_name() or self.user.username
 
@@ -24,6 +36,26 @@ class Casa(models.Model):
         blank=True,
         related_name='casas_alugadas'
     )
+    # Aumenta em cada gravação: a atribuição da casa num contrato só é feita
+    # se a casa ainda estiver como foi lida (ver gerente/atribuicao.py).
+    versao = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Só as casas vagas: a procura por número num prédio não lê as ocupadas.
+            models.Index(fields=['predio', 'numero'], condition=models.Q(inquilino__isnull=True), name='casa_vaga_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        # Incrementada na base de dados, para não repetir uma versão que
+        # outro pedido já tenha gravado entretanto.
+        self.versao = models.F('versao') + 1
+        super().save(*args, **kwargs)
+        # Fica como campo diferido: só é relida (refresh_from_db) se for usada.
+        del self.__dict__['versao']
 
     @property
     def gerente(self):
@@ -33,6 +65,30 @@ class Casa(models.Model):
         return f'Casa {self.numero} ({self.predio.nome})'
 
 
+class Ocupacao(models.Model):
+    """
+    Intervalo em que uma casa esteve atribuída a um inquilino.
+    Um registo com data_fim nula é a ocupação atual. É escrito
+    automaticamente (ver gerente/signals.py) sempre que Casa.inquilino muda.
+    """
+    casa = models.ForeignKey(Casa, on_delete=models.CASCADE, related_name='ocupacoes')
+    inquilino = models.ForeignKey(Inquilino, on_delete=models.SET_NULL, null=True, blank=True, related_name='ocupacoes')
+    data_inicio = models.DateField()
+    data_fim = models.DateField(null=True, blank=True)
+    # Dias que a casa esteve vaga antes desta ocupação (nulo na primeira),
+    # para que o tempo até arrendar seja uma simples média.
+    dias_vago_antes = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['casa', 'data_fim'], name='ocupacao_casa_fim_idx'),
+            models.Index(fields=['data_inicio', 'data_fim'], name='ocupacao_periodo_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.casa_id}: {self.data_inicio} - {self.data_fim or "atual"}'
+
+
 class Manutencao(models.Model):
     # ... (código do modelo Manutencao, sem alterações)
     TIPO_CHOICES = [
@@ -57,6 +113,31 @@ class Manutencao(models.Model):
     predio = models.ForeignKey(Predio, on_delete=models.CASCADE, related_name='manutencoes_gerais', null=True, blank=True)
     solicitado_por_inquilino = models.ForeignKey(Inquilino, on_delete=models.SET_NULL, null=True, blank=True, related_name='manutencoes_solicitadas_inquilino')
     solicitado_por_gerente = models.ForeignKey(Gerente, on_delete=models.SET_NULL, null=True, blank=True, related_name='manutencoes_solicitadas_gerente')
+    # Gerente responsável (o do prédio), resolvido ao gravar e atualizado
+    # quando o prédio muda de gerente, para que as listagens do gerente sejam
+    # uma única consulta no índice (gerente, data_solicitacao).
+    gerente = models.ForeignKey(Gerente, on_delete=models.SET_NULL, null=True, blank=True, related_name='manutencoes')
+    # Instante em que passou a 'concluido' (nulo nos outros estados). As
+    # restantes mudanças de estado ficam em TransicaoManutencao.
+    data_conclusao = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['gerente', '-data_solicitacao'], name='manutencao_gerente_data_idx'),
+            # Filtro por estado (manutenções abertas) e navegação por data no /admin/.
+            models.Index(fields=['estado', 'data_solicitacao'], name='manutencao_estado_data_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Uma manutenção de uma casa fica também associada ao prédio dessa casa.
+        if self.casa_id:
+            self.predio_id = self.casa.predio_id
+        self.gerente_id = self.predio.gerente_id if self.predio_id else None
+        if self.estado == 'concluido' and self.data_conclusao is None:
+            self.data_conclusao = timezone.now()
+        elif self.estado != 'concluido':
+            self.data_conclusao = None
+        super().save(*args, **kwargs)
 
     def __str__(self):
         if self.casa:
@@ -66,12 +147,160 @@ class Manutencao(models.Model):
         else:
             return f'Manutenção sem local definido'
 
+class ManutencaoArquivo(models.Model):
+    """
+    Manutenção concluída ou cancelada, movida da tabela Manutencao pelo
+    comando arquivar_historico. Mantém o id original.
+    """
+    arquivado = True
+    TIPO_CHOICES = Manutencao.TIPO_CHOICES
+    ESTADO_CHOICES = Manutencao.ESTADO_CHOICES
+
+    id = models.BigIntegerField(primary_key=True)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    descricao = models.TextField()
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES)
+    data_solicitacao = models.DateTimeField()
+    casa = models.ForeignKey('Casa', on_delete=models.CASCADE, related_name='+', null=True, blank=True)
+    predio = models.ForeignKey(Predio, on_delete=models.CASCADE, related_name='+', null=True, blank=True)
+    solicitado_por_inquilino = models.ForeignKey(Inquilino, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    solicitado_por_gerente = models.ForeignKey(Gerente, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    gerente = models.ForeignKey(Gerente, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    data_conclusao = models.DateTimeField(null=True, blank=True)
+    data_arquivo = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'manutenção arquivada'
+        verbose_name_plural = 'manutenções arquivadas'
+        indexes = [
+            models.Index(fields=['solicitado_por_inquilino', 'data_solicitacao'], name='manut_arq_inquilino_idx'),
+            models.Index(fields=['gerente', 'data_solicitacao'], name='manut_arq_gerente_idx'),
+        ]
+
+    def __str__(self):
+        return f'Manutenção arquivada {self.id} - Tipo: {self.get_tipo_display()}'
+
+
+class FotoManutencao(models.Model):
+    """
+    Foto anexada a uma manutenção. O ficheiro é guardado pelo SHA-256 do
+    conteúdo (ver gerente/fotos.py), por isso fotos iguais partilham o
+    mesmo ficheiro e as mesmas miniaturas.
+
+    A relação não tem restrição na base de dados: quando a manutenção é
+    arquivada (mantendo o id), as fotos continuam associadas a ela.
+    """
+    manutencao = models.ForeignKey(
+        Manutencao, on_delete=models.DO_NOTHING, db_constraint=False, related_name='fotos'
+    )
+    sha256 = models.CharField(max_length=64, db_index=True)
+    extensao = models.CharField(max_length=5)
+    tamanho = models.PositiveIntegerField()
+    nome_original = models.CharField(max_length=255, blank=True)
+    # Miniatura e versão reduzida já geradas (em segundo plano).
+    variantes_prontas = models.BooleanField(default=False)
+    data_envio = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'foto de manutenção'
+        verbose_name_plural = 'fotos de manutenção'
+
+    def __str__(self):
+        return f'Foto {self.id} da manutenção {self.manutencao_id}'
+
+
+class TransicaoManutencao(models.Model):
+    """
+    Mudança de estado de uma manutenção (a criação conta como transição a
+    partir de nenhum estado). Escrita pelos sinais de Manutencao; como as
+    fotos, continua associada à manutenção depois de arquivada.
+    """
+    manutencao = models.ForeignKey(
+        Manutencao, on_delete=models.DO_NOTHING, db_constraint=False, related_name='transicoes'
+    )
+    estado_anterior = models.CharField(max_length=20, choices=Manutencao.ESTADO_CHOICES, blank=True)
+    estado_novo = models.CharField(max_length=20, choices=Manutencao.ESTADO_CHOICES)
+    data = models.DateTimeField(default=timezone.now)
+    alterado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        verbose_name = 'transição de manutenção'
+        verbose_name_plural = 'transições de manutenção'
+        indexes = [
+            models.Index(fields=['manutencao', 'data'], name='transicao_manutencao_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.manutencao_id}: {self.estado_anterior or "-"} -> {self.estado_novo} ({self.data:%Y-%m-%d %H:%M})'
+
+
+class ResolucaoDiaria(models.Model):
+    """
+    Tempos de resolução das manutenções concluídas num dia, por tipo, prédio
+    e gerente, em forma de histograma (ver gerente/resolucao.py). É
+    atualizado a cada conclusão, para que o relatório de percentis some
+    poucas linhas em vez de percorrer todas as manutenções.
+    """
+    dia = models.DateField()
+    tipo = models.CharField(max_length=20, choices=Manutencao.TIPO_CHOICES)
+    predio = models.ForeignKey(Predio, on_delete=models.CASCADE, related_name='+')
+    gerente = models.ForeignKey(Gerente, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    total = models.PositiveIntegerField(default=0)
+    soma_horas = models.FloatField(default=0)
+    # Contagens por intervalo de horas (LIMITES_HORAS em gerente/resolucao.py).
+    histograma = models.JSONField(default=list)
+
+    class Meta:
+        verbose_name = 'resolução diária'
+        verbose_name_plural = 'resoluções diárias'
+        indexes = [
+            models.Index(fields=['dia', 'tipo'], name='resolucao_dia_tipo_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'tipo', 'predio'], name='resolucao_dia_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.dia} {self.tipo} {self.predio_id}: {self.total}'
+
+
 class Contratos(models.Model):
+    ESTADO_CHOICES = [
+        ('ativo', 'Ativo'),
+        ('terminado', 'Terminado'),
+        ('renovado', 'Renovado'),
+    ]
+
     data_inicio = models.DateField()
     valor_renda = models.DecimalField(max_digits=10, decimal_places=2)
     duracao_meses = models.IntegerField(verbose_name='Duração (meses)')
     inquilino = models.ForeignKey(Inquilino, on_delete=models.CASCADE, related_name='contratos')
     casa = models.ForeignKey(Casa, on_delete=models.CASCADE, related_name='contratos', null=True, blank=True)
+    # Guardada (e não calculada) para que a procura de contratos expirados
+    # seja uma consulta por intervalo no índice (estado, data_fim).
+    data_fim = models.DateField(null=True, blank=True, editable=False, verbose_name='Data de Fim')
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='ativo')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'data_fim'], name='contrato_estado_fim_idx'),
+        ]
+
+    @staticmethod
+    def calcular_data_fim(data_inicio, duracao_meses):
+        return data_inicio + relativedelta(months=duracao_meses)
+
+    def clean(self):
+        # Com duração nula ou negativa, a data de fim não passa do início e
+        # cada renovação (processar_contratos --renovar) voltaria a expirar.
+        if self.duracao_meses is not None and self.duracao_meses <= 0:
+            raise ValidationError({'duracao_meses': 'A duração do contrato tem de ser de pelo menos um mês.'})
+
+    def save(self, *args, **kwargs):
+        # Mantém a data de fim coerente com o início e a duração.
+        self.data_fim = self.calcular_data_fim(self.data_inicio, self.duracao_meses)
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        return f'Contrato para {self.inquilino.user.get_full_name() or self.inquilino.user.username} - Casa {self.casa.numero} - Início: {self.data_inicio}'
\ No newline at end of file
+        casa = self.casa.numero if self.casa else '-'
+        return f'Contrato para {self.inquilino.user.get_full_name() or self.inquilino.user.username} - Casa {casa} - Início: {self.data_inicio}'
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Histórico de ocupação das casas e indicadores de vacância por prédio.
+"""
+from datetime import date, timedelta
+
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from administrador.models import Predio
+from .models import Ocupacao
+
+
+def registar_mudanca(casa_id, inquilino_id, data=None, using=None):
+    """
+    Fecha a ocupação atual da casa (se existir) e, se houver um novo
+    inquilino, abre uma nova ocupação a partir de `data`. `using` é a base de
+    dados da casa (o shard do gerente, se houver).
+    """
+    data = data or date.today()
+    ocupacoes = Ocupacao.objects.using(using) if using else Ocupacao.objects
+    ocupacoes.filter(casa_id=casa_id, data_fim__isnull=True).update(data_fim=data)
+    if inquilino_id is None:
+        return None
+
+    anterior = (
+        ocupacoes.filter(casa_id=casa_id, data_fim__isnull=False)
+        .order_by('-data_fim')
+        .values_list('data_fim', flat=True)
+        .first()
+    )
+    return ocupacoes.create(
+        casa_id=casa_id,
+        inquilino_id=inquilino_id,
+        data_inicio=data,
+        dias_vago_antes=(data - anterior).days if anterior else None,
+    )
+
+
+def estatisticas_por_predio(inicio, fim, predios=None):
+    """
+    Taxa de vacância, rotatividade e tempo médio até arrendar de cada prédio
+    no período [inicio, fim), calculados numa única consulta agregada.
+
+    Cada prédio devolvido tem os atributos:
+      - total_casas, dias_ocupados, entradas, tempo_ate_arrendar (dias)
+      - taxa_vacancia e rotatividade (calculados a partir dos anteriores)
+    """
+    if predios is None:
+        predios = Predio.objects.all()
+
+    # Ocupações que se sobrepõem ao período.
+    sobrepoe = Q(casas__ocupacoes__data_inicio__lt=fim) & (
+        Q(casas__ocupacoes__data_fim__isnull=True) | Q(casas__ocupacoes__data_fim__gt=inicio)
+    )
+    # Ocupações que começaram dentro do período.
+    entrou = Q(casas__ocupacoes__data_inicio__gte=inicio, casas__ocupacoes__data_inicio__lt=fim)
+
+    dias_no_periodo = ExpressionWrapper(
+        Least(Coalesce(F('casas__ocupacoes__data_fim'), Value(fim)), Value(fim))
+        - Greatest(F('casas__ocupacoes__data_inicio'), Value(inicio)),
+        output_field=DurationField(),
+    )
+
+    predios = predios.annotate(
+        total_casas=Count('casas', distinct=True),
+        duracao_ocupada=Sum(dias_no_periodo, filter=sobrepoe),
+        entradas=Count('casas__ocupacoes', filter=entrou),
+        tempo_ate_arrendar=Avg('casas__ocupacoes__dias_vago_antes', filter=entrou),
+    ).select_related('gerente__user').order_by('nome')
+
+    dias_periodo = (fim - inicio).days
+    resultado = list(predios)
+    for predio in resultado:
+        predio.dias_ocupados = (predio.duracao_ocupada or timedelta()).days
+        capacidade = predio.total_casas * dias_periodo
+        predio.taxa_vacancia = (1 - predio.dias_ocupados / capacidade) * 100 if capacidade else None
+        predio.rotatividade = predio.entradas / predio.total_casas if predio.total_casas else None
+    return resultado
@@ -0,0 +1,119 @@
+"""
+Reajuste de rendas em massa: por prédio, por gerente ou em todo o
+portfólio, por percentagem ou por um valor fixo, a partir de um mês.
+
+Em cada base de dados são feitos dois UPDATE com expressões F:
+- Contratos.valor_renda dos contratos ativos abrangidos;
+- PagamentoRenda.valor das rendas 'nao_pago' desses contratos com
+  mes_referencia a partir do mês indicado (índice pagamento_estado_mes_idx).
+As rendas já pagas e as dos meses anteriores ficam como estão.
+
+simular() calcula o impacto (número de contratos e de rendas, totais antes
+e depois) com as mesmas expressões, sem alterar nada.
+
+As atualizações em massa não disparam sinais: os resumos financeiros em
+cache dos contratos alterados e o contexto dos respetivos inquilinos são
+invalidados aqui (ver inquilino/financas.py e inquilino/contexto.py).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Round
+
+from inquilino.contexto import invalidar_contextos_de_inquilinos
+from inquilino.financas import invalidar_resumos
+from inquilino.models import PagamentoRenda
+from projecto_condominio.sharding import todas_as_bases
+from .models import Contratos
+
+PERCENTAGEM = 'percentagem'
+VALOR = 'valor'
+TIPOS = [(PERCENTAGEM, 'Percentagem (%)'), (VALOR, 'Valor fixo (MZN)')]
+
+CENTIMO = Decimal('0.01')
+_DINHEIRO = DecimalField(max_digits=12, decimal_places=2)
+_ZERO = Value(Decimal('0'), output_field=_DINHEIRO)
+
+
+def novo_valor(campo, tipo, montante):
+    """
+    Expressão do valor reajustado de `campo`, arredondado ao cêntimo e
+    nunca negativo.
+    """
+    montante = Decimal(montante)
+    if tipo == PERCENTAGEM:
+        expressao = F(campo) * Value(1 + montante / 100, output_field=_DINHEIRO)
+    elif tipo == VALOR:
+        expressao = F(campo) + Value(montante, output_field=_DINHEIRO)
+    else:
+        raise ValueError(f'Tipo de reajuste desconhecido: {tipo}')
+    return Greatest(Round(expressao, 2, output_field=_DINHEIRO), _ZERO, output_field=_DINHEIRO)
+
+
+def _abrangidos(alias, mes, predio_id=None, gerente_id=None):
+    contratos = Contratos.objects.using(alias).filter(estado='ativo')
+    if predio_id is not None:
+        contratos = contratos.filter(casa__predio_id=predio_id)
+    elif gerente_id is not None:
+        contratos = contratos.filter(casa__predio__gerente_id=gerente_id)
+    prestacoes = PagamentoRenda.objects.using(alias).filter(
+        estado='nao_pago', mes_referencia__gte=mes, contrato__in=contratos.values('id'),
+    )
+    return contratos, prestacoes
+
+
+def simular(tipo, montante, mes, predio_id=None, gerente_id=None):
+    """
+    Impacto do reajuste, somado em todas as bases de dados: contratos,
+    rendas por pagar abrangidas e totais mensais antes e depois.
+    """
+    impacto = {
+        'contratos': 0, 'renda_atual': Decimal('0'), 'renda_nova': Decimal('0'),
+        'prestacoes': 0, 'prestacoes_atual': Decimal('0'), 'prestacoes_nova': Decimal('0'),
+    }
+    for alias in todas_as_bases():
+        contratos, prestacoes = _abrangidos(alias, mes, predio_id, gerente_id)
+        c = contratos.aggregate(
+            total=Count('id'),
+            atual=Coalesce(Sum('valor_renda'), _ZERO),
+            nova=Coalesce(Sum(novo_valor('valor_renda', tipo, montante)), _ZERO),
+        )
+        p = prestacoes.aggregate(
+            total=Count('id'),
+            atual=Coalesce(Sum('valor'), _ZERO),
+            nova=Coalesce(Sum(novo_valor('valor', tipo, montante)), _ZERO),
+        )
+        impacto['contratos'] += c['total']
+        impacto['renda_atual'] += c['atual']
+        impacto['renda_nova'] += c['nova']
+        impacto['prestacoes'] += p['total']
+        impacto['prestacoes_atual'] += p['atual']
+        impacto['prestacoes_nova'] += p['nova']
+    impacto['diferenca_mensal'] = impacto['renda_nova'] - impacto['renda_atual']
+    impacto['diferenca_prestacoes'] = impacto['prestacoes_nova'] - impacto['prestacoes_atual']
+    # O SQLite soma em vírgula flutuante: os totais voltam a cêntimos.
+    for chave, valor in impacto.items():
+        if isinstance(valor, Decimal):
+            impacto[chave] = valor.quantize(CENTIMO)
+    return impacto
+
+
+def reajustar(tipo, montante, mes, predio_id=None, gerente_id=None):
+    """
+    Aplica o reajuste. Devolve (contratos, rendas) alterados.
+    """
+    total_contratos = total_prestacoes = 0
+    for alias in todas_as_bases():
+        contratos, prestacoes = _abrangidos(alias, mes, predio_id, gerente_id)
+        with transaction.atomic(using=alias):
+            abrangidos = list(contratos.values_list('id', 'inquilino_id'))
+            if not abrangidos:
+                continue
+            ids = [contrato_id for contrato_id, _ in abrangidos]
+            # As rendas primeiro: o filtro usa o estado dos contratos, não o valor.
+            total_prestacoes += prestacoes.update(valor=novo_valor('valor', tipo, montante))
+            total_contratos += contratos.update(valor_renda=novo_valor('valor_renda', tipo, montante))
+            invalidar_contextos_de_inquilinos([inquilino_id for _, inquilino_id in abrangidos], using=alias)
+        invalidar_resumos(ids)
+    return total_contratos, total_prestacoes
@@ -0,0 +1,123 @@
+"""
+Tempos de resolução das manutenções (da solicitação à conclusão).
+
+Cada conclusão soma uma unidade ao histograma do dia em ResolucaoDiaria
+(tipo, prédio); uma manutenção reaberta retira-a. Os percentis de um período
+obtêm-se juntando os histogramas dos dias e interpolando dentro do
+intervalo onde cai o percentil, por isso são aproximados à resolução dos
+LIMITES_HORAS.
+"""
+from bisect import bisect_left
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Manutencao, ManutencaoArquivo, ResolucaoDiaria
+
+# Limite superior (em horas) de cada intervalo do histograma; o último
+# intervalo não tem limite.
+LIMITES_HORAS = [1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720, 1440, 2160]
+
+
+def _intervalo(horas):
+    return bisect_left(LIMITES_HORAS, horas)
+
+
+def registar_resolucao(tipo, predio_id, gerente_id, data_solicitacao, data_conclusao, sinal=1):
+    """
+    Soma (sinal=1) ou retira (sinal=-1) uma resolução ao agregado do dia da
+    conclusão.
+    """
+    if predio_id is None:
+        return
+    horas = max((data_conclusao - data_solicitacao).total_seconds() / 3600, 0)
+    with transaction.atomic():
+        linha, _ = ResolucaoDiaria.objects.select_for_update().get_or_create(
+            dia=timezone.localdate(data_conclusao), tipo=tipo, predio_id=predio_id,
+            defaults={'gerente_id': gerente_id, 'histograma': [0] * (len(LIMITES_HORAS) + 1)},
+        )
+        linha.histograma[_intervalo(horas)] += sinal
+        linha.total += sinal
+        linha.soma_horas += sinal * horas
+        linha.save(update_fields=['histograma', 'total', 'soma_horas'])
+
+
+def percentil(histograma, total, q):
+    """
+    Percentil q (0-1) aproximado a partir de um histograma de horas.
+    """
+    if total <= 0:
+        return None
+    alvo = q * total
+    acumulado = 0
+    for indice, contagem in enumerate(histograma):
+        if contagem and acumulado + contagem >= alvo:
+            inferior = LIMITES_HORAS[indice - 1] if indice else 0
+            if indice >= len(LIMITES_HORAS):
+                return inferior
+            return inferior + (LIMITES_HORAS[indice] - inferior) * (alvo - acumulado) / contagem
+        acumulado += contagem
+    return LIMITES_HORAS[-1]
+
+
+def estatisticas(linhas, chave):
+    """
+    Junta as linhas de ResolucaoDiaria pelo valor de `chave(linha)` e devolve,
+    por grupo, o total, a média e os percentis 50 e 90 (em horas), ordenado
+    pelo p90 mais alto.
+    """
+    grupos = {}
+    for linha in linhas:
+        grupo = grupos.setdefault(chave(linha), {
+            'total': 0, 'soma_horas': 0.0, 'histograma': [0] * (len(LIMITES_HORAS) + 1),
+        })
+        grupo['total'] += linha.total
+        grupo['soma_horas'] += linha.soma_horas
+        for indice, contagem in enumerate(linha.histograma):
+            grupo['histograma'][indice] += contagem
+
+    resultado = []
+    for nome, grupo in grupos.items():
+        if grupo['total'] <= 0:
+            continue
+        resultado.append({
+            'nome': nome,
+            'total': grupo['total'],
+            'media': grupo['soma_horas'] / grupo['total'],
+            'p50': percentil(grupo['histograma'], grupo['total'], 0.5),
+            'p90': percentil(grupo['histograma'], grupo['total'], 0.9),
+        })
+    resultado.sort(key=lambda g: g['p90'], reverse=True)
+    return resultado
+
+
+def reconstruir():
+    """
+    Recalcula todos os agregados a partir das manutenções concluídas
+    (incluindo as arquivadas), em memória, e grava-os com um bulk_create.
+    Devolve o número de manutenções contadas.
+    """
+    linhas = {}
+    total = 0
+    for model in (Manutencao, ManutencaoArquivo):
+        concluidas = model.objects.filter(
+            estado='concluido', data_conclusao__isnull=False, predio__isnull=False
+        ).values_list('tipo', 'predio_id', 'gerente_id', 'data_solicitacao', 'data_conclusao')
+        for tipo, predio_id, gerente_id, data_solicitacao, data_conclusao in concluidas.iterator():
+            dia = timezone.localdate(data_conclusao)
+            linha = linhas.get((dia, tipo, predio_id))
+            if linha is None:
+                linha = linhas[(dia, tipo, predio_id)] = ResolucaoDiaria(
+                    dia=dia, tipo=tipo, predio_id=predio_id, gerente_id=gerente_id,
+                    histograma=[0] * (len(LIMITES_HORAS) + 1),
+                )
+            horas = max((data_conclusao - data_solicitacao).total_seconds() / 3600, 0)
+            linha.histograma[_intervalo(horas)] += 1
+            linha.total += 1
+            linha.soma_horas += horas
+            total += 1
+
+    with transaction.atomic():
+        ResolucaoDiaria.objects.all().delete()
+        ResolucaoDiaria.objects.bulk_create(linhas.values(), batch_size=1000)
+    return total
@@ -0,0 +1,142 @@
+"""
+Sinais que mantêm dados derivados sincronizados quando uma casa ou um
+prédio é gravado com save():
+- o histórico de ocupação (Ocupacao) com Casa.inquilino;
+- o prédio e o gerente guardados em cada Manutencao;
+- Inquilino.disponivel com os contratos ativos de cada inquilino;
+- as transições de estado das manutenções e os tempos de resolução
+  agregados por dia (ResolucaoDiaria);
+- os ficheiros das fotos de manutenção que deixam de ser usados.
+
+As atualizações em massa (QuerySet.update) não disparam sinais; quem as usa
+deve atualizar o histórico diretamente (ver processar_contratos).
+"""
+from datetime import date
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from administrador.models import Predio
+from .disponibilidade import atualizar_disponibilidade
+from .fotos import apagar_ficheiros_sem_uso
+from .models import (
+    Casa, Contratos, FotoManutencao, Inquilino, Manutencao, ManutencaoArquivo, Ocupacao, TransicaoManutencao,
+)
+from .resolucao import registar_resolucao
+from .ocupacao import registar_mudanca
+
+
+@receiver(post_init, sender=Casa)
+def guardar_valores_originais_casa(sender, instance, **kwargs):
+    # Sem ler campos diferidos: o refresh_from_db de Casa.versao cria uma
+    # instância só com a versão, e lê-los aqui voltaria a chamá-lo.
+    instance._inquilino_original = instance.__dict__.get('inquilino_id')
+    instance._predio_original = instance.__dict__.get('predio_id')
+
+
+@receiver(post_save, sender=Casa)
+def registar_ocupacao(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created and instance.inquilino_id is None:
+        return
+    if created or instance.inquilino_id != instance._inquilino_original:
+        registar_mudanca(instance.id, instance.inquilino_id, using=kwargs.get('using'))
+    instance._inquilino_original = instance.inquilino_id
+
+
+@receiver(post_save, sender=Casa)
+def mover_manutencoes_da_casa(sender, instance, created, raw=False, **kwargs):
+    # Uma casa que muda de prédio leva as suas manutenções (prédio e gerente).
+    if raw or created or instance.predio_id == instance._predio_original:
+        return
+    gerente_id = Predio.objects.filter(pk=instance.predio_id).values_list('gerente_id', flat=True).first()
+    for model in (Manutencao, ManutencaoArquivo):
+        model.objects.filter(casa=instance).update(predio_id=instance.predio_id, gerente_id=gerente_id)
+    instance._predio_original = instance.predio_id
+
+
+@receiver(post_init, sender=Predio)
+def guardar_gerente_original(sender, instance, **kwargs):
+    instance._gerente_original = instance.gerente_id
+
+
+@receiver(post_save, sender=Predio)
+def atualizar_gerente_das_manutencoes(sender, instance, created, raw=False, **kwargs):
+    # Mantém Manutencao.gerente coerente quando o prédio muda de gerente.
+    if raw or created or instance.gerente_id == instance._gerente_original:
+        return
+    for model in (Manutencao, ManutencaoArquivo):
+        model.objects.filter(predio=instance).update(gerente_id=instance.gerente_id)
+    instance._gerente_original = instance.gerente_id
+
+
+@receiver(pre_delete, sender=Inquilino)
+def fechar_ocupacoes_do_inquilino(sender, instance, **kwargs):
+    # Casa.inquilino passa a nulo via SET_NULL (sem save()), por isso a
+    # ocupação é fechada aqui antes de o inquilino desaparecer.
+    Ocupacao.objects.filter(inquilino=instance, data_fim__isnull=True).update(data_fim=date.today())
+
+
+@receiver(post_init, sender=Contratos)
+def guardar_valores_originais_contrato(sender, instance, **kwargs):
+    instance._inquilino_original = instance.inquilino_id
+    instance._estado_original = instance.estado
+
+
+@receiver(post_save, sender=Contratos)
+def atualizar_disponibilidade_contrato(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or instance.estado != instance._estado_original or instance.inquilino_id != instance._inquilino_original:
+        # Inclui o inquilino anterior, que pode ter ficado sem contrato ativo.
+        atualizar_disponibilidade([instance.inquilino_id, instance._inquilino_original])
+    instance._inquilino_original = instance.inquilino_id
+    instance._estado_original = instance.estado
+
+
+@receiver(post_delete, sender=Contratos)
+def libertar_inquilino_do_contrato(sender, instance, **kwargs):
+    if instance.estado == 'ativo':
+        atualizar_disponibilidade([instance.inquilino_id])
+
+
+@receiver(post_delete, sender=FotoManutencao)
+def apagar_ficheiros_da_foto(sender, instance, **kwargs):
+    # Outras fotos podem partilhar o mesmo conteúdo: só apaga se já não houver nenhuma.
+    transaction.on_commit(lambda: apagar_ficheiros_sem_uso(instance.sha256))
+
+
+@receiver(post_init, sender=Manutencao)
+def guardar_estado_original(sender, instance, **kwargs):
+    instance._estado_original = instance.estado
+    instance._data_conclusao_original = instance.data_conclusao
+
+
+@receiver(post_save, sender=Manutencao)
+def registar_transicao(sender, instance, created, raw=False, **kwargs):
+    # Quem fez a alteração pode ser indicado pela view em instance._alterado_por.
+    if raw or (not created and instance.estado == instance._estado_original):
+        return
+    TransicaoManutencao.objects.create(
+        manutencao=instance,
+        estado_anterior='' if created else instance._estado_original,
+        estado_novo=instance.estado,
+        data=instance.data_conclusao or timezone.now(),
+        alterado_por=getattr(instance, '_alterado_por', None),
+    )
+    # Uma manutenção reaberta deixa de contar para o dia em que foi concluída.
+    if not created and instance._estado_original == 'concluido' and instance._data_conclusao_original:
+        registar_resolucao(
+            instance.tipo, instance.predio_id, instance.gerente_id,
+            instance.data_solicitacao, instance._data_conclusao_original, sinal=-1,
+        )
+    if instance.estado == 'concluido':
+        registar_resolucao(
+            instance.tipo, instance.predio_id, instance.gerente_id,
+            instance.data_solicitacao, instance.data_conclusao,
+        )
+    instance._estado_original = instance.estado
+    instance._data_conclusao_original = instance.data_conclusao
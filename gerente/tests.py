@@ -1,3 +1,645 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+import os
+from pathlib import Path
+import tempfile
+import threading
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from administrador.models import Gerente, Predio
+from inquilino.models import PagamentoRenda, PagamentoRendaArquivo
+from inquilino.financas import resumo
+from inquilino.services import meses_do_contrato, novos_pagamentos
+from projecto_condominio.sharding import alias_do_gerente, usar_gerente
+from . import disponibilidade, fotos, ocupacao, reajuste, resolucao
+from .atribuicao import Indisponivel, apagar_contrato, criar_contrato
+from .contratos import descrever_tempo_restante, tempo_restante, tempos_restantes
+from .models import Casa, Contratos, FotoManutencao, Inquilino, Manutencao, Ocupacao, ResolucaoDiaria
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def criar_gerente(nome='gerente'):
+    user = User.objects.create_user(nome)
+    user.groups.add(Group.objects.get_or_create(name='Gerente')[0])
+    return Gerente.objects.create(user=user, contacto=f'g-{nome}')
+
+
+def criar_inquilino(nome, gerente=None):
+    return Inquilino.objects.create(user=User.objects.create_user(nome), contacto=f'i-{nome}', gerente=gerente)
+
+
+def executar(comando, *args):
+    call_command(comando, *args, stdout=StringIO())
+
+
+class PortfolioMixin:
+    def setUp(self):
+        cache.clear()
+        self.gerente = criar_gerente()
+        self.predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=self.gerente)
+        self.inquilino = criar_inquilino('ana', self.gerente)
+        self.casa = Casa.objects.create(numero='1A', predio=self.predio, inquilino=self.inquilino)
+
+    def contrato(self, data_inicio, duracao_meses=12, valor_renda=500, **campos):
+        contrato = Contratos.objects.create(
+            inquilino=self.inquilino, casa=self.casa, data_inicio=data_inicio,
+            valor_renda=valor_renda, duracao_meses=duracao_meses, **campos
+        )
+        PagamentoRenda.objects.bulk_create(novos_pagamentos(contrato))
+        return contrato
+
+
+# faturar_mes lê os contratos em threads, com outras ligações: os dados têm
+# de estar gravados (TransactionTestCase) e não numa transação por fechar.
+@override_settings(CACHES=CACHE_LOCAL)
+class FaturacaoTests(PortfolioMixin, TransactionTestCase):
+    def test_renovacao_a_meio_do_mes_nao_e_faturada_duas_vezes(self):
+        antigo = self.contrato(date(2025, 1, 15))
+        executar('processar_contratos', '--renovar', '--data', '2026-01-20')
+        renovacao = Contratos.objects.get(estado='ativo')
+        self.assertEqual(renovacao.data_inicio, date(2026, 1, 15))
+
+        executar('faturar_mes', '--mes', '2026-01', '--workers', '1')
+        executar('faturar_mes', '--mes', '2026-02', '--workers', '1')
+
+        janeiro = PagamentoRenda.objects.filter(mes_referencia=date(2026, 1, 1))
+        self.assertEqual(list(janeiro.values_list('contrato_id', flat=True)), [antigo.id])
+        self.assertEqual(
+            PagamentoRenda.objects.filter(contrato=renovacao).order_by('mes_referencia').first().mes_referencia,
+            date(2026, 2, 1),
+        )
+        self.assertEqual(PagamentoRenda.objects.filter(mes_referencia=date(2026, 2, 1)).count(), 1)
+
+    def test_renovacao_no_dia_1_comeca_no_proprio_mes(self):
+        self.contrato(date(2025, 1, 1))
+        executar('processar_contratos', '--renovar', '--data', '2026-01-01')
+        renovacao = Contratos.objects.get(estado='ativo')
+        PagamentoRenda.objects.filter(contrato=renovacao).delete()
+
+        executar('faturar_mes', '--mes', '2026-01', '--workers', '1')
+
+        self.assertEqual(
+            list(PagamentoRenda.objects.filter(mes_referencia=date(2026, 1, 1)).values_list('contrato_id', flat=True)),
+            [renovacao.id],
+        )
+
+    def test_faturar_mes_e_idempotente(self):
+        contrato = Contratos.objects.create(
+            inquilino=self.inquilino, casa=self.casa, data_inicio=date(2026, 1, 1), valor_renda=500, duracao_meses=12
+        )
+        executar('faturar_mes', '--mes', '2026-03', '--workers', '1')
+        executar('faturar_mes', '--mes', '2026-03', '--workers', '1')
+
+        self.assertEqual(PagamentoRenda.objects.filter(contrato=contrato).count(), 1)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class DuracaoDoContratoTests(PortfolioMixin, TestCase):
+    def test_clean_recusa_duracao_nao_positiva(self):
+        for duracao in (0, -12):
+            with self.subTest(duracao=duracao):
+                contrato = Contratos(inquilino=self.inquilino, casa=self.casa, data_inicio=date(2025, 1, 1),
+                                     valor_renda=500, duracao_meses=duracao)
+                with self.assertRaises(ValidationError) as erro:
+                    contrato.full_clean()
+                self.assertIn('duracao_meses', erro.exception.message_dict)
+
+    def test_renovar_nao_repete_contratos_sem_duracao(self):
+        contrato = Contratos.objects.create(
+            inquilino=self.inquilino, casa=self.casa, data_inicio=date(2025, 1, 1), valor_renda=500, duracao_meses=0
+        )
+
+        executar('processar_contratos', '--renovar', '--data', '2026-01-01')
+        executar('processar_contratos', '--renovar', '--data', '2026-01-01')
+
+        self.assertEqual(list(Contratos.objects.values_list('id', 'estado')), [(contrato.id, 'terminado')])
+        self.casa.refresh_from_db()
+        self.assertIsNone(self.casa.inquilino)
+
+    def test_renovar_com_atraso_salta_para_o_periodo_atual(self):
+        antigo = self.contrato(date(2020, 1, 1))
+
+        executar('processar_contratos', '--renovar', '--data', '2024-03-15')
+        executar('processar_contratos', '--renovar', '--data', '2024-03-15')
+
+        renovacao = Contratos.objects.exclude(pk=antigo.pk).get()
+        self.assertEqual((renovacao.estado, renovacao.data_inicio, renovacao.data_fim),
+                         ('ativo', date(2024, 1, 1), date(2025, 1, 1)))
+        meses = PagamentoRenda.objects.filter(contrato=renovacao).values_list('mes_referencia', flat=True)
+        self.assertEqual(min(meses), date(2024, 1, 1))
+        self.assertEqual(len(meses), 12)
+
+    def test_formularios_recusam_duracao_nao_positiva(self):
+        self.client.force_login(self.gerente.user)
+        livre = criar_inquilino('rui', self.gerente)
+        vaga = Casa.objects.create(numero='2B', predio=self.predio)
+        dados = {'inquilino': livre.id, 'casa_vaga': vaga.id, 'duracao_anos': '0', 'valor_aluguel': '500'}
+
+        self.client.post(reverse('adicionar_contrato'), dados)
+        self.assertFalse(Contratos.objects.exists())
+
+        contrato = self.contrato(date(2025, 1, 1))
+        dados.update(inquilino=self.inquilino.id, casa_vaga=self.casa.id, duracao_anos='-1')
+        self.client.post(reverse('editar_contrato', args=[contrato.pk]), dados)
+        contrato.refresh_from_db()
+        self.assertEqual(contrato.duracao_meses, 12)
+
+
+class DatasDosContratosTests(SimpleTestCase):
+    def test_tempo_restante_igual_ao_relativedelta(self):
+        hoje = date(2024, 1, 31)
+        datas_fim = [date(2024, 2, 29), date(2024, 3, 1), date(2025, 1, 30), date(2025, 1, 31), date(2028, 12, 31)]
+        for data_fim in datas_fim:
+            with self.subTest(data_fim=data_fim):
+                delta = relativedelta(data_fim, hoje)
+                self.assertEqual(tempo_restante(data_fim, hoje), (delta.years, delta.months, delta.days))
+        self.assertEqual(tempos_restantes(datas_fim, hoje), [tempo_restante(d, hoje) for d in datas_fim])
+
+    def test_contrato_terminado_esta_expirado(self):
+        for data_fim in (date(2024, 1, 31), date(2023, 6, 1)):
+            self.assertEqual(tempo_restante(data_fim, date(2024, 1, 31)), (0, 0, 0))
+        self.assertEqual(descrever_tempo_restante(0, 0, 0), 'Expirado')
+        self.assertEqual(descrever_tempo_restante(1, 2, 3), '1 anos e 2 meses')
+
+    def test_meses_do_contrato(self):
+        contrato = Contratos(data_inicio=date(2025, 1, 15), duracao_meses=12)
+        meses = list(meses_do_contrato(contrato))
+        # Acaba a 15/01/2026: janeiro de 2026 também é coberto.
+        self.assertEqual((meses[0], meses[-1], len(meses)), (date(2025, 1, 1), date(2026, 1, 1), 13))
+
+        contrato.data_inicio = date(2025, 1, 1)
+        self.assertEqual(len(list(meses_do_contrato(contrato))), 12)
+        self.assertEqual(list(meses_do_contrato(contrato, date(2025, 11, 1))), [date(2025, 11, 1), date(2025, 12, 1)])
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ContratosNoShardTests(PortfolioMixin, TestCase):
+    """
+    O gerente do portfólio passa para uma base própria (dividir_por_gerente
+    --apagar-origem, para uma pasta temporária).
+    """
+    def setUp(self):
+        super().setUp()
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.enterContext(override_settings(SHARDS_DIR=Path(pasta.name)))
+        self.antigo = self.contrato(date(2025, 1, 1))
+
+        self.alias = alias_do_gerente(self.gerente.id)
+        self.addCleanup(setattr, type(self), 'databases', self.databases)
+        type(self).databases = self.databases | {self.alias}
+        self.addCleanup(self.remover_shard)
+        executar('dividir_por_gerente', '--gerente', str(self.gerente.id), '--apagar-origem')
+
+    def remover_shard(self):
+        if self.alias in connections.settings:
+            connections[self.alias].close()
+            del connections[self.alias]
+            del connections.settings[self.alias]
+        settings.DATABASES.pop(self.alias, None)
+
+    def test_terminar_contratos_do_shard(self):
+        executar('processar_contratos', '--data', '2026-01-01')
+
+        contrato = Contratos.objects.using(self.alias).get(pk=self.antigo.pk)
+        self.assertEqual(contrato.estado, 'terminado')
+        self.assertIsNone(Casa.objects.using(self.alias).get(pk=self.casa.pk).inquilino_id)
+        self.assertTrue(Inquilino.objects.using(self.alias).get(pk=self.inquilino.pk).disponivel)
+
+    def test_arquivar_o_historico_do_shard(self):
+        Contratos.objects.using(self.alias).filter(pk=self.antigo.pk).update(estado='terminado')
+        pagamentos = PagamentoRenda.objects.using(self.alias).filter(contrato_id=self.antigo.pk)
+        pagamentos.filter(mes_referencia__lt=date(2025, 4, 1)).update(estado='pago')
+
+        executar('arquivar_historico', '--antes-de', '2026-06-01')
+
+        self.assertEqual(pagamentos.filter(estado='pago').count(), 0)
+        self.assertEqual(pagamentos.count(), 9)
+        self.assertEqual(PagamentoRendaArquivo.objects.using(self.alias).filter(contrato_id=self.antigo.pk).count(), 3)
+
+    def test_renovar_contratos_do_shard(self):
+        executar('processar_contratos', '--renovar', '--data', '2026-01-01')
+
+        contratos = Contratos.objects.using(self.alias)
+        self.assertEqual(contratos.get(pk=self.antigo.pk).estado, 'renovado')
+        renovacao = contratos.get(estado='ativo')
+        self.assertEqual((renovacao.data_inicio, renovacao.data_fim), (date(2026, 1, 1), date(2027, 1, 1)))
+        self.assertEqual(PagamentoRenda.objects.using(self.alias).filter(contrato=renovacao).count(), 12)
+        self.assertFalse(Contratos.objects.using('default').exists())
+
+    def test_ocupacao_fica_no_shard_da_casa(self):
+        casa = Casa.objects.using(self.alias).get(pk=self.casa.pk)
+        casa.inquilino = None
+        casa.save()
+
+        ocupacoes = Ocupacao.objects.using(self.alias).filter(casa_id=self.casa.pk)
+        self.assertFalse(ocupacoes.filter(data_fim__isnull=True).exists())
+        self.assertFalse(Ocupacao.objects.using('default').exists())
+
+    def test_apagar_contrato_do_shard(self):
+        contrato = Contratos.objects.using(self.alias).get(pk=self.antigo.pk)
+
+        with usar_gerente(self.gerente.id):
+            apagar_contrato(contrato)
+
+        self.assertFalse(Contratos.objects.using(self.alias).filter(pk=self.antigo.pk).exists())
+        self.assertIsNone(Casa.objects.using(self.alias).get(pk=self.casa.pk).inquilino_id)
+        self.assertFalse(Ocupacao.objects.using(self.alias).filter(data_fim__isnull=True).exists())
+        self.assertFalse(Ocupacao.objects.using('default').exists())
+
+
+@skipUnless(Image, 'O Pillow não está instalado.')
+@override_settings(CACHES=CACHE_LOCAL)
+class VariantesDasFotosTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=pasta.name))
+        predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=criar_gerente())
+        self.manutencao = Manutencao.objects.create(tipo='geral', descricao='Janela', predio=predio)
+
+    def foto(self, sha256, extensao, conteudo):
+        foto = FotoManutencao.objects.create(
+            manutencao=self.manutencao, sha256=sha256, extensao=extensao, tamanho=len(conteudo)
+        )
+        os.makedirs(os.path.dirname(fotos.caminho(foto)), exist_ok=True)
+        with open(fotos.caminho(foto), 'wb') as ficheiro:
+            ficheiro.write(conteudo)
+        return foto
+
+    def png(self):
+        conteudo = BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(conteudo, 'PNG')
+        return conteudo.getvalue()
+
+    def test_imagem_corrompida_nao_impede_as_restantes(self):
+        corrompida = self.foto('0' * 64, 'jpg', b'\xff\xd8\xff' + b'lixo' * 100)
+        valida = self.foto('f' * 64, 'png', self.png())
+
+        with self.assertLogs('gerente.fotos', 'ERROR'):
+            feitas = fotos.gerar_variantes([corrompida.sha256, valida.sha256])
+
+        self.assertEqual(feitas, 1)
+        self.assertEqual(
+            dict(FotoManutencao.objects.values_list('sha256', 'variantes_prontas')),
+            {corrompida.sha256: False, valida.sha256: True},
+        )
+        with Image.open(fotos.caminho(valida, 'mini')) as mini:
+            self.assertEqual(max(mini.size), fotos.VARIANTES['mini'])
+
+    def test_comando_termina_com_imagens_ilegiveis(self):
+        self.foto('0' * 64, 'png', b'\x89PNG\r\n\x1a\n' + b'lixo' * 100)
+        self.foto('f' * 64, 'png', self.png())
+        saida = StringIO()
+
+        with self.assertLogs('gerente.fotos', 'ERROR'):
+            call_command('gerar_miniaturas', '--lote', '1', stdout=saida)
+
+        self.assertIn('1 imagens processadas', saida.getvalue())
+        self.assertIn('1 imagens não puderam ser lidas', saida.getvalue())
+
+    def test_webp_so_e_aceite_se_o_pillow_o_ler(self):
+        webp = BytesIO(b'RIFF\x00\x00\x00\x00WEBPVP8 ')
+
+        with mock.patch('PIL.features.check', return_value=False):
+            self.assertIsNone(fotos._extensao(webp))
+        with mock.patch('PIL.features.check', return_value=True):
+            self.assertEqual(fotos._extensao(webp), 'webp')
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class AtribuicaoTests(PortfolioMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.vaga = Casa.objects.create(numero='2B', predio=self.predio)
+        self.rui = criar_inquilino('rui', self.gerente)
+        self.eva = criar_inquilino('eva', self.gerente)
+
+    def test_atribui_a_casa_vaga(self):
+        versao = self.vaga.versao
+
+        criar_contrato(self.rui, self.vaga, 12, 500, date(2026, 1, 1))
+
+        self.vaga.refresh_from_db()
+        self.rui.refresh_from_db()
+        self.assertEqual(self.vaga.inquilino, self.rui)
+        self.assertEqual(self.vaga.versao, versao + 1)
+        self.assertFalse(self.rui.disponivel)
+
+    def test_casa_ocupada_depois_de_lida_e_recusada(self):
+        lida_pela_eva = Casa.objects.get(pk=self.vaga.pk)
+        criar_contrato(self.rui, self.vaga, 12, 500, date(2026, 1, 1))
+
+        with self.assertRaisesMessage(Indisponivel, 'já não está vaga'):
+            criar_contrato(self.eva, lida_pela_eva, 12, 500, date(2026, 1, 1))
+
+        self.assertEqual(list(Contratos.objects.filter(casa=self.vaga).values_list('inquilino', flat=True)), [self.rui.id])
+        self.eva.refresh_from_db()
+        self.assertTrue(self.eva.disponivel)
+
+    def test_casa_editada_depois_de_lida_continua_disponivel(self):
+        lida = Casa.objects.get(pk=self.vaga.pk)
+        editada = Casa.objects.get(pk=self.vaga.pk)
+        editada.numero = '2C'
+        editada.save()
+
+        criar_contrato(self.rui, lida, 12, 500, date(2026, 1, 1))
+
+        self.vaga.refresh_from_db()
+        self.assertEqual((self.vaga.numero, self.vaga.inquilino), ('2C', self.rui))
+
+    def test_gravar_a_casa_so_rele_a_versao_se_for_usada(self):
+        versao = self.vaga.versao
+
+        with self.assertNumQueries(1):
+            self.vaga.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.vaga.versao, versao + 1)
+
+    def test_inquilino_com_contrato_nao_fica_com_outra_casa(self):
+        outra = Casa.objects.create(numero='3C', predio=self.predio)
+        criar_contrato(self.rui, self.vaga, 12, 500, date(2026, 1, 1))
+
+        with self.assertRaisesMessage(Indisponivel, 'já tem um contrato ativo'):
+            criar_contrato(self.rui, outra, 12, 500, date(2026, 1, 1))
+
+        outra.refresh_from_db()
+        self.assertIsNone(outra.inquilino)
+
+    def test_apagar_contrato_liberta_a_casa(self):
+        contrato = criar_contrato(self.rui, self.vaga, 12, 500, date(2026, 1, 1))
+
+        apagar_contrato(contrato)
+
+        self.vaga.refresh_from_db()
+        self.rui.refresh_from_db()
+        self.assertIsNone(self.vaga.inquilino)
+        self.assertTrue(self.rui.disponivel)
+        self.assertFalse(Ocupacao.objects.filter(casa=self.vaga, data_fim__isnull=True).exists())
+
+    def test_apagar_contrato_nao_liberta_a_casa_de_outro_inquilino(self):
+        contrato = criar_contrato(self.rui, self.vaga, 12, 500, date(2026, 1, 1))
+        Casa.objects.filter(pk=self.vaga.pk).update(inquilino=self.eva)
+
+        apagar_contrato(contrato)
+
+        self.vaga.refresh_from_db()
+        self.assertEqual(self.vaga.inquilino, self.eva)
+        self.assertFalse(Contratos.objects.filter(pk=contrato.pk).exists())
+
+
+# As threads usam ligações próprias: os dados têm de estar gravados.
+@override_settings(CACHES=CACHE_LOCAL)
+class AtribuicaoConcorrenteTests(PortfolioMixin, TransactionTestCase):
+    def test_so_um_pedido_fica_com_a_casa(self):
+        vaga = Casa.objects.create(numero='2B', predio=self.predio)
+        inquilinos = [criar_inquilino(f'concorrente{i}', self.gerente) for i in range(6)]
+        barreira = threading.Barrier(len(inquilinos))
+        resultados = []
+
+        def pedir(inquilino):
+            # Cada pedido lê a casa vaga antes de qualquer escrita.
+            casa = Casa.objects.get(pk=vaga.pk)
+            barreira.wait()
+            try:
+                criar_contrato(inquilino, casa, 12, 500, date(2026, 1, 1))
+                resultados.append('ok')
+            except Indisponivel:
+                resultados.append('indisponivel')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pedir, args=(i,)) for i in inquilinos]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(resultados), ['indisponivel'] * 5 + ['ok'])
+        self.assertEqual(Contratos.objects.filter(casa=vaga).count(), 1)
+        vaga.refresh_from_db()
+        self.assertEqual(vaga.inquilino_id, Contratos.objects.get(casa=vaga).inquilino_id)
+        self.assertEqual(Inquilino.objects.filter(pk__in=[i.pk for i in inquilinos], disponivel=False).count(), 1)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ReajusteTests(PortfolioMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.ativo = self.contrato(date(2026, 1, 1), valor_renda=Decimal('333.33'))
+        PagamentoRenda.objects.filter(contrato=self.ativo, mes_referencia__lte=date(2026, 4, 1)).update(estado='pago')
+        outro = Predio.objects.create(nome='Norte', localizacao='Braga', gerente=self.gerente)
+        self.outro = Contratos.objects.create(
+            inquilino=criar_inquilino('rui', self.gerente), casa=Casa.objects.create(numero='9Z', predio=outro),
+            data_inicio=date(2026, 1, 1), valor_renda=Decimal('700'), duracao_meses=12,
+        )
+        PagamentoRenda.objects.bulk_create(novos_pagamentos(self.outro))
+
+    def valores(self, contrato):
+        return dict(PagamentoRenda.objects.filter(contrato=contrato).values_list('mes_referencia__month', 'valor'))
+
+    def test_simular_nao_altera_e_preve_o_resultado(self):
+        impacto = reajuste.simular(reajuste.PERCENTAGEM, '3', date(2026, 3, 1), predio_id=self.predio.id)
+
+        self.ativo.refresh_from_db()
+        self.assertEqual(self.ativo.valor_renda, Decimal('333.33'))
+        self.assertEqual(impacto['contratos'], 1)
+        # Março e abril já estão pagos: só contam maio a dezembro.
+        self.assertEqual(impacto['prestacoes'], 8)
+        self.assertEqual(impacto['renda_nova'], Decimal('343.33'))
+        self.assertEqual(impacto['diferenca_prestacoes'], Decimal('10.00') * 8)
+
+        reajuste.reajustar(reajuste.PERCENTAGEM, '3', date(2026, 3, 1), predio_id=self.predio.id)
+        total = sum(v for mes, v in self.valores(self.ativo).items() if mes >= 5)
+        self.assertEqual(total, impacto['prestacoes_nova'])
+
+    def test_pagina_de_simulacao_mostra_os_valores_em_meticais(self):
+        self.client.force_login(self.gerente.user)
+
+        resposta = self.client.post(
+            reverse('reajustar_rendas'),
+            {'tipo': reajuste.VALOR, 'montante': '10', 'mes': '2026-03', 'predio': self.predio.id, 'acao': 'simular'},
+        )
+
+        self.assertContains(resposta, 'Valor fixo (MZN)')
+        self.assertContains(resposta, 'de 333.33 MZN para 343.33 MZN (10.00 MZN)')
+        self.assertNotContains(resposta, '€')
+
+    def test_reajuste_so_muda_as_rendas_por_pagar_a_partir_do_mes(self):
+        contratos, rendas = reajuste.reajustar(reajuste.PERCENTAGEM, '3', date(2026, 6, 1), predio_id=self.predio.id)
+
+        self.assertEqual((contratos, rendas), (1, 7))
+        self.ativo.refresh_from_db()
+        self.assertEqual(self.ativo.valor_renda, Decimal('343.33'))
+        valores = self.valores(self.ativo)
+        self.assertEqual({valores[mes] for mes in range(1, 6)}, {Decimal('333.33')})
+        self.assertEqual({valores[mes] for mes in range(6, 13)}, {Decimal('343.33')})
+        # Outro prédio: não abrangido.
+        self.assertEqual(set(self.valores(self.outro).values()), {Decimal('700')})
+
+    def test_valor_fixo_nunca_fica_negativo(self):
+        reajuste.reajustar(reajuste.VALOR, '-1000', date(2026, 1, 1), gerente_id=self.gerente.id)
+
+        self.assertEqual(set(Contratos.objects.values_list('valor_renda', flat=True)), {Decimal('0')})
+        self.assertEqual(PagamentoRenda.objects.filter(estado='nao_pago').exclude(valor=0).count(), 0)
+        self.assertEqual(set(PagamentoRenda.objects.filter(estado='pago').values_list('valor', flat=True)), {Decimal('333.33')})
+
+    def test_reajuste_invalida_o_resumo_em_cache(self):
+        antes = resumo(self.ativo, hoje=date(2026, 1, 15))
+
+        reajuste.reajustar(reajuste.VALOR, '10', date(2026, 1, 1), predio_id=self.predio.id)
+
+        depois = resumo(self.ativo, hoje=date(2026, 1, 15))
+        self.assertEqual(depois['faturado'] - antes['faturado'], Decimal('10') * 8)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class OcupacaoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gerente = criar_gerente()
+        self.predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=self.gerente)
+        self.casa = Casa.objects.create(numero='1A', predio=self.predio)
+        self.ana = criar_inquilino('ana', self.gerente)
+        self.rui = criar_inquilino('rui', self.gerente)
+
+    def test_mudar_o_inquilino_da_casa_fecha_e_abre_ocupacoes(self):
+        self.casa.inquilino = self.ana
+        self.casa.save()
+        self.casa.inquilino = self.rui
+        self.casa.save()
+        self.casa.save()
+
+        ocupacoes = list(Ocupacao.objects.order_by('id').values_list('inquilino_id', 'data_fim'))
+        self.assertEqual(ocupacoes, [(self.ana.id, date.today()), (self.rui.id, None)])
+
+    def test_vacancia_rotatividade_e_tempo_ate_arrendar(self):
+        ocupacao.registar_mudanca(self.casa.id, self.ana.id, date(2026, 1, 1))
+        ocupacao.registar_mudanca(self.casa.id, None, date(2026, 1, 11))
+        ocupacao.registar_mudanca(self.casa.id, self.rui.id, date(2026, 1, 21))
+        Casa.objects.create(numero='1B', predio=self.predio)
+
+        predio, = ocupacao.estatisticas_por_predio(date(2026, 1, 1), date(2026, 2, 1))
+
+        # 1A: ocupada de 1 a 11 e de 21 a 31 de janeiro; 1B: sempre vaga.
+        self.assertEqual((predio.total_casas, predio.dias_ocupados, predio.entradas), (2, 21, 2))
+        self.assertAlmostEqual(predio.taxa_vacancia, (1 - 21 / 62) * 100)
+        self.assertEqual(predio.rotatividade, 1)
+        self.assertEqual(predio.tempo_ate_arrendar, 10)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ManutencaoDoGerenteTests(PortfolioMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.outro = criar_gerente('outro')
+        self.norte = Predio.objects.create(nome='Norte', localizacao='Porto', gerente=self.outro)
+
+    def test_manutencao_da_casa_fica_com_o_predio_e_o_gerente(self):
+        manutencao = Manutencao.objects.create(tipo='geral', descricao='Porta', casa=self.casa)
+
+        self.assertEqual((manutencao.predio_id, manutencao.gerente_id), (self.predio.id, self.gerente.id))
+
+    def test_mudancas_de_predio_e_de_gerente_acompanham_as_manutencoes(self):
+        da_casa = Manutencao.objects.create(tipo='geral', descricao='Porta', casa=self.casa)
+        do_predio = Manutencao.objects.create(tipo='geral', descricao='Elevador', predio=self.predio)
+
+        self.casa.predio = self.norte
+        self.casa.save()
+        da_casa.refresh_from_db()
+        self.assertEqual((da_casa.predio_id, da_casa.gerente_id), (self.norte.id, self.outro.id))
+
+        self.predio.gerente = self.outro
+        self.predio.save()
+        do_predio.refresh_from_db()
+        self.assertEqual(do_predio.gerente_id, self.outro.id)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ResolucaoTests(PortfolioMixin, TestCase):
+    def concluir(self, manutencao, horas):
+        manutencao.estado = 'concluido'
+        manutencao.data_conclusao = manutencao.data_solicitacao + timedelta(hours=horas)
+        manutencao.save()
+
+    def agregados(self):
+        return sorted(ResolucaoDiaria.objects.values_list('dia', 'tipo', 'predio_id', 'total', 'histograma'))
+
+    def test_concluir_e_reabrir_atualizam_o_dia(self):
+        manutencao = Manutencao.objects.create(tipo='geral', descricao='Porta', casa=self.casa)
+        self.concluir(manutencao, 5)
+
+        linha = ResolucaoDiaria.objects.get()
+        self.assertEqual((linha.predio_id, linha.gerente_id, linha.total), (self.predio.id, self.gerente.id, 1))
+        self.assertEqual(linha.histograma[resolucao._intervalo(5)], 1)
+
+        manutencao.estado = 'em_progresso'
+        manutencao.save()
+        self.assertEqual(ResolucaoDiaria.objects.get().total, 0)
+        self.assertEqual(sum(ResolucaoDiaria.objects.get().histograma), 0)
+
+        self.concluir(manutencao, 30)
+        self.assertEqual(ResolucaoDiaria.objects.filter(total__gt=0).count(), 1)
+        incrementais = [l for l in self.agregados() if l[3]]
+
+        self.assertEqual(resolucao.reconstruir(), 1)
+        self.assertEqual(self.agregados(), incrementais)
+
+    def test_percentis_por_tipo(self):
+        for tipo, horas in (('geral', 5), ('geral', 7), ('eletrico', 100)):
+            self.concluir(Manutencao.objects.create(tipo=tipo, descricao='-', casa=self.casa), horas)
+
+        por_tipo = resolucao.estatisticas(ResolucaoDiaria.objects.all(), lambda linha: linha.tipo)
+
+        self.assertEqual([g['nome'] for g in por_tipo], ['eletrico', 'geral'])
+        geral = por_tipo[1]
+        self.assertEqual((geral['total'], geral['media']), (2, 6))
+        # As duas caem no intervalo de 4 a 8 horas: o p50 é o meio.
+        self.assertEqual(geral['p50'], 6)
+        self.assertIsNone(resolucao.percentil([0] * 15, 0, 0.5))
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class DisponibilidadeTests(PortfolioMixin, TestCase):
+    def nomes(self, termo=''):
+        return [i['texto'] for i in disponibilidade.procurar_inquilinos_disponiveis(self.gerente, termo)]
+
+    def test_contratos_ativos_tiram_o_inquilino_da_lista(self):
+        criar_inquilino('andre', self.gerente)
+        criar_inquilino('beatriz', criar_gerente('outro'))
+        self.assertEqual(self.nomes(), ['ana', 'andre'])
+
+        contrato = self.contrato(date(2026, 1, 1))
+        self.assertEqual(self.nomes('an'), ['andre'])
+
+        contrato.estado = 'terminado'
+        contrato.save()
+        self.assertEqual(self.nomes('an'), ['ana', 'andre'])
+
+        self.contrato(date(2027, 1, 1)).delete()
+        self.assertEqual(self.nomes('an'), ['ana', 'andre'])
+
+    def test_casas_vagas_do_gerente(self):
+        Casa.objects.create(numero='2B', predio=self.predio)
+        Casa.objects.create(numero='1C', predio=Predio.objects.create(nome='Norte', localizacao='Braga', gerente=self.gerente))
+
+        casas = disponibilidade.procurar_casas_vagas(self.gerente, '')
+        self.assertEqual([c['texto'] for c in casas], ['Central - Casa 2B', 'Norte - Casa 1C'])
+        self.assertEqual([c['texto'] for c in disponibilidade.procurar_casas_vagas(self.gerente, 'nor')], ['Norte - Casa 1C'])
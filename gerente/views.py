@@ -4,12 +4,19 @@ from django.contrib import messages
 from django.contrib.auth.models import Group
 from django.contrib.auth.models import User
 from django.shortcuts import render
-from django.contrib.auth.decorators import user_passes_test
-from .models import Casa, Gerente, Predio, Inquilino, Manutencao, Contratos
-from django.db.models import Q
+from django.contrib.auth.decorators import login_required, user_passes_test
+from .models import Casa, Gerente, Predio, Inquilino, Manutencao, ManutencaoArquivo, FotoManutencao, Contratos
 from datetime import date
-from dateutil.relativedelta import relativedelta
+from decimal import Decimal, InvalidOperation
 from django.db import transaction
+from django.http import FileResponse, Http404, JsonResponse
+from projecto_condominio.replica import leitura_em_replica
+from projecto_condominio import remocao, throttling
+from . import fotos, reajuste
+from .atribuicao import Indisponivel, alterar_contrato, apagar_contrato, criar_contrato
+from .contratos import descrever_tempo_restante, tempos_restantes
+from .disponibilidade import procurar_casas_vagas, procurar_inquilinos_disponiveis
+from .fotos import anexar_fotos
 
 # --- Funções auxiliares para verificação de permissões ---
 def is_gerente(user):
@@ -26,8 +33,15 @@ def login_gerente(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
 
+        # Rejeita as rajadas de tentativas antes de calcular o hash da password.
+        espera = throttling.tempo_de_espera(request, username)
+        if espera:
+            messages.error(request, f'Demasiadas tentativas de login. Tente novamente dentro de {espera} segundos.')
+            return render(request, 'gerente/login_gerente.html', status=429)
+
         # 1. Autenticar o utilizador com as credenciais fornecidas
         user = authenticate(request, username=username, password=password)
+        throttling.registar_resultado(request, username, sucesso=user is not None)
 
         if user is not None:
             # 2. Verificar se o utilizador pertence ao grupo 'Gerente'
@@ -65,6 +79,7 @@ def dashboard_gerente(request):
 
 
 @user_passes_test(is_gerente, login_url='login_gerente')
+@leitura_em_replica
 def ver_casas(request):
     """
     Exibe uma lista de casas pertencentes ao Gerente logado.
@@ -74,7 +89,9 @@ def ver_casas(request):
         gerente = request.user.gerente
         
         # Filtra as casas que pertencem aos prédios do gerente.
-        casas = Casa.objects.filter(predio__gerente=gerente).order_by('predio__nome', 'numero')
+        casas = remocao.visiveis(
+            Casa.objects.filter(predio__gerente=gerente), casa='pk', predio='predio'
+        ).order_by('predio__nome', 'numero')
         
     except Gerente.DoesNotExist:
         # Caso o usuário logado não tenha um perfil de Gerente.
@@ -93,7 +110,7 @@ def adicionar_casa(request):
     sem a opção de atribuir um inquilino.
     """
     gerente = request.user.gerente
-    predios_do_gerente = Predio.objects.filter(gerente=gerente)
+    predios_do_gerente = remocao.visiveis(Predio.objects.filter(gerente=gerente), predio='pk')
 
     if request.method == 'POST':
         numero = request.POST.get('numero')
@@ -129,7 +146,7 @@ def editar_casa(request, casa_id):
     gerente = request.user.gerente
     casa = get_object_or_404(Casa, id=casa_id, predio__gerente=gerente)
     
-    predios_do_gerente = Predio.objects.filter(gerente=gerente)
+    predios_do_gerente = remocao.visiveis(Predio.objects.filter(gerente=gerente), predio='pk')
 
     if request.method == 'POST':
         numero = request.POST.get('numero')
@@ -161,13 +178,15 @@ def editar_casa(request, casa_id):
 def excluir_casa(request, casa_id):
     """
     Exclui uma casa do Gerente logado sem uma página de confirmação.
-    A exclusão só é processada se a requisição for POST.
+    A exclusão só é processada se a requisição for POST. A casa sai logo da
+    lista; os contratos, pagamentos e manutenções são apagados em segundo
+    plano (ver projecto_condominio/remocao.py).
     """
     gerente = request.user.gerente
     casa = get_object_or_404(Casa, id=casa_id, predio__gerente=gerente)
 
     if request.method == 'POST':
-        casa.delete()
+        remocao.agendar('casa', casa, request.user)
         messages.success(request, f'Casa {casa.numero} excluída com sucesso!')
     else:
         messages.error(request, 'Método de requisição inválido para exclusão.')
@@ -176,12 +195,13 @@ def excluir_casa(request, casa_id):
 
 
 @user_passes_test(is_gerente, login_url='login_gerente')
+@leitura_em_replica
 def ver_inquilinos(request):
     try:
         gerente = request.user.gerente
         
         # Agora o filtro é direto: mostre apenas os inquilinos registrados por este gerente.
-        inquilinos = Inquilino.objects.filter(gerente=gerente)
+        inquilinos = Inquilino.objects.filter(gerente=gerente).exclude(pk__in=remocao.ocultos('inquilino'))
     except Gerente.DoesNotExist:
         inquilinos = []
     
@@ -283,8 +303,8 @@ def excluir_inquilino(request, inquilino_id):
 
     if request.method == 'POST':
         try:
-            # A exclusão do User fará o Inquilino ser excluído em cascata.
-            inquilino_perfil.user.delete()
+            # O inquilino, os seus contratos e o User são apagados em segundo plano.
+            remocao.agendar('inquilino', inquilino_perfil, request.user)
             messages.success(request, f'Inquilino {inquilino_perfil.user.username} excluído com sucesso!')
         except Exception:
             messages.error(request, 'Erro ao deletar o inquilino.')
@@ -295,17 +315,34 @@ def excluir_inquilino(request, inquilino_id):
 
 
 @user_passes_test(is_gerente, login_url='login_gerente')
+@leitura_em_replica
 def ver_manutencoes(request):
     gerente = request.user.gerente
     
     # Busca todas as manutenções relacionadas a um prédio do gerente,
-    # tanto as específicas (com casa) quanto as gerais (com prédio)
-    manutencoes = Manutencao.objects.filter(
-        Q(casa__predio__gerente=gerente) | Q(predio__gerente=gerente)
-    ).order_by('-data_solicitacao')
-    
+    # tanto as específicas (com casa) quanto as gerais (com prédio).
+    # Manutencao.gerente já guarda o gerente do prédio: uma só consulta no índice.
+    manutencoes = Manutencao.objects.filter(gerente=gerente).order_by('-data_solicitacao').select_related(
+        'casa', 'predio', 'solicitado_por_inquilino__user'
+    )
+    # As de um prédio ou de uma casa com remoção pendente já não aparecem.
+    manutencoes = remocao.visiveis(manutencoes, predio='predio', casa='casa')
+
+    # O histórico arquivado só é lido quando o gerente o pede.
+    historico = request.GET.get('historico') == '1'
+    if historico:
+        arquivadas = remocao.visiveis(ManutencaoArquivo.objects.filter(gerente=gerente).select_related(
+            'casa', 'predio', 'solicitado_por_inquilino__user'
+        ), predio='predio', casa='casa')
+        manutencoes = sorted(
+            [*manutencoes, *arquivadas], key=lambda m: m.data_solicitacao, reverse=True
+        )
+    # Só as miniaturas entram na página; o original é pedido ao clicar.
+    manutencoes = anexar_fotos(manutencoes)
+
     context = {
-        'manutencoes': manutencoes
+        'manutencoes': manutencoes,
+        'historico': historico,
     }
     return render(request, 'gerente/ver_manutencoes.html', context)
 
@@ -314,12 +351,14 @@ def atualizar_estado_manutencao(request, manutencao_id):
     """
     Permite ao Gerente atualizar o estado de uma solicitação de manutenção.
     """
-    manutencao = get_object_or_404(Manutencao, id=manutencao_id, casa__predio__gerente=request.user.gerente)
+    # Inclui as manutenções gerais do prédio, e não só as das casas.
+    manutencao = get_object_or_404(Manutencao, id=manutencao_id, gerente=request.user.gerente)
     
     if request.method == 'POST':
         novo_estado = request.POST.get('estado')
         if novo_estado and novo_estado in [choice[0] for choice in Manutencao.ESTADO_CHOICES]:
             manutencao.estado = novo_estado
+            manutencao._alterado_por = request.user
             manutencao.save()
             messages.success(request, f'Estado da manutenção "{manutencao.descricao[:20]}..." atualizado para "{manutencao.get_estado_display()}".')
         else:
@@ -333,8 +372,8 @@ def adicionar_manutencao(request):
     Permite ao gerente adicionar uma nova solicitação de manutenção.
     """
     gerente = request.user.gerente
-    predios = Predio.objects.filter(gerente=gerente)
-    casas = Casa.objects.filter(predio__gerente=gerente)
+    predios = remocao.visiveis(Predio.objects.filter(gerente=gerente), predio='pk')
+    casas = remocao.visiveis(Casa.objects.filter(predio__gerente=gerente), casa='pk', predio='predio')
     tipo_choices = Manutencao.TIPO_CHOICES
     
     if request.method == 'POST':
@@ -376,6 +415,42 @@ def adicionar_manutencao(request):
     }
     return render(request, 'gerente/adicionar_manutencao.html', context)
 
+def _apagar_manutencao(manutencao):
+    # As fotos não são apagadas em cascata (sobrevivem ao arquivo), por isso saem aqui.
+    with transaction.atomic():
+        FotoManutencao.objects.filter(manutencao_id=manutencao.id).delete()
+        manutencao.delete()
+
+
+@login_required(login_url='home')
+def foto_manutencao(request, pk, variante):
+    """
+    Serve uma foto de manutenção (original, 'media' ou 'mini') ao gerente
+    responsável ou ao inquilino que fez o pedido. Os ficheiros não mudam
+    (o nome é o hash do conteúdo), por isso o browser pode guardá-los.
+    """
+    foto = get_object_or_404(FotoManutencao, pk=pk)
+    manutencao = (
+        Manutencao.objects.filter(pk=foto.manutencao_id).first()
+        or ManutencaoArquivo.objects.filter(pk=foto.manutencao_id).first()
+    )
+    gerente = getattr(request.user, 'gerente', None)
+    inquilino = getattr(request.user, 'inquilino', None)
+    autorizado = manutencao is not None and (
+        (gerente is not None and manutencao.gerente_id == gerente.id)
+        or (inquilino is not None and manutencao.solicitado_por_inquilino_id == inquilino.id)
+    )
+    if not autorizado:
+        raise Http404
+
+    if variante in fotos.VARIANTES and foto.variantes_prontas:
+        caminho, content_type = fotos.caminho(foto, variante), 'image/jpeg'
+    else:
+        caminho, content_type = fotos.caminho(foto), f'image/{"jpeg" if foto.extensao == "jpg" else foto.extensao}'
+    resposta = FileResponse(open(caminho, 'rb'), content_type=content_type)
+    resposta['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return resposta
+
 # Adicione esta nova função de exclusão
 @user_passes_test(is_gerente, login_url='login_gerente')
 def excluir_manutencao(request, manutencao_id):
@@ -385,12 +460,12 @@ def excluir_manutencao(request, manutencao_id):
         # Verifique se o gerente tem permissão para excluir esta manutenção
         try:
             # Caso 1: Manutenção de uma casa de um prédio do gerente
-            if manutencao.casa and manutencao.casa.predio.gerente == request.user.gerente:
-                manutencao.delete()
+            if manutencao.casa_id and manutencao.gerente_id == request.user.gerente.id:
+                _apagar_manutencao(manutencao)
                 messages.success(request, 'Manutenção excluída com sucesso!')
             # Caso 2: Manutenção geral solicitada pelo próprio gerente
-            elif not manutencao.casa and manutencao.solicitado_por_gerente == request.user.gerente:
-                manutencao.delete()
+            elif not manutencao.casa_id and manutencao.solicitado_por_gerente_id == request.user.gerente.id:
+                _apagar_manutencao(manutencao)
                 messages.success(request, 'Manutenção geral excluída com sucesso!')
             else:
                 messages.error(request, 'Você não tem permissão para excluir esta manutenção.')
@@ -401,6 +476,7 @@ def excluir_manutencao(request, manutencao_id):
     return redirect('ver_manutencoes')
 
 @user_passes_test(is_gerente, login_url='login_gerente')
+@leitura_em_replica
 def ver_contratos(request):
     """
     Exibe uma lista de contratos associados aos prédios do Gerente logado.
@@ -411,26 +487,23 @@ def ver_contratos(request):
         contratos = Contratos.objects.filter(
             inquilino__casas_alugadas__predio__gerente=gerente
         ).distinct().select_related('inquilino__user').prefetch_related('inquilino__casas_alugadas__predio')
-
-        hoje = date.today()
-        for contrato in contratos:
+        # Os de uma casa, de um prédio ou de um inquilino com remoção pendente já não aparecem.
+        contratos = remocao.visiveis(contratos, casa='casa', predio='casa__predio', inquilino='inquilino')
+
+        contratos = list(contratos)
+        # Cálculo da duração restante (gerente/contratos.py), de uma vez para a lista.
+        restantes = tempos_restantes(
+            [c.data_fim or Contratos.calcular_data_fim(c.data_inicio, c.duracao_meses) for c in contratos],
+            date.today(),
+        )
+        for contrato, restante in zip(contratos, restantes):
             # Duração total em meses
             contrato.duracao_total = f'{contrato.duracao_meses} meses'
-            
-            # Data de término do contrato
-            data_termino = contrato.data_inicio + relativedelta(months=+contrato.duracao_meses)
-            
-            # Cálculo da duração restante
-            delta = relativedelta(data_termino, hoje)
-            
-            if delta.years > 0:
-                contrato.duracao_restante = f'{delta.years} anos e {delta.months} meses'
-            elif delta.months > 0:
-                contrato.duracao_restante = f'{delta.months} meses'
-            elif delta.days > 0:
-                contrato.duracao_restante = f'{delta.days} dias'
+
+            if contrato.estado != 'ativo':
+                contrato.duracao_restante = contrato.get_estado_display()
             else:
-                contrato.duracao_restante = 'Expirado'
+                contrato.duracao_restante = descrever_tempo_restante(*restante)
 
     except Exception as e:
         # Lida com erros de forma graciosa
@@ -447,18 +520,10 @@ def ver_contratos(request):
 @user_passes_test(is_gerente, login_url='login_gerente')
 def adicionar_contrato(request):
     gerente = request.user.gerente
-    
-    # 1. Obtenha os inquilinos que pertencem a este gerente e que não têm um contrato ativo.
-    inquilinos_disponiveis = Inquilino.objects.filter(gerente=gerente).exclude(
-        contratos__isnull=False
-    ).distinct()
-
-    # 2. Obtenha as casas vagas que pertencem a este gerente.
-    casas_vagas = Casa.objects.filter(
-        predio__gerente=gerente, 
-        inquilino__isnull=True
-    ).distinct()
-    
+
+    # As casas vagas e os inquilinos disponíveis já não são enviados no
+    # formulário: são procurados à medida que se escreve (ver procurar_casas
+    # e procurar_inquilinos).
     anos_de_contrato = [(i, f"{i} ano{'s' if i > 1 else ''}") for i in range(1, 6)]
 
     if request.method == 'POST':
@@ -472,28 +537,32 @@ def adicionar_contrato(request):
             return redirect('adicionar_contrato')
 
         try:
-            # 3. Validação de acesso: Garante que o inquilino e a casa pertencem ao gerente.
+            # Validação de acesso: garante que o inquilino e a casa pertencem ao gerente.
             inquilino = get_object_or_404(Inquilino, id=inquilino_id, gerente=gerente)
             casa = get_object_or_404(Casa, id=casa_id, predio__gerente=gerente)
-            
+
+            if not inquilino.disponivel:
+                messages.error(request, 'Este inquilino já tem um contrato ativo.')
+                return redirect('adicionar_contrato')
+            if casa.inquilino_id is not None:
+                messages.error(request, 'Esta casa já não está vaga.')
+                return redirect('adicionar_contrato')
+
+            if not duracao_anos.isdigit() or int(duracao_anos) < 1:
+                messages.error(request, 'A duração do contrato tem de ser de pelo menos um ano.')
+                return redirect('adicionar_contrato')
             duracao_meses = int(duracao_anos) * 12
             valor_renda = float(valor_renda.replace(',', '.'))
 
-            with transaction.atomic():
-                contrato = Contratos.objects.create(
-                    inquilino=inquilino,
-                    casa=casa, 
-                    data_inicio=date.today(),
-                    valor_renda=valor_renda,
-                    duracao_meses=duracao_meses
-                )
-                
-                casa.inquilino = inquilino
-                casa.save()
+            # UPDATE condicional da casa, com nova tentativa se ela mudou entretanto.
+            criar_contrato(inquilino, casa, duracao_meses, valor_renda, date.today())
 
             messages.success(request, f'Contrato para {inquilino.user.username} criado com sucesso e casa atribuída.')
             return redirect('ver_contratos')
-            
+
+        except Indisponivel as e:
+            messages.error(request, str(e))
+            return redirect('adicionar_contrato')
         except (ValueError, TypeError):
             messages.error(request, 'O valor da renda é inválido.')
             return redirect('adicionar_contrato')
@@ -502,8 +571,6 @@ def adicionar_contrato(request):
             return redirect('adicionar_contrato')
 
     context = {
-        'inquilinos_disponiveis': inquilinos_disponiveis,
-        'casas_vagas': casas_vagas,
         'anos_de_contrato': anos_de_contrato,
     }
     return render(request, 'gerente/adicionar_contrato.html', context)
@@ -517,20 +584,6 @@ def editar_contrato(request, pk):
     
     casa_atual = contrato.casa
 
-    # 1. Filtra as casas vagas para o gerente logado, e inclui a casa atual do contrato.
-    casas_vagas_qs = Casa.objects.filter(
-        Q(predio__gerente=gerente, inquilino__isnull=True) | Q(id=casa_atual.id)
-    ).distinct()
-    
-    # 2. Filtra os inquilinos que pertencem a este gerente.
-    # Exclui inquilinos que já têm um contrato ativo, mas inclui o inquilino atual do contrato.
-    inquilinos_disponiveis = Inquilino.objects.filter(gerente=gerente).exclude(
-        contratos__isnull=False
-    ).distinct()
-
-    # Adiciona o inquilino atual do contrato à lista de disponíveis.
-    inquilinos_disponiveis = list(inquilinos_disponiveis) + [contrato.inquilino]
-
     anos_de_contrato = [(i, f"{i} ano{'s' if i > 1 else ''}") for i in range(1, 6)]
     
     # Prepara o valor da duração em anos para o template
@@ -547,33 +600,33 @@ def editar_contrato(request, pk):
             return redirect('editar_contrato', pk=pk)
 
         try:
-            # 3. Validação de segurança: Garante que o novo inquilino e a nova casa pertencem ao gerente.
+            # Validação de segurança: garante que o novo inquilino e a nova casa pertencem ao gerente.
             novo_inquilino = get_object_or_404(Inquilino, id=novo_inquilino_id, gerente=gerente)
             nova_casa = get_object_or_404(Casa, id=nova_casa_id, predio__gerente=gerente)
-            
+
+            # O inquilino e a casa atuais continuam válidos; os outros têm de estar livres.
+            if novo_inquilino.id != contrato.inquilino_id and not novo_inquilino.disponivel:
+                messages.error(request, 'Este inquilino já tem um contrato ativo.')
+                return redirect('editar_contrato', pk=pk)
+            if nova_casa.id != contrato.casa_id and nova_casa.inquilino_id is not None:
+                messages.error(request, 'Esta casa já não está vaga.')
+                return redirect('editar_contrato', pk=pk)
+
+            if not nova_duracao_anos.isdigit() or int(nova_duracao_anos) < 1:
+                messages.error(request, 'A duração do contrato tem de ser de pelo menos um ano.')
+                return redirect('editar_contrato', pk=pk)
             nova_duracao_meses = int(nova_duracao_anos) * 12
             novo_valor_renda = float(novo_valor_renda.replace(',', '.'))
 
-            with transaction.atomic():
-                # Liberta a casa anterior se ela for diferente da nova
-                if casa_atual and casa_atual.id != nova_casa.id:
-                    casa_atual.inquilino = None
-                    casa_atual.save()
-
-                # Atribui a nova casa ao novo inquilino
-                nova_casa.inquilino = novo_inquilino
-                nova_casa.save()
-
-                # Atualiza os dados do contrato
-                contrato.inquilino = novo_inquilino
-                contrato.casa = nova_casa
-                contrato.duracao_meses = nova_duracao_meses
-                contrato.valor_renda = novo_valor_renda
-                contrato.save()
+            # Liberta a casa anterior (se mudou) e atribui a nova com UPDATEs condicionais.
+            alterar_contrato(contrato, novo_inquilino, nova_casa, nova_duracao_meses, novo_valor_renda)
 
             messages.success(request, 'Contrato atualizado com sucesso.')
             return redirect('ver_contratos')
-        
+
+        except Indisponivel as e:
+            messages.error(request, str(e))
+            return redirect('editar_contrato', pk=pk)
         except (ValueError, TypeError):
             messages.error(request, 'O valor da renda é inválido.')
             return redirect('editar_contrato', pk=pk)
@@ -583,14 +636,73 @@ def editar_contrato(request, pk):
 
     context = {
         'contrato': contrato,
-        'inquilinos_disponiveis': inquilinos_disponiveis,
-        'casas_vagas': casas_vagas_qs,
         'anos_de_contrato': anos_de_contrato,
         'contrato_duracao_anos': contrato_duracao_anos,
         'casa_atual': casa_atual
     }
     return render(request, 'gerente/editar_contrato.html', context)
 
+@user_passes_test(is_gerente, login_url='login_gerente')
+def reajustar_rendas(request):
+    """
+    Reajuste das rendas de todos os contratos ativos do gerente (ou só de um
+    prédio) a partir de um mês. "Simular" mostra o impacto; "Aplicar"
+    atualiza os contratos e as rendas por pagar (ver gerente/reajuste.py).
+    """
+    gerente = request.user.gerente
+    predios = remocao.visiveis(Predio.objects.filter(gerente=gerente), predio='pk').order_by('nome')
+    dados = {'tipo': reajuste.PERCENTAGEM, 'montante': '', 'mes': '', 'predio': ''}
+    impacto = None
+
+    if request.method == 'POST':
+        dados = {campo: request.POST.get(campo, '').strip() for campo in dados}
+        try:
+            montante = Decimal(dados['montante'].replace(',', '.'))
+            mes = date.fromisoformat(f"{dados['mes']}-01")
+            if dados['tipo'] not in (reajuste.PERCENTAGEM, reajuste.VALOR):
+                raise ValueError
+        except (InvalidOperation, ValueError):
+            messages.error(request, 'Indique o tipo, o montante e o mês do reajuste.')
+            return redirect('reajustar_rendas')
+
+        if dados['predio']:
+            ambito = {'predio_id': get_object_or_404(Predio, id=dados['predio'], gerente=gerente).id}
+        else:
+            ambito = {'gerente_id': gerente.id}
+
+        if request.POST.get('acao') == 'aplicar':
+            contratos, prestacoes = reajuste.reajustar(dados['tipo'], montante, mes, **ambito)
+            messages.success(request, f'Rendas reajustadas: {contratos} contratos e {prestacoes} rendas por pagar.')
+            return redirect('ver_contratos')
+        impacto = reajuste.simular(dados['tipo'], montante, mes, **ambito)
+
+    context = {
+        'predios': predios,
+        'tipos': reajuste.TIPOS,
+        'dados': dados,
+        'impacto': impacto,
+    }
+    return render(request, 'gerente/reajustar_rendas.html', context)
+
+
+@user_passes_test(is_gerente, login_url='login_gerente')
+def procurar_casas(request):
+    """
+    Sugestões de casas vagas (JSON) para os formulários de contratos.
+    """
+    termo = request.GET.get('q', '').strip()
+    return JsonResponse({'resultados': procurar_casas_vagas(request.user.gerente, termo)})
+
+
+@user_passes_test(is_gerente, login_url='login_gerente')
+def procurar_inquilinos(request):
+    """
+    Sugestões de inquilinos sem contrato ativo (JSON) para os formulários de contratos.
+    """
+    termo = request.GET.get('q', '').strip()
+    return JsonResponse({'resultados': procurar_inquilinos_disponiveis(request.user.gerente, termo)})
+
+
 @user_passes_test(is_gerente, login_url='login_gerente')
 def excluir_contrato(request, pk):
     contrato = get_object_or_404(Contratos, pk=pk)
@@ -599,17 +711,8 @@ def excluir_contrato(request, pk):
     # para evitar exclusões acidentais.
     if request.method == 'POST':
         try:
-            with transaction.atomic():
-                # Encontra a casa associada ao inquilino do contrato
-                casa_associada = contrato.inquilino.casas_alugadas.first()
-                
-                # Se houver uma casa, a libera
-                if casa_associada:
-                    casa_associada.inquilino = None
-                    casa_associada.save()
-
-                # Exclui o contrato
-                contrato.delete()
+            # Liberta a casa do contrato (se ainda for do inquilino) e exclui o contrato
+            apagar_contrato(contrato)
 
             messages.success(request, 'Contrato excluído com sucesso e casa liberada.')
             return redirect('ver_contratos')
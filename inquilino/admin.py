@@ -1,3 +1,32 @@
 from django.contrib import admin
 
-# Register your models here.
+from projecto_condominio.admin import AdminEscalavel
+from .models import Notificacao, PagamentoRenda, PagamentoRendaArquivo
+
+
+@admin.register(PagamentoRenda)
+class PagamentoRendaAdmin(AdminEscalavel):
+    list_display = ('referencia', 'contrato', 'mes_referencia', 'valor', 'estado')
+    # O __str__ do contrato usa o utilizador do inquilino e a casa.
+    list_select_related = ('contrato__inquilino__user', 'contrato__casa')
+    list_filter = ('estado',)
+    date_hierarchy = 'mes_referencia'
+    search_fields = ('=referencia',)
+    raw_id_fields = ('contrato',)
+
+
+@admin.register(PagamentoRendaArquivo)
+class PagamentoRendaArquivoAdmin(AdminEscalavel):
+    list_display = ('referencia', 'contrato', 'mes_referencia', 'valor', 'estado', 'data_arquivo')
+    list_select_related = ('contrato__inquilino__user', 'contrato__casa')
+    date_hierarchy = 'mes_referencia'
+    search_fields = ('=id', '=referencia')
+    raw_id_fields = ('contrato',)
+
+
+@admin.register(Notificacao)
+class NotificacaoAdmin(AdminEscalavel):
+    list_display = ('destinatario', 'tipo', 'texto', 'criada_em', 'enviada_em')
+    list_select_related = ('destinatario',)
+    list_filter = ('tipo',)
+    raw_id_fields = ('destinatario',)
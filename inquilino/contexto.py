@@ -0,0 +1,172 @@
+"""
+Contexto do inquilino autenticado: o inquilino, a sua casa (com o prédio) e o
+contrato ativo, lidos com uma única consulta (LEFT JOIN às casas e aos
+contratos ativos) só quando uma view os usa.
+
+ContextoInquilinoMiddleware põe em request.contexto_inquilino um objeto
+preguiçoso (como o request.user): a consulta corre no primeiro acesso e o
+resultado fica memorizado até ao fim do pedido.
+
+Entre pedidos, o contexto fica também na cache, guardado com a versão dos
+dados do inquilino. A versão muda sempre que o inquilino, a sua casa, o prédio
+ou os seus contratos são gravados (ver inquilino/signals.py); quem altera
+esses dados com update() ou bulk_create() chama
+invalidar_contextos_de_inquilinos. Um contexto guardado com uma versão
+antiga é ignorado e volta a ser lido.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import FilteredRelation, Q
+from django.utils.functional import SimpleLazyObject
+
+from gerente.models import Inquilino
+
+# Tempo (segundos) que o contexto fica na cache; 0 desliga a cache entre pedidos.
+TIMEOUT = 60 * 60
+
+
+def _chave_contexto(user_id):
+    return f'inquilino:contexto:{user_id}'
+
+
+def _chave_versao(user_id):
+    return f'inquilino:contexto:versao:{user_id}'
+
+
+class ContextoInquilino:
+    """
+    O inquilino de um utilizador, a casa que ocupa (ou None), o respetivo
+    prédio e o contrato ativo (ou None), já ligados entre si.
+    """
+
+    def __init__(self, user, inquilino, casa, contrato):
+        inquilino.user = user
+        if casa is not None:
+            casa.inquilino = inquilino
+        if contrato is not None:
+            contrato.inquilino = inquilino
+            if casa is not None and contrato.casa_id == casa.id:
+                contrato.casa = casa
+        self.user = user
+        self.inquilino = inquilino
+        self.casa = casa
+        self.contrato = contrato
+
+    @property
+    def predio(self):
+        return self.casa.predio if self.casa is not None else None
+
+
+def _consultar(alias, user):
+    inquilino = (
+        Inquilino.objects.using(alias)
+        .filter(user_id=user.pk)
+        .annotate(
+            casa_atual=FilteredRelation('casas_alugadas'),
+            contrato_ativo=FilteredRelation('contratos', condition=Q(contratos__estado='ativo')),
+        )
+        .select_related('casa_atual__predio', 'contrato_ativo')
+        # Se houver mais de uma linha, fica o contrato ativo mais recente.
+        .order_by('-contrato_ativo__data_inicio', 'casa_atual__id')
+        .first()
+    )
+    if inquilino is None:
+        raise Inquilino.DoesNotExist('O utilizador não tem um perfil de inquilino.')
+    # Sem casa ou sem contrato ativo (LEFT JOIN sem linha), o Django não
+    # chega a definir o atributo da FilteredRelation.
+    casa, contrato = getattr(inquilino, 'casa_atual', None), getattr(inquilino, 'contrato_ativo', None)
+    if casa is not None or contrato is not None:
+        casa, contrato = _sem_remocoes_pendentes(alias, casa, contrato)
+    return inquilino, casa, contrato
+
+
+def _sem_remocoes_pendentes(alias, casa, contrato):
+    """
+    Uma casa com remoção pendente, ou num prédio com remoção pendente, deixa
+    de aparecer (como nas listagens), e o contrato dessa casa também.
+    """
+    # O remocao importa este módulo.
+    from projecto_condominio import remocao
+
+    ocultas = set(remocao.ocultos('casa', alias))
+    if casa is not None and (casa.id in ocultas or casa.predio_id in remocao.ocultos('predio', alias)):
+        ocultas.add(casa.id)
+        casa = None
+    if contrato is not None and contrato.casa_id in ocultas:
+        contrato = None
+    return casa, contrato
+
+
+def carregar(user):
+    """
+    Contexto do utilizador, da cache se a versão guardada ainda for a atual,
+    senão da base de dados principal (nunca da réplica, para não guardar na
+    cache dados atrasados). Levanta Inquilino.DoesNotExist se o utilizador
+    não for inquilino.
+    """
+    # Com shards, a base do inquilino é a escolhida pelo ShardMiddleware.
+    alias = router.db_for_write(Inquilino) or 'default'
+    timeout = getattr(settings, 'CONTEXTO_INQUILINO_TIMEOUT', TIMEOUT)
+    if not timeout:
+        return ContextoInquilino(user, *_consultar(alias, user))
+
+    chave, chave_versao = _chave_contexto(user.pk), _chave_versao(user.pk)
+    lidos = cache.get_many([chave, chave_versao])
+    guardado, versao = lidos.get(chave), lidos.get(chave_versao)
+    if guardado is not None and versao is not None and (guardado['alias'], guardado['versao']) == (alias, versao):
+        return ContextoInquilino(user, guardado['inquilino'], guardado['casa'], guardado['contrato'])
+
+    # A versão é fixada antes da consulta: se os dados mudarem entretanto, a
+    # versão muda e o contexto guardado a seguir já não chega a ser usado.
+    if versao is None:
+        versao = time.time_ns()
+        if not cache.add(chave_versao, versao, timeout=None):
+            versao = cache.get(chave_versao)
+    inquilino, casa, contrato = _consultar(alias, user)
+    cache.set(
+        chave,
+        {'alias': alias, 'versao': versao, 'inquilino': inquilino, 'casa': casa, 'contrato': contrato},
+        timeout=timeout,
+    )
+    return ContextoInquilino(user, inquilino, casa, contrato)
+
+
+def invalidar_contextos(user_ids, using='default'):
+    """
+    Muda a versão dos dados dos utilizadores indicados, no fim da transação
+    atual da base `using` (se houver).
+    """
+    chaves = [_chave_versao(i) for i in set(user_ids) if i is not None]
+    if not chaves:
+        return
+    transaction.on_commit(
+        lambda: cache.set_many({chave: time.time_ns() for chave in chaves}, timeout=None), using=using
+    )
+
+
+def invalidar_contextos_de_inquilinos(inquilino_ids, using='default'):
+    """
+    invalidar_contextos para os utilizadores dos inquilinos indicados.
+    """
+    ids = {i for i in inquilino_ids if i is not None}
+    if ids:
+        user_ids = Inquilino.objects.using(using).filter(id__in=ids).values_list('user_id', flat=True)
+        invalidar_contextos(list(user_ids), using=using)
+
+
+class ContextoInquilinoMiddleware:
+    """
+    Acrescenta request.contexto_inquilino (preguiçoso e memorizado por
+    pedido). Tem de vir depois do AuthenticationMiddleware e do
+    ShardMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.contexto_inquilino = SimpleLazyObject(lambda: carregar(request.user))
+        return self.get_response(request)
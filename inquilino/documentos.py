@@ -0,0 +1,251 @@
+"""
+Recibos de renda e declarações anuais em PDF.
+
+O texto de cada documento vem de um template (templates/inquilino/documentos)
+e é convertido num PDF simples (texto em Courier, sem dependências
+externas) num conjunto de processos, para que a geração não ocupe os workers
+do servidor web.
+
+Os ficheiros ficam numa cache em disco (settings.DOCUMENTOS_DIR) endereçada
+pelo conteúdo: o nome é o SHA-256 do texto renderizado, que inclui o estado
+dos pagamentos. Um recibo já gerado é servido diretamente do disco; se o
+pagamento mudar, o texto muda e é gerado um ficheiro novo.
+
+Um pedido nunca espera pela geração: obter() devolve None enquanto o PDF
+não está pronto e a view responde 202 com uma página que volta a pedir o
+documento. Como cada alteração gera um ficheiro novo, a cache é limitada a
+settings.DOCUMENTOS_LIMITE bytes: limpar() apaga os ficheiros usados há mais
+tempo (a data de modificação é atualizada sempre que um ficheiro é servido).
+"""
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from functools import partial
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .models import PagamentoRenda, PagamentoRendaArquivo
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Documentos a ser gerados por este processo (caminho -> futuro), para que
+# pedidos repetidos enquanto se espera não submetam o mesmo trabalho.
+_em_curso = {}
+_em_curso_lock = threading.Lock()
+
+# Tamanho máximo da cache em disco, por omissão (ver settings.DOCUMENTOS_LIMITE).
+LIMITE = 500 * 1024 * 1024
+# Intervalo mínimo (segundos) entre limpezas da cache feitas por um processo.
+INTERVALO_LIMPEZA = 5 * 60
+# Temporários de gravações interrompidas com mais do que isto (segundos) são apagados.
+IDADE_TEMPORARIOS = 60 * 60
+_ultima_limpeza = 0.0
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=getattr(settings, 'DOCUMENTOS_WORKERS', None))
+        return _executor
+
+
+# --- Geração do PDF (corre nos processos do pool) ---
+
+LINHAS_POR_PAGINA = 60
+
+
+def _texto_pdf(texto):
+    # WinAnsiEncoding (cp1252) cobre os acentos do português.
+    dados = texto.encode('cp1252', errors='replace')
+    return dados.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def texto_para_pdf(linhas):
+    """
+    Constrói um PDF A4 com as linhas de texto dadas (Courier 10pt, para alinhar colunas).
+    """
+    paginas = [linhas[i:i + LINHAS_POR_PAGINA] for i in range(0, len(linhas), LINHAS_POR_PAGINA)] or [[]]
+    # Objetos: 1 catálogo, 2 árvore de páginas, 3 fonte, depois página e conteúdo de cada página.
+    objetos = {3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>'}
+    kids = []
+    for n, pagina in enumerate(paginas):
+        num_pagina, num_conteudo = 4 + 2 * n, 5 + 2 * n
+        fluxo = b'BT /F1 10 Tf 12 TL 50 800 Td\n' + b''.join(
+            b'(' + _texto_pdf(linha) + b") '\n" for linha in pagina
+        ) + b'ET'
+        objetos[num_conteudo] = b'<< /Length %d >>\nstream\n%s\nendstream' % (len(fluxo), fluxo)
+        objetos[num_pagina] = (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % num_conteudo
+        )
+        kids.append(b'%d 0 R' % num_pagina)
+    objetos[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objetos[2] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids))
+
+    saida = bytearray(b'%PDF-1.4\n')
+    posicoes = {}
+    for num in sorted(objetos):
+        posicoes[num] = len(saida)
+        saida += b'%d 0 obj\n%s\nendobj\n' % (num, objetos[num])
+    inicio_xref = len(saida)
+    saida += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+    for num in sorted(objetos):
+        saida += b'%010d 00000 n \n' % posicoes[num]
+    saida += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objetos) + 1, inicio_xref)
+    return bytes(saida)
+
+
+def gravar_pdf(caminho, texto):
+    """
+    Gera o PDF e grava-o de forma atómica (ficheiro temporário + rename),
+    para que um pedido concorrente nunca sirva um ficheiro incompleto.
+    """
+    if os.path.exists(caminho):
+        return caminho
+    diretorio = os.path.dirname(caminho)
+    os.makedirs(diretorio, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as ficheiro:
+        ficheiro.write(texto_para_pdf(texto.splitlines()))
+    os.replace(temporario, caminho)
+    return caminho
+
+
+# --- Documentos ---
+
+class Documento:
+    """
+    Texto renderizado de um documento e o ficheiro correspondente na cache.
+    """
+
+    def __init__(self, template, contexto, nome):
+        self.texto = render_to_string(template, contexto)
+        self.nome = nome
+        chave = hashlib.sha256(self.texto.encode()).hexdigest()
+        self.caminho = os.path.join(settings.DOCUMENTOS_DIR, chave[:2], f'{chave}.pdf')
+
+    def existe(self):
+        return os.path.exists(self.caminho)
+
+    def submeter(self, executor=None):
+        return (executor or _pool()).submit(gravar_pdf, self.caminho, self.texto)
+
+
+def recibo(pagamento):
+    return Documento(
+        'inquilino/documentos/recibo.txt',
+        {'pagamento': pagamento, 'contrato': pagamento.contrato},
+        f'recibo-{pagamento.referencia}.pdf',
+    )
+
+
+def declaracao_anual(inquilino, ano):
+    """
+    Declaração das rendas pagas pelo inquilino num ano, incluindo as já
+    arquivadas.
+    """
+    filtro = {'contrato__inquilino': inquilino, 'estado': 'pago', 'mes_referencia__year': ano}
+    pagamentos = sorted(
+        [
+            *PagamentoRenda.objects.filter(**filtro).select_related('contrato__casa__predio'),
+            *PagamentoRendaArquivo.objects.filter(**filtro).select_related('contrato__casa__predio'),
+        ],
+        key=lambda p: (p.mes_referencia, p.id),
+    )
+    total = sum((p.valor for p in pagamentos), Decimal('0'))
+    return Documento(
+        'inquilino/documentos/declaracao_anual.txt',
+        {'inquilino': inquilino, 'ano': ano, 'pagamentos': pagamentos, 'total': total},
+        f'declaracao-{ano}-{inquilino.user.username}.pdf',
+    )
+
+
+def obter(documento):
+    """
+    Devolve o caminho do PDF se já estiver em cache. Senão, submete a
+    geração ao pool (uma só vez por documento) e devolve None sem esperar:
+    o pedido deve ser repetido mais tarde.
+    """
+    try:
+        # Marca o ficheiro como usado agora, para a limpeza da cache.
+        os.utime(documento.caminho)
+        return documento.caminho
+    except FileNotFoundError:
+        pass
+    with _em_curso_lock:
+        if documento.caminho not in _em_curso:
+            futuro = documento.submeter()
+            _em_curso[documento.caminho] = futuro
+            futuro.add_done_callback(partial(_gerado, documento.caminho))
+    return None
+
+
+def _gerado(caminho, futuro):
+    global _ultima_limpeza
+    with _em_curso_lock:
+        _em_curso.pop(caminho, None)
+    agora = time.monotonic()
+    if agora - _ultima_limpeza >= INTERVALO_LIMPEZA:
+        _ultima_limpeza = agora
+        limpar()
+
+
+def limpar(limite=None):
+    """
+    Apaga os PDF usados há mais tempo até a cache ocupar no máximo `limite`
+    bytes (por omissão settings.DOCUMENTOS_LIMITE), e os temporários
+    abandonados. Devolve (ficheiros apagados, bytes libertados).
+    """
+    if limite is None:
+        limite = getattr(settings, 'DOCUMENTOS_LIMITE', LIMITE)
+    ficheiros = []
+    apagados = libertados = 0
+    agora = time.time()
+    for raiz, _, nomes in os.walk(settings.DOCUMENTOS_DIR):
+        for nome in nomes:
+            caminho = os.path.join(raiz, nome)
+            try:
+                estado = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            if nome.endswith('.tmp'):
+                if agora - estado.st_mtime > IDADE_TEMPORARIOS and _apagar(caminho):
+                    apagados, libertados = apagados + 1, libertados + estado.st_size
+                continue
+            ficheiros.append((estado.st_mtime, estado.st_size, caminho))
+
+    total = sum(tamanho for _, tamanho, _ in ficheiros)
+    for _, tamanho, caminho in sorted(ficheiros):
+        if total <= limite:
+            break
+        if _apagar(caminho):
+            apagados, libertados = apagados + 1, libertados + tamanho
+        total -= tamanho
+    return apagados, libertados
+
+
+def _apagar(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def gerar_em_lote(documentos, workers=None):
+    """
+    Gera em paralelo os documentos que ainda não estão em cache. Devolve
+    (gerados, já existentes).
+    """
+    em_falta = [d for d in documentos if not d.existe()]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for futuro in [d.submeter(executor) for d in em_falta]:
+            futuro.result()
+    return len(em_falta), len(documentos) - len(em_falta)
@@ -0,0 +1,115 @@
+"""
+Extrato de conta corrente de um contrato: saldo acumulado, totais por ano e
+próximo vencimento, calculados no SQL.
+
+O saldo de cada mês é o total pago menos o total faturado até esse mês
+(negativo enquanto houver rendas por pagar), obtido com uma função de janela
+(SUM ... OVER) em vez de somas em Python. O resumo do contrato (totais e
+próximo vencimento) fica em cache e é invalidado sempre que um pagamento é
+gravado ou apagado (ver inquilino/signals.py) ou criado em massa.
+
+Os pagamentos já arquivados (PagamentoRendaArquivo, ver arquivar_historico)
+continuam a contar nos totais e no extrato, como na declaração anual.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Case, Count, DecimalField, F, Min, Q, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, ExtractYear
+
+from .models import PagamentoRenda, PagamentoRendaArquivo
+
+ZERO = Value(Decimal('0'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+# Valor pago em cada linha (0 nas rendas por pagar).
+VALOR_PAGO = Case(When(estado='pago', then=F('valor')), default=ZERO)
+
+
+def _chave_resumo(contrato_id):
+    return f'financas:resumo:{contrato_id}'
+
+
+def resumo(contrato, hoje=None):
+    """
+    Totais do contrato, por ano e globais, e o próximo vencimento. Fica em
+    cache até um pagamento do contrato mudar, ou até ao fim do dia (o valor
+    em dívida depende da data).
+    """
+    hoje = hoje or date.today()
+    chave = _chave_resumo(contrato.id)
+    guardado = cache.get(chave)
+    if guardado is not None and guardado['calculado_em'] == hoje:
+        return guardado
+
+    anos, totais = {}, None
+    for model in (PagamentoRenda, PagamentoRendaArquivo):
+        pagamentos = model.objects.filter(contrato=contrato)
+        for linha in (
+            pagamentos.annotate(ano=ExtractYear('mes_referencia'))
+            .values('ano')
+            .annotate(
+                faturado=Sum('valor'),
+                pago=Coalesce(Sum(VALOR_PAGO), ZERO),
+                meses=Count('id'),
+            )
+            .order_by()
+        ):
+            _somar(anos.setdefault(linha['ano'], {'ano': linha['ano']}), linha, ('faturado', 'pago', 'meses'))
+        parcial = pagamentos.aggregate(
+            faturado=Coalesce(Sum('valor'), ZERO),
+            pago=Coalesce(Sum(VALOR_PAGO), ZERO),
+            em_divida=Coalesce(Sum('valor', filter=Q(estado='nao_pago', mes_referencia__lte=hoje)), ZERO),
+            proximo_vencimento=Min('mes_referencia', filter=Q(estado='nao_pago')),
+        )
+        if totais is None:
+            totais = parcial
+        else:
+            _somar(totais, parcial, ('faturado', 'pago', 'em_divida'))
+            totais['proximo_vencimento'] = min(
+                filter(None, [totais['proximo_vencimento'], parcial['proximo_vencimento']]), default=None
+            )
+    anos = [anos[ano] for ano in sorted(anos)]
+    valor = {'calculado_em': hoje, 'anos': anos, **totais}
+    cache.set(chave, valor, timeout=24 * 60 * 60)
+    return valor
+
+
+def _somar(destino, origem, campos):
+    for campo in campos:
+        destino[campo] = destino.get(campo, 0) + origem[campo]
+
+
+def invalidar_resumos(contrato_ids):
+    cache.delete_many([_chave_resumo(contrato_id) for contrato_id in set(contrato_ids)])
+
+
+def extrato_do_ano(contrato, ano):
+    """
+    Pagamentos de um ano do contrato, cada um com o saldo acumulado desde o
+    início do contrato. O saldo dos anos anteriores entra como valor inicial,
+    para que a janela só percorra as linhas do ano pedido.
+    """
+    anterior = Decimal('0')
+    for model in (PagamentoRenda, PagamentoRendaArquivo):
+        anterior += model.objects.filter(contrato=contrato, mes_referencia__year__lt=ano).aggregate(
+            saldo=Coalesce(Sum(VALOR_PAGO), ZERO) - Coalesce(Sum('valor'), ZERO)
+        )['saldo']
+    linhas = list(
+        PagamentoRenda.objects.filter(contrato=contrato, mes_referencia__year=ano)
+        .annotate(
+            saldo=Window(Sum(VALOR_PAGO - F('valor')), order_by=F('mes_referencia').asc()) + Value(anterior)
+        )
+        .order_by('mes_referencia')
+    )
+    arquivados = list(PagamentoRendaArquivo.objects.filter(contrato=contrato, mes_referencia__year=ano))
+    if not arquivados:
+        return linhas
+    # Com meses arquivados no ano, o saldo é refeito sobre as duas tabelas
+    # (no máximo uma linha por mês).
+    saldo = anterior
+    linhas = sorted([*linhas, *arquivados], key=lambda p: (p.mes_referencia, p.id))
+    for pagamento in linhas:
+        saldo += (pagamento.valor if pagamento.estado == 'pago' else 0) - pagamento.valor
+        pagamento.saldo = saldo
+    return linhas
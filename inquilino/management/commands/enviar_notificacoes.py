@@ -0,0 +1,56 @@
+"""
+Envia as notificações pendentes, um email por destinatário (ver
+inquilino/notificacoes.py).
+
+Pensado para correr periodicamente (cron):
+
+    python manage.py enviar_notificacoes --lembrar-rendas
+    python manage.py enviar_notificacoes --consola
+    python manage.py enviar_notificacoes --lembrar-rendas --dias 3 --dry-run
+
+Com --lembrar-rendas, cria primeiro os lembretes das rendas por pagar que
+vencem nos próximos dias. Com --consola, os emails são mostrados no terminal
+em vez de usar o EMAIL_BACKEND das configurações.
+"""
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+
+from inquilino import notificacoes
+
+
+class Command(BaseCommand):
+    help = 'Envia as notificações pendentes agrupadas num email por destinatário.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lembrar-rendas', action='store_true', help='Cria os lembretes das rendas a vencer.')
+        parser.add_argument('--dias', type=int, default=notificacoes.DIAS_LEMBRETE, help='Antecedência dos lembretes.')
+        parser.add_argument('--lote', type=int, default=notificacoes.LOTE, help='Emails por lote.')
+        parser.add_argument('--consola', action='store_true', help='Mostra os emails no terminal.')
+        parser.add_argument('--dry-run', action='store_true', help='Só conta as notificações pendentes.')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1 or options['dias'] < 0:
+            raise CommandError('O lote tem de ser positivo e os dias não podem ser negativos.')
+        inicio = time.monotonic()
+
+        if options['lembrar_rendas'] and not options['dry_run']:
+            novos = notificacoes.lembrar_rendas(dias=options['dias'])
+            self.stdout.write(f'{novos} lembretes de renda criados.')
+
+        pendentes = notificacoes.pendentes()
+        if options['dry_run']:
+            destinatarios = pendentes.values('destinatario_id').distinct().count()
+            self.stdout.write(f'{pendentes.count()} notificações pendentes para {destinatarios} destinatários.')
+            return
+
+        connection = None
+        if options['consola']:
+            connection = get_connection('django.core.mail.backends.console.EmailBackend', stream=self.stdout)
+        emails, enviadas, descartadas = notificacoes.enviar(options['lote'], connection)
+        if descartadas:
+            self.stdout.write(f'{descartadas} notificações descartadas (utilizadores sem email).')
+        self.stdout.write(self.style.SUCCESS(
+            f'{emails} emails enviados com {enviadas} notificações em {time.monotonic() - inicio:.2f}s.'
+        ))
@@ -0,0 +1,46 @@
+"""
+Gera as declarações anuais de rendas pagas de todos os inquilinos.
+
+    python manage.py gerar_declaracoes
+    python manage.py gerar_declaracoes --ano 2025 --workers 8
+
+Pensado para correr no fecho do ano: os PDF ficam na cache em disco
+(settings.DOCUMENTOS_DIR) e são servidos diretamente quando o inquilino os
+pede. As declarações já geradas (com o mesmo conteúdo) são ignoradas.
+"""
+from datetime import date
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gerente.models import Inquilino
+from inquilino import documentos
+from inquilino.models import PagamentoRenda, PagamentoRendaArquivo
+
+
+class Command(BaseCommand):
+    help = 'Gera em paralelo a declaração anual de cada inquilino com rendas pagas no ano.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ano', type=int, help='Ano da declaração. Por omissão, o ano anterior.')
+        parser.add_argument('--workers', type=int, default=None, help='Processos a gerar PDF (por omissão, um por CPU).')
+
+    def handle(self, *args, **options):
+        ano = options['ano'] or date.today().year - 1
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('O número de workers tem de ser positivo.')
+
+        inicio = time.monotonic()
+        com_pagamentos = {'estado': 'pago', 'mes_referencia__year': ano}
+        ids = set(PagamentoRenda.objects.filter(**com_pagamentos).values_list('contrato__inquilino_id', flat=True))
+        ids.update(PagamentoRendaArquivo.objects.filter(**com_pagamentos).values_list('contrato__inquilino_id', flat=True))
+        inquilinos = Inquilino.objects.filter(id__in=ids).select_related('user').order_by('id')
+
+        declaracoes = [documentos.declaracao_anual(inquilino, ano) for inquilino in inquilinos.iterator()]
+        preparacao = time.monotonic() - inicio
+        gerados, existentes = documentos.gerar_em_lote(declaracoes, workers=options['workers'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Declarações de {ano}: {gerados} geradas, {existentes} já existentes '
+            f'em {time.monotonic() - inicio:.2f}s (consultas: {preparacao:.2f}s).'
+        ))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gerente", "0006_squashed_0013"),
+        ("inquilino", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PagamentoRendaArquivo",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("mes_referencia", models.DateField(verbose_name="Mês de Referência")),
+                ("valor", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("entidade", models.CharField(max_length=4)),
+                (
+                    "referencia",
+                    models.CharField(max_length=20, verbose_name="Referência"),
+                ),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[("pago", "Pago"), ("nao_pago", "Não Pago")],
+                        max_length=10,
+                    ),
+                ),
+                ("data_arquivo", models.DateTimeField(auto_now_add=True)),
+                (
+                    "contrato",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="gerente.contratos",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "pagamento arquivado",
+                "verbose_name_plural": "pagamentos arquivados",
+                "indexes": [
+                    models.Index(
+                        fields=["contrato", "mes_referencia"],
+                        name="pag_arq_contrato_mes_idx",
+                    )
+                ],
+            },
+        ),
+    ]
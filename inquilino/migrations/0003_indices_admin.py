@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gerente", "0006_squashed_0013"),
+        ("inquilino", "0002_pagamentorendaarquivo"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pagamentorenda",
+            index=models.Index(
+                fields=["estado", "mes_referencia"], name="pagamento_estado_mes_idx"
+            ),
+        ),
+    ]
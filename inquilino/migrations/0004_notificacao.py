@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inquilino", "0003_indices_admin"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Notificacao",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[
+                            ("renda", "Lembrete de renda"),
+                            ("manutencao", "Manutenção"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("texto", models.CharField(max_length=255)),
+                (
+                    "chave",
+                    models.CharField(
+                        blank=True, max_length=100, null=True, unique=True
+                    ),
+                ),
+                ("criada_em", models.DateTimeField(auto_now_add=True)),
+                ("enviada_em", models.DateTimeField(blank=True, null=True)),
+                (
+                    "destinatario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "notificação",
+                "verbose_name_plural": "notificações",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("enviada_em__isnull", True)),
+                        fields=["destinatario", "criada_em"],
+                        name="notificacao_pendente_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -21,4 +21,73 @@ class PagamentoRenda(models.Model):
     
     class Meta:
         # Garante que não haja duplicatas para um mesmo contrato e mês de referência
-        unique_together = ('contrato', 'mes_referencia',)
\ No newline at end of file
+        unique_together = ('contrato', 'mes_referencia',)
+        indexes = [
+            # Rendas por pagar até uma data (atrasos, lembretes) e navegação por mês no /admin/.
+            models.Index(fields=['estado', 'mes_referencia'], name='pagamento_estado_mes_idx'),
+        ]
+
+
+class PagamentoRendaArquivo(models.Model):
+    """
+    Pagamento já pago de um contrato terminado, movido da tabela
+    PagamentoRenda pelo comando arquivar_historico. Mantém o id original.
+    """
+    arquivado = True
+    ESTADO_CHOICES = PagamentoRenda.ESTADO_CHOICES
+
+    id = models.BigIntegerField(primary_key=True)
+    contrato = models.ForeignKey(Contratos, on_delete=models.CASCADE, related_name='+')
+    mes_referencia = models.DateField(verbose_name='Mês de Referência')
+    valor = models.DecimalField(max_digits=10, decimal_places=2)
+    entidade = models.CharField(max_length=4)
+    referencia = models.CharField(max_length=20, verbose_name='Referência')
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES)
+    data_arquivo = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'pagamento arquivado'
+        verbose_name_plural = 'pagamentos arquivados'
+        indexes = [
+            models.Index(fields=['contrato', 'mes_referencia'], name='pag_arq_contrato_mes_idx'),
+        ]
+
+    def __str__(self):
+        return f'Pagamento arquivado de {self.mes_referencia.strftime("%B/%Y")}'
+
+
+class Notificacao(models.Model):
+    """
+    Evento por comunicar a um utilizador: lembrete de uma renda que está a
+    vencer ou mudança de estado de uma manutenção. O comando
+    enviar_notificacoes junta as pendentes de cada destinatário num único
+    email (ver inquilino/notificacoes.py).
+    """
+    TIPO_CHOICES = [
+        ('renda', 'Lembrete de renda'),
+        ('manutencao', 'Manutenção'),
+    ]
+
+    destinatario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    texto = models.CharField(max_length=255)
+    # Identifica o evento para não o repetir (por exemplo, o lembrete de uma
+    # renda em cada execução diária); vazio nos eventos que não se repetem.
+    chave = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    enviada_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'notificação'
+        verbose_name_plural = 'notificações'
+        indexes = [
+            # Só as pendentes, já pela ordem em que são agrupadas.
+            models.Index(
+                fields=['destinatario', 'criada_em'],
+                condition=models.Q(enviada_em__isnull=True),
+                name='notificacao_pendente_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.get_tipo_display()} para {self.destinatario_id}: {self.texto}'
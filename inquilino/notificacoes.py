@@ -0,0 +1,157 @@
+"""
+Notificações por email aos inquilinos: lembretes das rendas que estão a
+vencer e mudanças de estado das manutenções que pediram.
+
+Os eventos ficam na tabela Notificacao (um INSERT no pedido, sem esperar
+pelo servidor de email). O comando enviar_notificacoes junta as pendentes de
+cada destinatário num único email e envia-os por lotes, todos pela mesma
+ligação (uma só sessão SMTP em produção). Em desenvolvimento, EMAIL_BACKEND
+grava os emails em ficheiros (ou mostra-os na consola, com --consola).
+
+Os lembretes são criados por lembrar_rendas() a partir das rendas por pagar
+com mes_referencia nos próximos dias (índice pagamento_estado_mes_idx); a
+chave de cada lembrete impede que a mesma renda seja lembrada duas vezes.
+"""
+from datetime import date, timedelta
+from itertools import groupby
+from operator import attrgetter
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from projecto_condominio.sharding import todas_as_bases
+from .models import Notificacao, PagamentoRenda
+
+# Emails por lote (e destinatários lidos de cada vez).
+LOTE = 100
+# Dias de antecedência dos lembretes de renda.
+DIAS_LEMBRETE = 7
+# Lembretes verificados/gravados de cada vez.
+LOTE_LEMBRETES = 1000
+
+TITULOS = {'renda': 'Rendas a pagar', 'manutencao': 'Manutenções'}
+# Assuntos curtos: codificar um assunto longo com acentos (RFC 2047) custa
+# quase tanto como o resto da mensagem.
+ASSUNTOS = {'renda': 'Lembrete de renda', 'manutencao': 'Manutenção atualizada'}
+
+
+def enfileirar(destinatario_id, tipo, texto, using='default'):
+    """
+    Grava uma notificação para o utilizador (quem chama já verificou que tem
+    email). Se o evento aconteceu num shard, a notificação (na base central)
+    só é gravada depois do commit do shard.
+    """
+    notificacao = Notificacao(destinatario_id=destinatario_id, tipo=tipo, texto=texto[:255])
+    if using == 'default':
+        notificacao.save(using='default')
+    else:
+        transaction.on_commit(lambda: notificacao.save(using='default'), using=using)
+
+
+def _lembretes(alias, rendas):
+    for renda_id, mes, valor, user_id, numero, predio in rendas:
+        casa = f'casa {numero} ({predio})' if numero is not None else 'contrato sem casa'
+        yield Notificacao(
+            destinatario_id=user_id,
+            tipo='renda',
+            texto=f'Renda de {mes:%m/%Y} da {casa}: {valor:.2f} MZN, vence a {mes:%d/%m/%Y}.',
+            chave=f'renda:{alias}:{renda_id}',
+        )
+
+
+def lembrar_rendas(hoje=None, dias=DIAS_LEMBRETE):
+    """
+    Cria um lembrete para cada renda por pagar com mes_referencia entre hoje
+    e daqui a `dias` dias, em todas as bases. Devolve o número de lembretes
+    novos (as rendas já lembradas são ignoradas).
+    """
+    hoje = hoje or date.today()
+    novos = 0
+    for alias in todas_as_bases():
+        rendas = (
+            PagamentoRenda.objects.using(alias)
+            .filter(estado='nao_pago', mes_referencia__range=(hoje, hoje + timedelta(days=dias)))
+            .exclude(contrato__inquilino__user__email='')
+            .values_list(
+                'id', 'mes_referencia', 'valor', 'contrato__inquilino__user_id',
+                'contrato__casa__numero', 'contrato__casa__predio__nome',
+            )
+            .iterator(chunk_size=LOTE_LEMBRETES)
+        )
+        lembretes = _lembretes(alias, rendas)
+        while lote := [n for _, n in zip(range(LOTE_LEMBRETES), lembretes)]:
+            existentes = set(
+                Notificacao.objects.using('default').filter(chave__in=[n.chave for n in lote]).values_list('chave', flat=True)
+            )
+            lote = [n for n in lote if n.chave not in existentes]
+            # ignore_conflicts: outra execução ao mesmo tempo pode ter gravado os mesmos.
+            Notificacao.objects.using('default').bulk_create(lote, ignore_conflicts=True)
+            novos += len(lote)
+    return novos
+
+
+def _mensagem(destinatario, notificacoes):
+    """
+    Um email com todas as notificações pendentes do destinatário, agrupadas
+    por tipo.
+    """
+    linhas = [f'Olá {destinatario.get_full_name() or destinatario.username},', '']
+    por_tipo = sorted(notificacoes, key=lambda n: list(TITULOS).index(n.tipo))
+    for tipo, grupo in groupby(por_tipo, key=attrgetter('tipo')):
+        linhas.append(f'{TITULOS[tipo]}:')
+        linhas.extend(f'- {n.texto}' for n in grupo)
+        linhas.append('')
+    if len(notificacoes) == 1:
+        assunto = ASSUNTOS[notificacoes[0].tipo]
+    else:
+        assunto = f'Condomínio: {len(notificacoes)} notificações'
+    return EmailMessage(assunto, '\n'.join(linhas), to=[destinatario.email])
+
+
+def pendentes():
+    return Notificacao.objects.using('default').filter(enviada_em__isnull=True)
+
+
+def enviar(lote=LOTE, connection=None):
+    """
+    Envia um email por destinatário com as suas notificações pendentes, em
+    lotes de `lote` emails pela mesma ligação (a do EMAIL_BACKEND, se não
+    for indicada outra). Cada lote é marcado como enviado logo a seguir; se
+    o envio falhar, o lote fica pendente para a próxima execução.
+
+    Devolve (emails, notificações enviadas, notificações descartadas): as de
+    utilizadores que entretanto ficaram sem email são apagadas, para não se
+    acumularem.
+    """
+    connection = connection or get_connection()
+    emails = enviadas = descartadas = 0
+    ultimo = 0
+    with connection:
+        while True:
+            destinatarios = list(
+                pendentes().filter(destinatario_id__gt=ultimo).order_by('destinatario_id')
+                .values_list('destinatario_id', flat=True).distinct()[:lote]
+            )
+            if not destinatarios:
+                break
+            ultimo = destinatarios[-1]
+            notificacoes = (
+                pendentes().filter(destinatario_id__in=destinatarios)
+                .select_related('destinatario').order_by('destinatario_id', 'criada_em')
+            )
+            mensagens, ids, sem_email = [], [], []
+            for _, grupo in groupby(notificacoes, key=attrgetter('destinatario_id')):
+                grupo = list(grupo)
+                if not grupo[0].destinatario.email:
+                    sem_email.extend(n.id for n in grupo)
+                    continue
+                mensagens.append(_mensagem(grupo[0].destinatario, grupo))
+                ids.extend(n.id for n in grupo)
+
+            if mensagens:
+                emails += connection.send_messages(mensagens) or 0
+                enviadas += pendentes().filter(id__in=ids).update(enviada_em=timezone.now())
+            if sem_email:
+                descartadas += Notificacao.objects.using('default').filter(id__in=sem_email).delete()[0]
+    return emails, enviadas, descartadas
@@ -0,0 +1,112 @@
+"""
+Geração do plano de pagamentos (PagamentoRenda) de um contrato.
+Usado pelas views do inquilino e pelos comandos de gestão.
+"""
+from datetime import date
+import uuid
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Max
+
+from .financas import invalidar_resumos
+from .models import PagamentoRenda, PagamentoRendaArquivo
+
+
+def gerar_referencia(contrato_id, mes):
+    """
+    Gera uma referência única para o pagamento de um mês.
+    """
+    return f"{contrato_id}-{mes.year}{mes.month:02d}-{uuid.uuid4().hex[:6]}"
+
+
+def meses_do_contrato(contrato, a_partir_de=None):
+    """
+    Devolve o primeiro dia de cada mês coberto pelo contrato, a partir de
+    `a_partir_de` (por omissão, o mês de início do contrato).
+    """
+    data_fim_contrato = contrato.data_inicio + relativedelta(months=contrato.duracao_meses)
+    primeiro = a_partir_de or contrato.data_inicio
+    # Meses contados a partir do ano 0, para avançar sem relativedelta.
+    inicio = primeiro.year * 12 + primeiro.month - 1
+    fim = data_fim_contrato.year * 12 + data_fim_contrato.month - 1
+    if data_fim_contrato.day > 1:
+        # O mês em que o contrato acaba também é coberto.
+        fim += 1
+    for indice in range(inicio, fim):
+        ano, mes = divmod(indice, 12)
+        yield date(ano, mes + 1, 1)
+
+
+def primeiro_mes_da_renovacao(data_inicio):
+    """
+    Primeiro mês cobrado por uma renovação que começa em `data_inicio` (a
+    data de fim do contrato anterior). O mês em que o contrato anterior
+    termina já foi cobrado por ele, a não ser que termine no dia 1.
+    """
+    primeiro_mes = data_inicio.replace(day=1)
+    if data_inicio.day > 1:
+        primeiro_mes += relativedelta(months=1)
+    return primeiro_mes
+
+
+def novos_pagamentos(contrato, a_partir_de=None):
+    """
+    Constrói (sem gravar) os pagamentos de um contrato novo,
+    prontos para um bulk_create.
+    """
+    return [
+        PagamentoRenda(
+            contrato=contrato,
+            mes_referencia=mes,
+            valor=contrato.valor_renda,
+            entidade='9501',
+            referencia=gerar_referencia(contrato.id, mes),
+        )
+        for mes in meses_do_contrato(contrato, a_partir_de)
+    ]
+
+
+def pagamentos_do_mes(contratos, mes):
+    """
+    Constrói (sem gravar) o pagamento de `mes` para cada contrato, a partir
+    de pares (id, valor_renda), prontos para um bulk_create.
+    """
+    return [
+        PagamentoRenda(
+            contrato_id=contrato_id,
+            mes_referencia=mes,
+            valor=valor_renda,
+            entidade='9501',
+            referencia=gerar_referencia(contrato_id, mes),
+        )
+        for contrato_id, valor_renda in contratos
+    ]
+
+
+def gerar_pagamentos_em_falta(contrato):
+    """
+    Função auxiliar para gerar pagamentos mensais para a duração total de um contrato.
+    Só os contratos ativos: os pagamentos pagos de um contrato terminado podem
+    já estar arquivados (ver arquivar_historico), e não voltam a ser criados
+    como rendas por pagar.
+    """
+    if contrato.estado != 'ativo':
+        return
+    # Encontrar a data do último pagamento gerado, também entre os arquivados
+    ultimos = [
+        model.objects.filter(contrato=contrato).aggregate(ultimo=Max('mes_referencia'))['ultimo']
+        for model in (PagamentoRenda, PagamentoRendaArquivo)
+    ]
+    ultimo_pagamento = max(filter(None, ultimos), default=None)
+
+    mes_inicio_geracao = None
+    if ultimo_pagamento:
+        mes_inicio_geracao = ultimo_pagamento + relativedelta(months=1)
+
+    # Gerar pagamentos até a data final do contrato. Os meses que entretanto
+    # outro pedido tenha criado são ignorados (unique contrato + mês).
+    novos = novos_pagamentos(contrato, a_partir_de=mes_inicio_geracao)
+    if novos:
+        PagamentoRenda.objects.bulk_create(novos, ignore_conflicts=True)
+        # O bulk_create não dispara o post_save (ver inquilino/signals.py).
+        invalidar_resumos([contrato.id])
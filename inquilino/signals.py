@@ -0,0 +1,86 @@
+"""
+Invalida o resumo financeiro em cache de um contrato (ver
+inquilino/financas.py) quando um dos seus pagamentos é gravado ou apagado, e
+o contexto em cache dos inquilinos (ver inquilino/contexto.py) quando o
+inquilino, a sua casa, o prédio ou os seus contratos mudam.
+
+Também põe na fila de notificações (ver inquilino/notificacoes.py) as
+mudanças de estado das manutenções pedidas por inquilinos.
+
+As operações em massa (bulk_create, update) não disparam sinais; quem as usa
+chama invalidar_resumos ou invalidar_contextos_de_inquilinos diretamente
+(ver faturar_mes e processar_contratos).
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from administrador.models import Predio
+from gerente.models import Casa, Contratos, Inquilino, Manutencao, TransicaoManutencao
+from .contexto import invalidar_contextos, invalidar_contextos_de_inquilinos
+from .financas import invalidar_resumos
+from .models import PagamentoRenda
+from .notificacoes import enfileirar
+
+
+@receiver(post_save, sender=PagamentoRenda)
+@receiver(post_delete, sender=PagamentoRenda)
+def invalidar_resumo_do_contrato(sender, instance, **kwargs):
+    invalidar_resumos([instance.contrato_id])
+
+
+@receiver(post_save, sender=Inquilino)
+@receiver(post_delete, sender=Inquilino)
+def invalidar_contexto_do_inquilino(sender, instance, using, **kwargs):
+    invalidar_contextos([instance.user_id], using=using)
+
+
+# pre_save: os valores originais (ver gerente/signals.py) ainda não foram
+# atualizados, por isso também o inquilino anterior é invalidado.
+@receiver(pre_save, sender=Casa)
+@receiver(pre_save, sender=Contratos)
+def invalidar_contexto_ao_gravar(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_contextos_de_inquilinos(
+        [instance.inquilino_id, getattr(instance, '_inquilino_original', None)], using=using
+    )
+
+
+@receiver(post_delete, sender=Casa)
+@receiver(post_delete, sender=Contratos)
+def invalidar_contexto_ao_apagar(sender, instance, using, **kwargs):
+    invalidar_contextos_de_inquilinos([instance.inquilino_id], using=using)
+
+
+@receiver(post_save, sender=Predio)
+def invalidar_contextos_do_predio(sender, instance, using, created, raw=False, **kwargs):
+    # O nome e a localização do prédio fazem parte do contexto de quem lá mora.
+    if raw or created:
+        return
+    user_ids = Inquilino.objects.using(using).filter(casas_alugadas__predio=instance).values_list('user_id', flat=True)
+    invalidar_contextos(list(user_ids), using=using)
+
+
+@receiver(post_save, sender=TransicaoManutencao)
+def notificar_mudanca_de_estado(sender, instance, created, using, raw=False, **kwargs):
+    # Cada mudança de estado cria uma transição (ver gerente/signals.py); a
+    # primeira (estado_anterior vazio) é o próprio pedido.
+    if raw or not created or not instance.estado_anterior:
+        return
+    manutencao = instance.manutencao
+    if manutencao.solicitado_por_inquilino_id is None:
+        return
+    user_id, email = (
+        Inquilino.objects.using(using).filter(pk=manutencao.solicitado_por_inquilino_id)
+        .values_list('user_id', 'user__email').first()
+    ) or (None, '')
+    if not email:
+        return
+    estados = dict(Manutencao.ESTADO_CHOICES)
+    enfileirar(
+        user_id,
+        'manutencao',
+        f'Manutenção "{manutencao.descricao[:40]}": {estados.get(instance.estado_anterior, instance.estado_anterior)}'
+        f' → {estados.get(instance.estado_novo, instance.estado_novo)}.',
+        using=using,
+    )
@@ -1,3 +1,314 @@
-from django.test import TestCase
+from concurrent.futures import Future
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+import os
+from pathlib import Path
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from administrador.models import Gerente, Predio
+from gerente.models import Casa, Contratos, Inquilino, Manutencao
+from . import documentos, notificacoes
+from .contexto import carregar
+from .financas import extrato_do_ano, resumo
+from .models import Notificacao, PagamentoRenda, PagamentoRendaArquivo
+from .services import gerar_pagamentos_em_falta, novos_pagamentos
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def criar_gerente(nome='gerente'):
+    return Gerente.objects.create(user=User.objects.create_user(nome), contacto=f'g-{nome}')
+
+
+def criar_inquilino(nome, gerente=None):
+    user = User.objects.create_user(nome, password='segredo-123')
+    user.groups.add(Group.objects.get_or_create(name='Inquilino')[0])
+    return Inquilino.objects.create(user=user, contacto=f'i-{nome}', gerente=gerente)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ContextoInquilinoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.gerente = criar_gerente()
+        self.predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=self.gerente)
+
+    def test_inquilino_sem_casa_nem_contrato(self):
+        inquilino = criar_inquilino('sem_casa', self.gerente)
+
+        contexto = carregar(inquilino.user)
+
+        self.assertEqual(contexto.inquilino, inquilino)
+        self.assertIsNone(contexto.casa)
+        self.assertIsNone(contexto.contrato)
+        self.assertIsNone(contexto.predio)
+
+    def test_inquilino_com_contrato_terminado(self):
+        inquilino = criar_inquilino('antigo', self.gerente)
+        Contratos.objects.create(
+            inquilino=inquilino, data_inicio=date(2020, 1, 1), valor_renda=500, duracao_meses=12, estado='terminado'
+        )
+
+        contexto = carregar(inquilino.user)
+
+        self.assertIsNone(contexto.casa)
+        self.assertIsNone(contexto.contrato)
+
+    def test_inquilino_com_casa_e_contrato_ativo(self):
+        inquilino = criar_inquilino('atual', self.gerente)
+        casa = Casa.objects.create(numero='1A', predio=self.predio, inquilino=inquilino)
+        contrato = Contratos.objects.create(
+            inquilino=inquilino, casa=casa, data_inicio=date.today(), valor_renda=500, duracao_meses=12
+        )
+
+        contexto = carregar(inquilino.user)
+
+        self.assertEqual(contexto.casa, casa)
+        self.assertEqual(contexto.contrato, contrato)
+        self.assertEqual(contexto.predio, self.predio)
+
+    def test_paginas_do_inquilino_sem_casa(self):
+        inquilino = criar_inquilino('novo', self.gerente)
+        self.client.force_login(inquilino.user)
+
+        for nome in ('dashboard_inquilino', 'dados_pessoais_inquilino', 'ver_manutencoes_inquilino', 'adicionar_manutencoes'):
+            with self.subTest(pagina=nome):
+                self.assertEqual(self.client.get(reverse(nome)).status_code, 200)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ArquivoDePagamentosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        gerente = criar_gerente()
+        predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=gerente)
+        self.inquilino = criar_inquilino('antigo', gerente)
+        casa = Casa.objects.create(numero='1A', predio=predio)
+        self.contrato = Contratos.objects.create(
+            inquilino=self.inquilino, casa=casa, data_inicio=date(2020, 1, 1), valor_renda=500, duracao_meses=25
+        )
+        PagamentoRenda.objects.bulk_create(novos_pagamentos(self.contrato))
+        PagamentoRenda.objects.update(estado='pago')
+        self.contrato.estado = 'terminado'
+        self.contrato.save()
+
+    def test_arquivar_nao_transforma_pagamentos_em_divida(self):
+        antes = resumo(self.contrato)
+        extrato_antes = [(p.mes_referencia, p.saldo) for p in extrato_do_ano(self.contrato, 2021)]
+
+        call_command('arquivar_historico', '--antes-de', '2025-01-01', stdout=StringIO())
+        self.assertEqual(PagamentoRenda.objects.count(), 0)
+        self.assertEqual(PagamentoRendaArquivo.objects.count(), 25)
+
+        self.client.force_login(self.inquilino.user)
+        self.assertEqual(self.client.get(reverse('ver_financas')).status_code, 200)
+        self.assertFalse(PagamentoRenda.objects.filter(estado='nao_pago').exists())
+
+        cache.clear()
+        depois = resumo(self.contrato)
+        for campo in ('faturado', 'pago', 'em_divida'):
+            self.assertEqual(depois[campo], antes[campo], campo)
+        self.assertEqual(depois['pago'], 25 * 500)
+        self.assertEqual([(l['ano'], l['meses']) for l in depois['anos']], [(2020, 12), (2021, 12), (2022, 1)])
+        self.assertEqual([(p.mes_referencia, p.saldo) for p in extrato_do_ano(self.contrato, 2021)], extrato_antes)
+
+    def test_contrato_ativo_continua_a_gerar_meses_em_falta(self):
+        self.contrato.estado = 'ativo'
+        self.contrato.save()
+        PagamentoRenda.objects.filter(mes_referencia__gte=date(2021, 1, 1)).delete()
+
+        gerar_pagamentos_em_falta(self.contrato)
+
+        self.assertEqual(PagamentoRenda.objects.filter(contrato=self.contrato).count(), 25)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ExtratoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        gerente = criar_gerente()
+        predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=gerente)
+        inquilino = criar_inquilino('ana', gerente)
+        casa = Casa.objects.create(numero='1A', predio=predio, inquilino=inquilino)
+        self.contrato = Contratos.objects.create(
+            inquilino=inquilino, casa=casa, data_inicio=date(2025, 1, 1), valor_renda=Decimal('333.33'), duracao_meses=24
+        )
+        PagamentoRenda.objects.bulk_create(novos_pagamentos(self.contrato))
+        PagamentoRenda.objects.filter(mes_referencia__lte=date(2025, 3, 1)).update(estado='pago')
+
+    def test_saldo_acumulado_continua_de_um_ano_para_o_outro(self):
+        saldos_2025 = [p.saldo for p in extrato_do_ano(self.contrato, 2025)]
+        saldos_2026 = [p.saldo for p in extrato_do_ano(self.contrato, 2026)]
+
+        self.assertEqual(saldos_2025[:4], [0, 0, 0, Decimal('-333.33')])
+        self.assertEqual(saldos_2025[-1], Decimal('-333.33') * 9)
+        self.assertEqual(saldos_2026[0], Decimal('-333.33') * 10)
+        self.assertEqual(saldos_2026[-1], Decimal('-333.33') * 21)
+
+    def test_resumo_totais_e_divida_na_data(self):
+        totais = resumo(self.contrato, hoje=date(2025, 6, 15))
+
+        self.assertEqual(totais['faturado'], Decimal('333.33') * 24)
+        self.assertEqual(totais['pago'], Decimal('333.33') * 3)
+        # Abril, maio e junho já venceram.
+        self.assertEqual(totais['em_divida'], Decimal('333.33') * 3)
+        self.assertEqual(totais['proximo_vencimento'], date(2025, 4, 1))
+        self.assertEqual([(l['ano'], l['meses']) for l in totais['anos']], [(2025, 12), (2026, 12)])
+
+    def test_pagamento_gravado_invalida_o_resumo(self):
+        hoje = date(2025, 6, 15)
+        resumo(self.contrato, hoje=hoje)
+
+        abril = PagamentoRenda.objects.get(contrato=self.contrato, mes_referencia=date(2025, 4, 1))
+        abril.estado = 'pago'
+        abril.save()
+
+        totais = resumo(self.contrato, hoje=hoje)
+        self.assertEqual(totais['pago'], Decimal('333.33') * 4)
+        self.assertEqual(totais['proximo_vencimento'], date(2025, 5, 1))
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class DocumentosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = Path(pasta.name)
+        self.enterContext(override_settings(DOCUMENTOS_DIR=self.pasta))
+        # Os documentos submetidos (com o pool simulado) ficam registados no processo.
+        self.addCleanup(documentos._em_curso.clear)
+
+        self.inquilino = criar_inquilino('ana', criar_gerente())
+        casa = Casa.objects.create(
+            numero='1A', predio=Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=self.inquilino.gerente),
+        )
+        contrato = Contratos.objects.create(
+            inquilino=self.inquilino, casa=casa, data_inicio=date(2025, 1, 1), valor_renda=500, duracao_meses=12
+        )
+        PagamentoRenda.objects.bulk_create(novos_pagamentos(contrato))
+        self.pagamento = PagamentoRenda.objects.filter(contrato=contrato).order_by('mes_referencia').first()
+        self.pagamento.estado = 'pago'
+        self.pagamento.save()
+
+    def ficheiro(self, nome, tamanho, idade):
+        caminho = self.pasta / nome
+        caminho.write_bytes(b'x' * tamanho)
+        antes = time.time() - idade
+        os.utime(caminho, (antes, antes))
+        return caminho
+
+    def test_pdf_com_uma_pagina_por_sessenta_linhas(self):
+        pdf = documentos.texto_para_pdf([f'Linha {n} com acentuação' for n in range(61)])
+
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.endswith(b'%%EOF\n'))
+        self.assertIn(b'/Count 2', pdf)
+        self.assertIn('acentuação'.encode('cp1252'), pdf)
+
+    def test_obter_nao_espera_e_so_submete_uma_vez(self):
+        documento = documentos.recibo(self.pagamento)
+        futuro = Future()
+        with mock.patch.object(documentos.Documento, 'submeter', return_value=futuro) as submeter:
+            self.assertIsNone(documentos.obter(documento))
+            self.assertIsNone(documentos.obter(documento))
+        self.assertEqual(submeter.call_count, 1)
+
+        futuro.set_result(documentos.gravar_pdf(documento.caminho, documento.texto))
+
+        self.assertEqual(documentos.obter(documento), documento.caminho)
+        self.assertNotIn(documento.caminho, documentos._em_curso)
+
+    def test_recibo_em_preparacao_responde_202_e_depois_serve_o_pdf(self):
+        self.client.force_login(self.inquilino.user)
+        url = reverse('recibo_pdf', args=[self.pagamento.pk])
+
+        with mock.patch.object(documentos.Documento, 'submeter', return_value=Future()):
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 202)
+        self.assertTemplateUsed(resposta, 'inquilino/documento_a_gerar.html')
+
+        documento = documentos.recibo(self.pagamento)
+        documentos.gravar_pdf(documento.caminho, documento.texto)
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(b''.join(resposta.streaming_content).startswith(b'%PDF'))
+
+    def test_limpar_apaga_os_usados_ha_mais_tempo(self):
+        antigo = self.ficheiro('antigo.pdf', 400, idade=300)
+        medio = self.ficheiro('medio.pdf', 400, idade=200)
+        recente = self.ficheiro('recente.pdf', 400, idade=100)
+        temporario = self.ficheiro('abandonado.tmp', 10, idade=documentos.IDADE_TEMPORARIOS + 60)
+
+        self.assertEqual(documentos.limpar(limite=1000), (2, 410))
+
+        self.assertEqual([c.exists() for c in (antigo, medio, recente, temporario)], [False, True, True, False])
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class NotificacoesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        gerente = criar_gerente()
+        self.predio = Predio.objects.create(nome='Central', localizacao='Lisboa', gerente=gerente)
+        self.ana = self.inquilino_com_contrato('ana', '1A', gerente, email='ana@example.com')
+        self.rui = self.inquilino_com_contrato('rui', '1B', gerente, email='')
+
+    def inquilino_com_contrato(self, nome, numero, gerente, email):
+        inquilino = criar_inquilino(nome, gerente)
+        inquilino.user.email = email
+        inquilino.user.save()
+        casa = Casa.objects.create(numero=numero, predio=self.predio, inquilino=inquilino)
+        contrato = Contratos.objects.create(
+            inquilino=inquilino, casa=casa, data_inicio=date(2026, 1, 1), valor_renda=500, duracao_meses=12
+        )
+        PagamentoRenda.objects.bulk_create(novos_pagamentos(contrato))
+        return inquilino
+
+    def test_lembretes_so_uma_vez_e_so_com_email(self):
+        self.assertEqual(notificacoes.lembrar_rendas(hoje=date(2026, 2, 25)), 1)
+        self.assertEqual(notificacoes.lembrar_rendas(hoje=date(2026, 2, 26)), 0)
+
+        lembrete = Notificacao.objects.get()
+        self.assertEqual((lembrete.destinatario_id, lembrete.tipo), (self.ana.user_id, 'renda'))
+        self.assertIn('03/2026', lembrete.texto)
+        self.assertIn('500.00 MZN', lembrete.texto)
+
+    def test_mudanca_de_estado_notifica_quem_pediu(self):
+        manutencao = Manutencao.objects.create(
+            tipo='geral', descricao='Porta', casa=self.ana.casas_alugadas.get(), solicitado_por_inquilino=self.ana
+        )
+        self.assertFalse(Notificacao.objects.exists())
+
+        manutencao.estado = 'em_progresso'
+        manutencao.save()
+
+        notificacao = Notificacao.objects.get()
+        self.assertEqual((notificacao.destinatario_id, notificacao.tipo), (self.ana.user_id, 'manutencao'))
+        self.assertIn('Pendente → Em Progresso', notificacao.texto)
+
+    def test_envio_junta_as_notificacoes_de_cada_destinatario(self):
+        notificacoes.lembrar_rendas(hoje=date(2026, 2, 25))
+        notificacoes.enfileirar(self.ana.user_id, 'manutencao', 'Porta: Pendente → Concluído.')
+        notificacoes.enfileirar(self.rui.user_id, 'manutencao', 'Sem email.')
+
+        self.assertEqual(notificacoes.enviar(), (1, 2, 1))
+
+        self.assertEqual(len(mail.outbox), 1)
+        email = mail.outbox[0]
+        self.assertEqual(email.to, ['ana@example.com'])
+        self.assertIn('Rendas a pagar:', email.body)
+        self.assertIn('Manutenções:', email.body)
+        self.assertFalse(notificacoes.pendentes().exists())
+        # Nada fica para enviar outra vez.
+        self.assertEqual(notificacoes.enviar(), (0, 0, 0))
@@ -18,4 +18,6 @@ urlpatterns = [
 
     path('financas/', views.ver_financas, name='ver_financas'),
     path('financas/pagar/<int:pk>/', views.pagar_renda, name='pagar_renda'),
+    path('financas/recibo/<int:pk>/', views.recibo_pdf, name='recibo_pdf'),
+    path('financas/declaracao/<int:ano>/', views.declaracao_anual_pdf, name='declaracao_anual_pdf'),
 ]
\ No newline at end of file
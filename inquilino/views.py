@@ -4,13 +4,18 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.models import Group
 from django.contrib.auth.decorators import login_required, user_passes_test
-from gerente.models import Inquilino, Casa, Manutencao, Contratos
-from .models import PagamentoRenda
+from gerente.models import Inquilino, Manutencao, ManutencaoArquivo, Contratos
+from .models import PagamentoRenda, PagamentoRendaArquivo
+from . import documentos
+from .financas import extrato_do_ano, resumo
+from .services import gerar_pagamentos_em_falta
 from django.db import transaction
-from django.db.models import Q
 from datetime import date
-from dateutil.relativedelta import relativedelta
-import uuid
+from projecto_condominio.replica import leitura_em_replica
+from projecto_condominio import remocao, throttling
+from django.http import FileResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from gerente.fotos import MAXIMO_POR_PEDIDO, FotoUploadHandler, anexar_fotos, guardar_fotos
 
 # --- Funções auxiliares para verificação de permissões ---
 def is_inquilino(user):
@@ -27,8 +32,15 @@ def login_inquilino(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
 
+        # Rejeita as rajadas de tentativas antes de calcular o hash da password.
+        espera = throttling.tempo_de_espera(request, username)
+        if espera:
+            messages.error(request, f'Demasiadas tentativas de login. Tente novamente dentro de {espera} segundos.')
+            return render(request, 'inquilino/login_inquilino.html', status=429)
+
         # 1. Autenticar o utilizador com as credenciais fornecidas
         user = authenticate(request, username=username, password=password)
+        throttling.registar_resultado(request, username, sucesso=user is not None)
 
         if user is not None:
             # 2. Verificar se o utilizador pertence ao grupo 'Inquilino'
@@ -61,7 +73,7 @@ def dashboard_inquilino(request):
     View para o dashboard principal do inquilino.
     Não contém mais formulários ou informações pessoais.
     """
-    inquilino = request.user.inquilino
+    inquilino = request.contexto_inquilino.inquilino
     
     context = {
         'inquilino': inquilino,
@@ -74,47 +86,60 @@ def dados_pessoais_inquilino(request):
     """
     View para exibir as informações de perfil e casa do inquilino.
     """
-    inquilino = request.user.inquilino
-    
-    try:
-        casa = Casa.objects.get(inquilino=inquilino)
-    except Casa.DoesNotExist:
-        casa = None
-    
+    contexto = request.contexto_inquilino
+
     context = {
-        'inquilino': inquilino,
-        'casa': casa,
+        'inquilino': contexto.inquilino,
+        'casa': contexto.casa,
     }
     return render(request, 'inquilino/dados_pessoais_inquilino.html', context)
 
 
 @login_required(login_url='login_inquilino')
 @user_passes_test(is_inquilino)
+@leitura_em_replica
 def ver_manutencoes_inquilino(request):
     """
     View para exibir o histórico de todas as solicitações de manutenção do inquilino.
     """
-    inquilino = request.user.inquilino
+    inquilino = request.contexto_inquilino.inquilino
     manutencoes = Manutencao.objects.filter(solicitado_por_inquilino=inquilino).order_by('-data_solicitacao')
-    
+    # As de um prédio ou de uma casa com remoção pendente já não aparecem.
+    manutencoes = remocao.visiveis(manutencoes, predio='predio', casa='casa')
+
+    # O histórico arquivado só é lido quando o inquilino o pede.
+    historico = request.GET.get('historico') == '1'
+    if historico:
+        arquivadas = remocao.visiveis(
+            ManutencaoArquivo.objects.filter(solicitado_por_inquilino=inquilino), predio='predio', casa='casa'
+        )
+        manutencoes = sorted(
+            [*manutencoes, *arquivadas], key=lambda m: m.data_solicitacao, reverse=True
+        )
+    manutencoes = anexar_fotos(manutencoes)
+
     context = {
         'inquilino': inquilino,
         'manutencoes': manutencoes,
+        'historico': historico,
     }
     return render(request, 'inquilino/ver_manutencoes_inquilino.html', context)
 
 
+@csrf_exempt
 @login_required(login_url='login_inquilino')
 @user_passes_test(is_inquilino)
+@csrf_protect
 def adicionar_manutencoes(request):
     """
     View que lida com a exibição do formulário (GET) e o processamento (POST).
+    As fotos são gravadas em disco à medida que chegam (ver gerente/fotos.py);
+    o handler tem de ser trocado antes de o CSRF ler o POST, daí o
+    csrf_exempt/csrf_protect.
     """
-    inquilino = request.user.inquilino
-    try:
-        casa = Casa.objects.get(inquilino=inquilino)
-    except Casa.DoesNotExist:
-        casa = None
+    request.upload_handlers = [FotoUploadHandler(request)]
+    inquilino = request.contexto_inquilino.inquilino
+    casa = request.contexto_inquilino.casa
     
     if request.method == 'POST':
         tipo = request.POST.get('tipo')
@@ -129,12 +154,16 @@ def adicionar_manutencoes(request):
             return redirect('adicionar_manutencoes')
         
         try:
-            Manutencao.objects.create(
-                solicitado_por_inquilino=inquilino,
-                casa=casa,
-                tipo=tipo,
-                descricao=descricao
-            )
+            with transaction.atomic():
+                manutencao = Manutencao.objects.create(
+                    solicitado_por_inquilino=inquilino,
+                    casa=casa,
+                    tipo=tipo,
+                    descricao=descricao
+                )
+                _, rejeitadas = guardar_fotos(manutencao, request.FILES.getlist('fotos'))
+            if rejeitadas:
+                messages.warning(request, f'Fotos ignoradas (formato inválido, acima de 10 MB ou além do limite de {MAXIMO_POR_PEDIDO}): {", ".join(rejeitadas)}')
             messages.success(request, 'Sua solicitação de manutenção foi enviada com sucesso!')
             return redirect('ver_manutencoes_inquilino')
         except Exception as e:
@@ -151,69 +180,71 @@ def adicionar_manutencoes(request):
 
 @user_passes_test(is_inquilino, login_url='login_inquilino')
 def ver_financas(request):
+    """
+    Extrato do contrato mais recente do inquilino (ou do pedido em
+    ?contrato=), paginado por ano, com saldo acumulado e totais.
+    """
+    historico = request.GET.get('historico') == '1'
+    contratos = []
+    contrato_ativo = None
+    pagamentos = []
+    arquivados = []
+    resumo_contrato = None
+    ano = None
     try:
-        inquilino = request.user.inquilino
-        contrato_ativo = Contratos.objects.filter(inquilino=inquilino).order_by('-data_inicio').first()
+        inquilino = request.contexto_inquilino.inquilino
+        contratos = remocao.visiveis(Contratos.objects.filter(inquilino=inquilino), casa='casa', predio='casa__predio')
+        contratos = list(contratos.select_related('casa__predio').order_by('-data_inicio'))
+        contrato_ativo = next((c for c in contratos if str(c.id) == request.GET.get('contrato')), None)
+        if contrato_ativo is None and contratos:
+            contrato_ativo = contratos[0]
 
-        pagamentos = []
         if contrato_ativo:
             # Gerar pagamentos para a duração total do contrato
             gerar_pagamentos_em_falta(contrato_ativo)
+            resumo_contrato = resumo(contrato_ativo)
+
+            # Por omissão, o ano do próximo vencimento (ou o último ano com pagamentos).
+            anos = [linha['ano'] for linha in resumo_contrato['anos']]
+            try:
+                ano = int(request.GET['ano'])
+            except (KeyError, ValueError):
+                proximo = resumo_contrato['proximo_vencimento']
+                ano = proximo.year if proximo else (anos[-1] if anos else date.today().year)
+            pagamentos = extrato_do_ano(contrato_ativo, ano)
 
-            # Obter todos os pagamentos para este contrato
-            pagamentos = PagamentoRenda.objects.filter(contrato=contrato_ativo).order_by('mes_referencia')
+        # Pagamentos arquivados de contratos antigos, só quando pedidos.
+        if historico:
+            arquivados = remocao.visiveis(
+                PagamentoRendaArquivo.objects.filter(contrato__inquilino=inquilino),
+                casa='contrato__casa', predio='contrato__casa__predio',
+            ).select_related('contrato__casa__predio').order_by('mes_referencia')
 
     except Exception as e:
         pagamentos = []
         messages.error(request, f'Ocorreu um erro ao carregar as finanças: {e}')
 
     context = {
+        'contratos': contratos,
+        'contrato_ativo': contrato_ativo,
+        'resumo': resumo_contrato,
+        'ano': ano,
         'pagamentos': pagamentos,
+        'arquivados': arquivados,
+        'historico': historico,
     }
     return render(request, 'inquilino/financas.html', context)
 
-def gerar_pagamentos_em_falta(contrato):
-    """
-    Função auxiliar para gerar pagamentos mensais para a duração total de um contrato.
-    """
-    # Encontrar a data final do contrato
-    data_fim_contrato = contrato.data_inicio + relativedelta(months=contrato.duracao_meses)
-    
-    # Encontrar a data do último pagamento gerado
-    ultimo_pagamento = PagamentoRenda.objects.filter(contrato=contrato).order_by('-mes_referencia').first()
-    
-    if ultimo_pagamento:
-        mes_inicio_geracao = ultimo_pagamento.mes_referencia + relativedelta(months=1)
-    else:
-        mes_inicio_geracao = date(contrato.data_inicio.year, contrato.data_inicio.month, 1)
-
-    # Gerar pagamentos até a data final do contrato
-    while mes_inicio_geracao < data_fim_contrato:
-        # Gerar uma referência única para o pagamento
-        referencia = f"{contrato.id}-{mes_inicio_geracao.year}{mes_inicio_geracao.month:02d}-{uuid.uuid4().hex[:6]}"
-        
-        PagamentoRenda.objects.get_or_create(
-            contrato=contrato,
-            mes_referencia=mes_inicio_geracao,
-            defaults={
-                'valor': contrato.valor_renda,
-                'entidade': '9501',
-                'referencia': referencia,
-            }
-        )
-        mes_inicio_geracao += relativedelta(months=1)
-
-
 @user_passes_test(is_inquilino, login_url='login_inquilino')
 def pagar_renda(request, pk):
     """
     Simula o pagamento de uma renda.
     """
     if request.method == 'POST':
-        pagamento = get_object_or_404(PagamentoRenda, pk=pk)
+        pagamento = get_object_or_404(PagamentoRenda.objects.select_related('contrato'), pk=pk)
         
         # O inquilino só pode pagar se for o seu próprio pagamento
-        if pagamento.contrato.inquilino.user != request.user:
+        if pagamento.contrato.inquilino_id != request.contexto_inquilino.inquilino.id:
             messages.error(request, 'Não tem permissão para realizar esta ação.')
             return redirect('ver_financas')
 
@@ -225,4 +256,40 @@ def pagar_renda(request, pk):
         else:
             messages.info(request, 'Este pagamento já foi efetuado.')
     
-    return redirect('ver_financas')
\ No newline at end of file
+    return redirect('ver_financas')
+
+def _servir_documento(request, documento):
+    """
+    Serve o PDF da cache em disco (FileResponse usa o sendfile do servidor
+    quando disponível) ou, se ainda estiver a ser gerado, responde 202 com
+    uma página que volta a pedir o documento (o worker não fica à espera).
+    """
+    caminho = documentos.obter(documento)
+    if caminho is None:
+        context = {'documento': documento, 'intervalo_ms': 2000}
+        return render(request, 'inquilino/documento_a_gerar.html', context, status=202)
+    return FileResponse(open(caminho, 'rb'), as_attachment=True, filename=documento.nome, content_type='application/pdf')
+
+
+@user_passes_test(is_inquilino, login_url='login_inquilino')
+def recibo_pdf(request, pk):
+    """
+    Recibo de um pagamento já pago do inquilino.
+    """
+    # Os pagamentos arquivados mantêm o id, por isso o link do extrato continua a servir.
+    filtro = {'pk': pk, 'contrato__inquilino__user': request.user, 'estado': 'pago'}
+    pagamento = (
+        PagamentoRenda.objects.select_related('contrato__casa__predio', 'contrato__inquilino__user').filter(**filtro).first()
+        or get_object_or_404(
+            PagamentoRendaArquivo.objects.select_related('contrato__casa__predio', 'contrato__inquilino__user'), **filtro
+        )
+    )
+    return _servir_documento(request, documentos.recibo(pagamento))
+
+
+@user_passes_test(is_inquilino, login_url='login_inquilino')
+def declaracao_anual_pdf(request, ano):
+    """
+    Declaração das rendas pagas pelo inquilino num ano (para efeitos fiscais).
+    """
+    return _servir_documento(request, documentos.declaracao_anual(request.contexto_inquilino.inquilino, ano))
@@ -0,0 +1,34 @@
+"""
+Base comum das páginas do /admin/ para tabelas grandes.
+
+- show_full_result_count=False: o Django não conta a tabela inteira além do
+  resultado filtrado.
+- ContagemLimitada: o total filtrado só é contado até LIMITE_CONTAGEM linhas
+  (COUNT sobre um SELECT ... LIMIT), por isso uma listagem com milhões de
+  linhas não percorre a tabela toda para mostrar a primeira página. Acima do
+  limite, a listagem indica LIMITE_CONTAGEM resultados e só deixa navegar até
+  essa página; os filtros e a pesquisa encontram o resto.
+"""
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+LIMITE_CONTAGEM = 10000
+
+
+class ContagemLimitada(Paginator):
+
+    @cached_property
+    def count(self):
+        return self.object_list.order_by()[:LIMITE_CONTAGEM].count()
+
+
+class AdminEscalavel(admin.ModelAdmin):
+    """
+    ModelAdmin para modelos com muitas linhas. As subclasses devem ainda
+    indicar list_select_related (para o __str__ e as colunas das relações) e
+    usar raw_id_fields/autocomplete_fields em vez de listas de escolha.
+    """
+    paginator = ContagemLimitada
+    show_full_result_count = False
+    list_per_page = 50
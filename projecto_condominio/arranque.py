@@ -0,0 +1,61 @@
+"""
+Preparação dos workers no arranque (chamada em wsgi.py/asgi.py, só com
+settings.PREPARAR_NO_ARRANQUE).
+
+O primeiro pedido de um worker acabado de criar pagava a importação de todas
+as views (o URLconf só é carregado no primeiro resolve()) e a compilação dos
+templates que usa. aquecer() faz esse trabalho antes de o worker aceitar
+pedidos: com `gunicorn --preload` é feito uma só vez no processo principal e
+herdado pelos workers.
+
+`python manage.py medir_arranque` mede o efeito (tempo até ao primeiro
+pedido) e falha se piorar em relação à referência guardada.
+"""
+import os
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+from projecto_condominio.pesquisa import preparar_em_fundo
+
+
+def _templates():
+    for diretorio in settings.TEMPLATES[0]['DIRS']:
+        for raiz, _, ficheiros in os.walk(diretorio):
+            for nome in ficheiros:
+                if nome.endswith('.html'):
+                    yield os.path.relpath(os.path.join(raiz, nome), diretorio).replace(os.sep, '/')
+
+
+def aquecer():
+    """
+    Importa o URLconf (e com ele todas as views) e compila os templates do
+    projeto para a cache do loader. Devolve o número de templates carregados.
+    """
+    resolver = get_resolver()
+    # reverse_dict obriga o resolver a percorrer (e importar) todos os includes.
+    resolver.reverse_dict
+    carregados = 0
+    for nome in _templates():
+        try:
+            get_template(nome)
+        except (TemplateDoesNotExist, TemplateSyntaxError):
+            continue
+        carregados += 1
+    return carregados
+
+
+def preparar_worker():
+    """
+    Aquece o worker e constrói o índice da pesquisa em fundo, se
+    settings.PREPARAR_NO_ARRANQUE estiver ativo. Desligado, importar o
+    wsgi.py/asgi.py (testes, scripts, ferramentas) não tem efeitos e o
+    trabalho fica para o primeiro pedido. Devolve True se preparou.
+    """
+    if not settings.PREPARAR_NO_ARRANQUE:
+        return False
+    aquecer()
+    preparar_em_fundo()
+    return True
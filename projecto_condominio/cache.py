@@ -0,0 +1,244 @@
+"""
+Backend de cache partilhado entre processos, sem servidor externo.
+
+Guarda as entradas num ficheiro SQLite dedicado (separado do db.sqlite3 dos
+dados de negócio) em modo WAL, para que vários workers leiam em paralelo
+enquanto outro escreve. Quando o número de entradas passa MAX_ENTRIES, as
+entradas expiradas e as menos usadas recentemente (LRU) são removidas.
+"""
+
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache em ficheiro SQLite (WAL) com expiração e despejo LRU.
+
+    Uso em settings.CACHES:
+        "BACKEND": "projecto_condominio.cache.SQLiteCache",
+        "LOCATION": BASE_DIR / "cache.sqlite3",
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    # Só atualiza o instante de acesso (LRU) se tiver passado este intervalo,
+    # para que leituras repetidas da mesma chave não se tornem escritas.
+    ACCESS_RESOLUTION = 5.0
+
+    # Verifica o limite de entradas a cada N escritas, e não em todas.
+    CULL_CHECK_EVERY = 50
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = str(location)
+        self._local = threading.local()
+        self._writes = 0
+        self._schema_ready = False
+
+    # --- Ligação e esquema ---
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._schema_ready:
+                self._create_schema(conn)
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self, conn):
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entry ('
+            ' key TEXT PRIMARY KEY,'
+            ' value BLOB NOT NULL,'
+            ' expires REAL,'
+            ' accessed REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires)')
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed)')
+        self._schema_ready = True
+
+    def close(self, **kwargs):
+        # A ligação é reutilizada entre pedidos do mesmo thread; não é fechada
+        # no fim de cada pedido como as ligações à base de dados do Django.
+        pass
+
+    # --- Serialização ---
+
+    def _dumps(self, value):
+        return zlib.compress(pickle.dumps(value, self.pickle_protocol))
+
+    def _loads(self, data):
+        return pickle.loads(zlib.decompress(data))
+
+    def _expiry(self, timeout):
+        # Instante absoluto de expiração, ou None para "nunca expira".
+        return self.get_backend_timeout(timeout)
+
+    # --- API do BaseCache ---
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT value, expires, accessed FROM cache_entry WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            conn.execute('DELETE FROM cache_entry WHERE key = ? AND expires <= ?', (key, now))
+            return default
+        if now - accessed > self.ACCESS_RESOLUTION:
+            conn.execute('UPDATE cache_entry SET accessed = ? WHERE key = ?', (now, key))
+        return self._loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(key, value, self._expiry(timeout), mode='replace')
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write(key, value, self._expiry(timeout), mode='add')
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        # Numa só transação, como delete_many: mudar a versão de milhares de
+        # contextos de inquilinos (ver administrador/transferencia.py) não faz
+        # um commit por chave.
+        now = time.time()
+        expires = self._expiry(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), self._dumps(value), expires, now)
+            for key, value in data.items()
+        ]
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?)', rows
+            )
+            self._writes += len(rows)
+            if len(rows) >= self.CULL_CHECK_EVERY:
+                self._cull(conn, now)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._connection().execute(
+            'UPDATE cache_entry SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expiry(timeout), now, key, now),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        # Numa só transação: apagar milhares de chaves (por exemplo, os resumos
+        # de todos os contratos reajustados) não faz um commit por chave.
+        keys = [(self.make_and_validate_key(key, version=version),) for key in keys]
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('DELETE FROM cache_entry WHERE key = ?', keys)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        """
+        Incremento atómico entre processos: a leitura e a escrita correm na
+        mesma transação IMMEDIATE, que bloqueia outros escritores.
+        """
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT value FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            new_value = self._loads(row[0]) + delta
+            conn.execute(
+                'UPDATE cache_entry SET value = ?, accessed = ? WHERE key = ?',
+                (self._dumps(new_value), time.time(), key),
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return new_value
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entry')
+
+    # --- Escrita e despejo ---
+
+    def _write(self, key, value, expires, mode):
+        conn = self._connection()
+        now = time.time()
+        data = self._dumps(value)
+        if mode == 'add':
+            # Uma entrada expirada conta como ausente.
+            conn.execute('DELETE FROM cache_entry WHERE key = ? AND expires <= ?', (key, now))
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, data, expires, now),
+            )
+            written = cursor.rowcount == 1
+        else:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, data, expires, now),
+            )
+            written = True
+
+        self._writes += 1
+        if self._writes % self.CULL_CHECK_EVERY == 0:
+            self._cull(conn, now)
+        return written
+
+    def _cull(self, conn, now):
+        conn.execute('DELETE FROM cache_entry WHERE expires <= ?', (now,))
+        count = conn.execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            conn.execute('DELETE FROM cache_entry')
+            return
+        # Remove a fração 1/CULL_FREQUENCY menos usada recentemente.
+        conn.execute(
+            'DELETE FROM cache_entry WHERE key IN ('
+            ' SELECT key FROM cache_entry ORDER BY accessed LIMIT ?'
+            ')',
+            (count // self._cull_frequency,),
+        )
@@ -0,0 +1,408 @@
+"""
+Pesquisa global (prédios, casas e inquilinos) num índice em memória.
+
+Cada processo guarda um índice de prefixos: para cada âmbito (o de cada
+gerente e TODOS, o do administrador) uma lista ordenada de pares
+(palavra, documento). Os resultados de um prefixo são um intervalo contíguo
+da lista, encontrado por pesquisa binária, por isso uma pesquisa não percorre
+os documentos que não correspondem. Com vários termos, percorre-se o
+intervalo do termo mais raro e confirma-se os restantes em cada documento.
+
+O índice é construído no arranque do servidor (ver arranque.preparar_worker)
+ou no primeiro pedido, a partir de todas as bases de dados (incluindo os
+shards).
+Depois é atualizado aos poucos: os sinais de Predio, Casa, Inquilino, User e
+Gerente registam cada alteração, depois do commit, num diário na cache
+partilhada; antes de cada pesquisa, o processo lê as entradas que ainda não
+aplicou e recarrega só essas linhas. Se faltarem entradas (expiradas ou
+despejadas da cache) o índice é reconstruído.
+
+Se o servidor fizer fork dos workers depois do arranque (gunicorn
+--preload), cada worker fica com uma cópia do índice, mas não com a thread
+que o construía: o lock é recriado no filho e um índice que ficou a meio é
+construído de novo na primeira pesquisa.
+
+Os objetos com remoção agendada (ver remocao.ocultos) ficam fora do índice,
+como nas listagens: agendar a remoção regista a alteração, e o objeto sai
+do índice na sincronização seguinte (e volta se a remoção falhar).
+
+As atualizações em massa (QuerySet.update, bulk_create) não disparam
+sinais; quem as usa deve chamar registar_alteracao() ou
+pedir_reconstrucao().
+"""
+from bisect import bisect_left, insort
+from collections import namedtuple
+import os
+import re
+import threading
+import unicodedata
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from administrador.models import Gerente, Predio
+from gerente.models import Casa, Inquilino
+from . import remocao
+from .sharding import todas_as_bases
+
+# Âmbito do administrador (todos os documentos).
+TODOS = '*'
+
+LIMITE = 10
+
+PREFIXO = 'pesquisa'
+CHAVE_SEQUENCIA = f'{PREFIXO}:sequencia'
+
+# Entradas do diário: a partir deste número de alterações por aplicar é mais
+# rápido reconstruir o índice.
+MAXIMO_ALTERACOES = 5000
+VALIDADE_ALTERACOES = 24 * 60 * 60
+
+# `palavras` guarda as palavras indexadas numa única string (" rua das flores"),
+# para confirmar um prefixo com um só teste `" " + prefixo in palavras`.
+PALAVRA = re.compile(r'\w+')
+
+Documento = namedtuple('Documento', 'tipo id alias gerente_id texto detalhe predio_id palavras')
+
+
+def _normalizar(texto):
+    texto = texto or ''
+    if not texto.isascii():
+        texto = ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+    return texto.lower()
+
+
+def palavras(*textos):
+    """
+    Palavras (sem acentos, em minúsculas) dos textos, sem repetições.
+    """
+    return list(dict.fromkeys(PALAVRA.findall(_normalizar(' '.join(t for t in textos if t)))))
+
+
+def _juntar(lista):
+    return ' ' + ' '.join(lista)
+
+
+# --- Documentos ---
+
+def _documento_predio(alias, id, nome, localizacao, gerente_id):
+    return Documento(
+        'predio', id, alias, gerente_id, f'{nome} ({localizacao})', '', id, _juntar(palavras(nome, localizacao)),
+    )
+
+
+def _documento_casa(alias, id, numero, predio_id, predio_nome, gerente_id):
+    texto = f'Casa {numero} ({predio_nome})'
+    return Documento('casa', id, alias, gerente_id, texto, '', predio_id, _juntar(palavras(texto)))
+
+
+def _documento_inquilino(alias, id, username, first_name, last_name, contacto, gerente_id):
+    nome = f'{first_name} {last_name}'.strip() or username
+    # O contacto também é indexado só com os dígitos ("+351 912 345 678" ->
+    # "351912345678") e sem o indicativo do país (os últimos 9 dígitos).
+    digitos = re.sub(r'\D', '', contacto or '')
+    return Documento(
+        'inquilino', id, alias, gerente_id, nome, contacto, None,
+        _juntar(palavras(nome, username, contacto, digitos, digitos[-9:])),
+    )
+
+
+def _ler_predios(alias, **filtros):
+    linhas = (
+        Predio.objects.using(alias).filter(**filtros).exclude(id__in=remocao.ocultos('predio', alias))
+        .values_list('id', 'nome', 'localizacao', 'gerente_id')
+    )
+    return [_documento_predio(alias, *linha) for linha in linhas.iterator()]
+
+
+def _ler_casas(alias, **filtros):
+    # As casas de um prédio a remover também desaparecem.
+    linhas = (
+        Casa.objects.using(alias).filter(**filtros)
+        .exclude(id__in=remocao.ocultos('casa', alias))
+        .exclude(predio_id__in=remocao.ocultos('predio', alias))
+        .values_list('id', 'numero', 'predio_id', 'predio__nome', 'predio__gerente_id')
+    )
+    return [_documento_casa(alias, *linha) for linha in linhas.iterator()]
+
+
+def _ler_inquilinos(alias, **filtros):
+    linhas = (
+        Inquilino.objects.using(alias).filter(**filtros).exclude(id__in=remocao.ocultos('inquilino', alias))
+        .values_list('id', 'user__username', 'user__first_name', 'user__last_name', 'contacto', 'gerente_id')
+    )
+    return [_documento_inquilino(alias, *linha) for linha in linhas.iterator()]
+
+
+LEITORES = {'predio': _ler_predios, 'casa': _ler_casas, 'inquilino': _ler_inquilinos}
+
+
+# --- Índice ---
+
+class Indice:
+    """
+    Índice de prefixos de um processo. Todos os acessos passam pelo lock:
+    as pesquisas são curtas e as atualizações raras.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.documentos = {}
+        self.numeros = {}
+        self.entradas = {}
+        self.sequencia = None
+        self._proximo = 0
+        self._construindo = False
+
+    def _ambitos(self, documento):
+        if documento.gerente_id is None:
+            return [TODOS]
+        return [TODOS, documento.gerente_id]
+
+    def _remover(self, chave):
+        numero = self.numeros.pop(chave, None)
+        if numero is None:
+            return
+        documento = self.documentos.pop(numero)
+        for ambito in self._ambitos(documento):
+            entradas = self.entradas[ambito]
+            for palavra in documento.palavras.split():
+                posicao = bisect_left(entradas, (palavra, numero))
+                if posicao < len(entradas) and entradas[posicao] == (palavra, numero):
+                    del entradas[posicao]
+
+    def _acrescentar(self, documento, ordenar=True):
+        chave = (documento.alias, documento.tipo, documento.id)
+        self._remover(chave)
+        self._proximo += 1
+        numero = self._proximo
+        self.numeros[chave] = numero
+        self.documentos[numero] = documento
+        for ambito in self._ambitos(documento):
+            entradas = self.entradas.setdefault(ambito, [])
+            for palavra in documento.palavras.split():
+                if ordenar:
+                    insort(entradas, (palavra, numero))
+                else:
+                    entradas.append((palavra, numero))
+
+    def construir(self):
+        """
+        Lê prédios, casas e inquilinos de todas as bases e ordena as listas
+        uma única vez.
+        """
+        with self._lock:
+            # Lida antes das bases: alterações feitas durante a leitura são
+            # aplicadas (de novo) na sincronização seguinte.
+            sequencia = cache.get(CHAVE_SEQUENCIA, 0)
+            self._construindo = True
+            self.documentos, self.numeros, self.entradas, self._proximo = {}, {}, {}, 0
+            for alias in todas_as_bases():
+                for ler in LEITORES.values():
+                    for documento in ler(alias):
+                        self._acrescentar(documento, ordenar=False)
+            for entradas in self.entradas.values():
+                entradas.sort()
+            self.sequencia = sequencia
+            self._construindo = False
+
+    def depois_do_fork(self):
+        """
+        No processo filho de um fork. Só a thread que fez o fork existe no
+        filho: o lock pode ter ficado com uma thread que lá não existe (e
+        nunca seria libertado), e um índice a meio da construção nunca seria
+        acabado.
+        """
+        self._lock = threading.RLock()
+        if self._construindo:
+            self.sequencia = None
+            self._construindo = False
+
+    def _recarregar(self, alias, tipo, ids):
+        """
+        Volta a ler as linhas alteradas; as que já não existem saem do índice.
+        """
+        if tipo == 'utilizador':
+            # O User vive na base central; o inquilino pode estar em qualquer shard.
+            for base in todas_as_bases():
+                for documento in _ler_inquilinos(base, user_id__in=ids):
+                    self._acrescentar(documento)
+            return
+        if tipo == 'gerente':
+            # Os inquilinos de um gerente apagado ficam sem gerente (SET_NULL, sem sinais).
+            afetados = [d for d in self.documentos.values() if d.gerente_id in ids]
+            for documento in afetados:
+                self._recarregar(documento.alias, documento.tipo, [documento.id])
+            return
+
+        encontrados = LEITORES[tipo](alias, id__in=ids)
+        for id in set(ids) - {d.id for d in encontrados}:
+            self._remover((alias, tipo, id))
+        for documento in encontrados:
+            self._acrescentar(documento)
+        if tipo == 'predio':
+            # O nome e o gerente do prédio fazem parte dos documentos das casas;
+            # as casas de um prédio a remover saem do índice.
+            casas = _ler_casas(alias, predio_id__in=ids)
+            lidas = {d.id for d in casas}
+            predios = set(ids)
+            for documento in [d for d in self.documentos.values() if d.tipo == 'casa' and d.alias == alias]:
+                if documento.predio_id in predios and documento.id not in lidas:
+                    self._remover((alias, 'casa', documento.id))
+            for documento in casas:
+                self._acrescentar(documento)
+
+    def sincronizar(self):
+        """
+        Aplica as alterações registadas por qualquer processo desde a última
+        sincronização (ou constrói o índice, se ainda não existir).
+        """
+        with self._lock:
+            if self.sequencia is None:
+                self.construir()
+                return
+            atual = cache.get(CHAVE_SEQUENCIA, 0)
+            if atual == self.sequencia:
+                return
+            if atual < self.sequencia or atual - self.sequencia > MAXIMO_ALTERACOES:
+                # A cache foi limpa ou há demasiadas alterações.
+                self.construir()
+                return
+
+            chaves = [f'{PREFIXO}:alteracao:{n}' for n in range(self.sequencia + 1, atual + 1)]
+            alteracoes = cache.get_many(chaves)
+            aplicar = {}
+            for posicao, chave in enumerate(chaves):
+                if chave not in alteracoes:
+                    if any(c in alteracoes for c in chaves[posicao + 1:]):
+                        # Uma entrada perdida no meio do diário.
+                        self.construir()
+                        return
+                    # As últimas podem ainda não ter sido escritas.
+                    break
+                alias, tipo, ids = alteracoes[chave]
+                if tipo == TODOS:
+                    self.construir()
+                    return
+                aplicar.setdefault((alias, tipo), set()).update(ids)
+                self.sequencia = self.sequencia + 1
+            for (alias, tipo), ids in aplicar.items():
+                self._recarregar(alias, tipo, list(ids))
+
+    def pesquisar(self, termo, ambito, limite=LIMITE):
+        """
+        Documentos do âmbito que têm, para cada palavra do termo, uma palavra
+        que começa por ela.
+        """
+        termos = palavras(termo)
+        if not termos:
+            return []
+        with self._lock:
+            entradas = self.entradas.get(ambito, [])
+            intervalos = []
+            for palavra in termos:
+                inicio = bisect_left(entradas, (palavra,))
+                fim = bisect_left(entradas, (palavra + '\uffff',))
+                intervalos.append((fim - inicio, inicio, fim, palavra))
+            _, inicio, fim, mais_rara = min(intervalos)
+            restantes = [' ' + p for p in termos if p != mais_rara]
+
+            resultados, vistos = [], set()
+            for posicao in range(inicio, fim):
+                numero = entradas[posicao][1]
+                if numero in vistos:
+                    continue
+                vistos.add(numero)
+                documento = self.documentos[numero]
+                if all(r in documento.palavras for r in restantes):
+                    resultados.append(documento)
+                    if len(resultados) >= limite:
+                        break
+            return resultados
+
+
+indice = Indice()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=indice.depois_do_fork)
+
+
+def pesquisar(termo, ambito, limite=LIMITE):
+    indice.sincronizar()
+    return indice.pesquisar(termo, ambito, limite)
+
+
+def preparar_em_fundo():
+    """
+    Constrói o índice numa thread, para que o arranque do servidor não
+    espere por ele. Uma pesquisa feita entretanto espera pelo fim.
+    """
+    def construir():
+        try:
+            indice.sincronizar()
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=construir, name='indice-pesquisa', daemon=True).start()
+
+
+# --- Diário de alterações ---
+
+def _publicar(alias, tipo, ids):
+    cache.add(CHAVE_SEQUENCIA, 0, timeout=None)
+    try:
+        numero = cache.incr(CHAVE_SEQUENCIA)
+    except ValueError:
+        # A sequência foi despejada entre o add() e o incr(): os processos reconstroem.
+        cache.add(CHAVE_SEQUENCIA, 0, timeout=None)
+        return
+    cache.set(f'{PREFIXO}:alteracao:{numero}', (alias, tipo, list(ids)), timeout=VALIDADE_ALTERACOES)
+
+
+def registar_alteracao(alias, tipo, ids):
+    """
+    Regista, depois do commit, que as linhas `ids` de `tipo` ('predio',
+    'casa', 'inquilino', 'utilizador' ou 'gerente') mudaram na base `alias`.
+    """
+    transaction.on_commit(lambda: _publicar(alias, tipo, ids), using=alias)
+
+
+def pedir_reconstrucao():
+    """
+    Todos os processos reconstroem o índice na próxima pesquisa.
+    """
+    _publicar(None, TODOS, [])
+
+
+@receiver(post_save, sender=Predio)
+@receiver(post_delete, sender=Predio)
+def _predio_alterado(sender, instance, using, **kwargs):
+    registar_alteracao(using, 'predio', [instance.pk])
+
+
+@receiver(post_save, sender=Casa)
+@receiver(post_delete, sender=Casa)
+def _casa_alterada(sender, instance, using, **kwargs):
+    registar_alteracao(using, 'casa', [instance.pk])
+
+
+@receiver(post_save, sender=Inquilino)
+@receiver(post_delete, sender=Inquilino)
+def _inquilino_alterado(sender, instance, using, **kwargs):
+    registar_alteracao(using, 'inquilino', [instance.pk])
+
+
+@receiver(post_save, sender=User)
+def _utilizador_alterado(sender, instance, using, **kwargs):
+    # As cópias nos shards (replicar_para_shards) não contam.
+    if using == 'default':
+        registar_alteracao(using, 'utilizador', [instance.pk])
+
+
+@receiver(post_delete, sender=Gerente)
+def _gerente_apagado(sender, instance, using, **kwargs):
+    if using == 'default':
+        registar_alteracao(using, 'gerente', [instance.pk])
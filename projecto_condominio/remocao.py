@@ -0,0 +1,387 @@
+"""
+Remoção em massa de prédios, casas, inquilinos e gerentes.
+
+O delete() do Django lê para memória todas as linhas dependentes (casas,
+contratos, pagamentos, manutenções...) para disparar os sinais e seguir as
+cascatas, e mantém a base de dados bloqueada para escrita até ao fim. Aqui a
+cascata é planeada a partir dos metadados dos modelos, como no Collector do
+Django, mas sem ler as linhas:
+
+- cada modelo dependente é apagado, das folhas para a raiz, com
+  DELETE ... WHERE id IN (SELECT id ... LIMIT lote), um lote por transação;
+- as relações SET_NULL são anuladas por lotes (UPDATE) antes de as linhas
+  referidas desaparecerem;
+- uma relação PROTECT com linhas impede a remoção (ProtectedError) antes de
+  se apagar o que quer que seja;
+- as fotos e as transições das manutenções, que não têm restrição na base de
+  dados, também são apagadas.
+
+Os efeitos dos sinais que assim não correm (disponibilidade dos inquilinos,
+índice de pesquisa, contexto dos inquilinos em cache, ficheiros das fotos,
+ocupações e versão das casas) são aplicados aqui. Os resumos financeiros em
+cache dos contratos apagados não são invalidados: os ids não voltam a ser
+usados e as entradas expiram.
+
+Uma remoção interrompida pode ser repetida: cada passo apaga o que resta.
+
+Remoção adiada: agendar() regista uma Remocao pendente, as listagens deixam
+logo de mostrar o objeto e o que depende dele (ver ocultos() e visiveis())
+e a remoção física corre numa thread do processo ou, com
+REMOCOES_EM_FUNDO = False, no comando `python manage.py remover_em_massa
+--pendentes`.
+
+O cron com `remover_em_massa --pendentes` é necessário mesmo com
+REMOCOES_EM_FUNDO: a thread perde-se se o worker for reciclado ou terminar
+antes de acabar, e a remoção ficaria pendente (ou a meio) para sempre. Quem
+executa uma remoção reclama-a primeiro com um UPDATE condicional (ver
+reclamar()), por isso a thread e o cron nunca executam a mesma ao mesmo
+tempo; uma remoção em curso sem atividade há ABANDONADA_APOS é dada como
+abandonada e volta a poder ser reclamada.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import partial
+import logging
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, close_old_connections, connections, router, transaction
+from django.db.models import CASCADE, DO_NOTHING, PROTECT, RESTRICT, SET_NULL, F, ProtectedError, Q, Value
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from administrador.models import Gerente, Predio, Remocao
+from gerente.disponibilidade import atualizar_disponibilidade
+from gerente.fotos import apagar_ficheiros_sem_uso
+from gerente.models import (
+    Casa, Contratos, FotoManutencao, Inquilino, Manutencao, ManutencaoArquivo, Ocupacao, TransicaoManutencao,
+)
+from inquilino.contexto import invalidar_contextos, invalidar_contextos_de_inquilinos
+from . import pesquisa
+from .sharding import PREFIXO, usar_gerente
+
+# Linhas por instrução (e por transação).
+LOTE = 1000
+# Repetições se uma linha dependente for criada a meio da remoção.
+TENTATIVAS = 3
+
+MODELOS = {'predio': Predio, 'casa': Casa, 'inquilino': Inquilino, 'gerente': Gerente}
+
+# Remoções que ainda escondem o objeto das listagens.
+EM_ABERTO = ('pendente', 'em_curso')
+
+# Uma remoção em curso sem atividade há mais do que isto (cada lote grava o
+# progresso) foi interrompida e pode ser retomada.
+ABANDONADA_APOS = timedelta(minutes=15)
+
+# Ligadas à manutenção só pelo id (continuam ligadas depois de arquivada).
+DEPENDENTES_SEM_RESTRICAO = {
+    Manutencao: [FotoManutencao, TransicaoManutencao],
+    ManutencaoArquivo: [FotoManutencao, TransicaoManutencao],
+}
+
+TIPOS_PESQUISA = {Predio: 'predio', Casa: 'casa', Inquilino: 'inquilino', Gerente: 'gerente'}
+
+# acao: 'apagar' (DELETE por lotes) ou 'anular' (UPDATE campo = NULL por lotes).
+Passo = namedtuple('Passo', 'acao queryset campo')
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='remocoes')
+
+
+def descrever(passo):
+    nome = passo.queryset.model._meta.label_lower
+    return f'{nome}.{passo.campo} = NULL' if passo.acao == 'anular' else nome
+
+
+def planear(queryset):
+    """
+    Passos, das folhas para a raiz, para apagar as linhas de `queryset` e
+    tudo o que depende delas. Levanta ProtectedError se alguma linha for
+    referida por uma relação PROTECT.
+    """
+    passos = []
+    _planear(queryset.order_by(), passos)
+    return passos
+
+
+def _planear(queryset, passos):
+    alias = queryset.db
+    for relacao in get_candidate_relations_to_delete(queryset.model._meta):
+        campo = relacao.field
+        on_delete = campo.remote_field.on_delete
+        if on_delete is DO_NOTHING:
+            continue
+        relacionados = relacao.related_model._base_manager.using(alias).filter(**{f'{campo.name}__in': queryset})
+        if on_delete is CASCADE:
+            _planear(relacionados, passos)
+        elif on_delete is SET_NULL:
+            passos.append(Passo('anular', relacionados, campo.name))
+        elif on_delete in (PROTECT, RESTRICT):
+            protegidos = list(relacionados[:10])
+            if protegidos:
+                raise ProtectedError(
+                    f'Existem {relacao.related_model._meta.verbose_name_plural} associados a '
+                    f'{queryset.model._meta.verbose_name}.',
+                    protegidos,
+                )
+        else:
+            raise ValueError(f'on_delete não suportado na remoção em massa: {campo}')
+    for dependente in DEPENDENTES_SEM_RESTRICAO.get(queryset.model, []):
+        passos.append(Passo(
+            'apagar', dependente._base_manager.using(alias).filter(manutencao_id__in=queryset.values('pk')), None,
+        ))
+    passos.append(Passo('apagar', queryset, None))
+
+
+def contar(passos):
+    """
+    [(passo, linhas)] antes de começar (uma linha pode contar em mais de um
+    passo, por exemplo uma manutenção de uma casa do prédio).
+    """
+    return [(descrever(passo), passo.queryset.count()) for passo in passos]
+
+
+def _ao_anular(model, campo):
+    """
+    Valores gravados juntamente com o NULL, como fariam save() e os sinais.
+    """
+    if model is Casa:
+        # Uma atribuição em curso (gerente/atribuicao.py) deteta a mudança.
+        return {'versao': F('versao') + 1}
+    if model is Ocupacao and campo == 'inquilino':
+        # Como fechar_ocupacoes_do_inquilino: a ocupação atual termina hoje.
+        return {'data_fim': Coalesce(F('data_fim'), Value(date.today()))}
+    return {}
+
+
+def _utilizadores(alias, inquilino_ids):
+    return list(Inquilino.objects.using(alias).filter(id__in=inquilino_ids).values_list('user_id', flat=True))
+
+
+def _preparar_efeitos(passos):
+    """
+    Lê, antes de apagar, o que os sinais precisariam e devolve as funções a
+    chamar no fim.
+    """
+    efeitos = []
+    for passo in passos:
+        if passo.acao != 'apagar':
+            continue
+        queryset, alias, model = passo.queryset, passo.queryset.db, passo.queryset.model
+        if model is Contratos:
+            # Como libertar_inquilino_do_contrato.
+            ativos = set(queryset.filter(estado='ativo').values_list('inquilino_id', flat=True))
+            efeitos.append(partial(atualizar_disponibilidade, ativos, using=alias))
+        if model in (Contratos, Casa):
+            utilizadores = _utilizadores(alias, queryset.values('inquilino_id'))
+            efeitos.append(partial(invalidar_contextos, utilizadores, using=alias))
+        elif model is Inquilino:
+            efeitos.append(partial(invalidar_contextos, list(queryset.values_list('user_id', flat=True)), using=alias))
+        if model in TIPOS_PESQUISA:
+            ids = list(queryset.values_list('pk', flat=True))
+            efeitos.append(partial(pesquisa.registar_alteracao, alias, TIPOS_PESQUISA[model], ids))
+        if model is FotoManutencao:
+            for sha256 in set(queryset.values_list('sha256', flat=True)):
+                efeitos.append(partial(apagar_ficheiros_sem_uso, sha256))
+    return efeitos
+
+
+def _lote(passo, lote):
+    queryset = passo.queryset
+    alias, model = queryset.db, queryset.model
+    proximas = queryset.values('pk')[:lote]
+    if passo.acao == 'anular':
+        return model._base_manager.using(alias).filter(pk__in=proximas).update(
+            **{passo.campo: None}, **_ao_anular(model, passo.campo)
+        )
+    ligacao = connections[alias]
+    subconsulta, parametros = proximas.query.get_compiler(using=alias).as_sql()
+    tabela = ligacao.ops.quote_name(model._meta.db_table)
+    chave = ligacao.ops.quote_name(model._meta.pk.column)
+    with transaction.atomic(using=alias), ligacao.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {tabela} WHERE {chave} IN ({subconsulta})', parametros)
+        return cursor.rowcount
+
+
+def _executar(passos, lote, progresso, total):
+    for passo in passos:
+        while True:
+            linhas = _lote(passo, lote)
+            if not linhas:
+                break
+            total += linhas
+            if progresso:
+                progresso(descrever(passo), total)
+    return total
+
+
+def _gerente_da_base(alias):
+    return int(alias[len(PREFIXO):]) if alias.startswith(PREFIXO) else None
+
+
+def remover(modelo, ids, using='default', lote=LOTE, progresso=None):
+    """
+    Apaga os objetos `ids` de `modelo` ('predio', 'casa', 'inquilino' ou
+    'gerente') e tudo o que depende deles; os utilizadores dos inquilinos e
+    dos gerentes também são apagados. progresso(passo, linhas), se indicado,
+    é chamado depois de cada lote. Devolve o número de linhas apagadas ou
+    atualizadas.
+    """
+    raiz = MODELOS[modelo]._base_manager.using(using).filter(pk__in=ids)
+    utilizadores = list(raiz.values_list('user_id', flat=True)) if modelo in ('inquilino', 'gerente') else []
+    total = 0
+    efeitos = []
+    # As funções dos sinais (disponibilidade, fotos) usam o router: o
+    # trabalho corre no portfólio do gerente dono da base.
+    with usar_gerente(_gerente_da_base(using)):
+        for tentativa in range(TENTATIVAS):
+            passos = planear(raiz)
+            efeitos.extend(_preparar_efeitos(passos))
+            try:
+                total = _executar(passos, lote, progresso, total)
+                break
+            except IntegrityError:
+                # Uma linha dependente criada entretanto: volta a planear.
+                if tentativa == TENTATIVAS - 1:
+                    raise
+        for efeito in efeitos:
+            efeito()
+    if utilizadores:
+        # Grupos e permissões do utilizador são poucas linhas: passam pelo delete() normal.
+        User.objects.filter(pk__in=utilizadores).delete()
+    return total
+
+
+# --- Remoções agendadas ---
+
+def agendar(modelo, objeto, pedida_por=None):
+    """
+    Esconde o objeto das listagens e regista a remoção. Com
+    REMOCOES_EM_FUNDO (predefinição), a remoção começa depois do commit numa
+    thread do processo.
+    """
+    remocao = Remocao.objects.using('default').create(
+        modelo=modelo,
+        objeto_id=objeto.pk,
+        base=router.db_for_write(type(objeto)) or 'default',
+        descricao=str(objeto)[:255],
+        pedida_por=pedida_por,
+    )
+    # Tira o objeto do índice de pesquisa e dos contextos em cache, como das listagens.
+    pesquisa.registar_alteracao(remocao.base, modelo, [objeto.pk])
+    _invalidar_contextos(modelo, objeto.pk, remocao.base)
+    if getattr(settings, 'REMOCOES_EM_FUNDO', True):
+        transaction.on_commit(lambda: _executor.submit(_processar_em_fundo, remocao.pk))
+    return remocao
+
+
+def ocultos(modelo, using=None):
+    """
+    Ids dos objetos de `modelo` com remoção pendente ou em curso (na base
+    `using`, por omissão a do pedido atual), para as listagens os excluírem.
+    """
+    using = using or router.db_for_write(MODELOS[modelo]) or 'default'
+    # Sempre da base principal: uma remoção acabada de pedir ainda não está na réplica.
+    return list(
+        Remocao.objects.using('default')
+        .filter(modelo=modelo, estado__in=EM_ABERTO, base=using)
+        .values_list('objeto_id', flat=True)
+    )
+
+
+def visiveis(queryset, **caminhos):
+    """
+    `queryset` sem as linhas ligadas a objetos com remoção pendente ou em
+    curso. Cada argumento indica o tipo do objeto e o caminho até ele, por
+    exemplo as manutenções que não são de um prédio nem de uma casa a
+    remover:
+
+        visiveis(Manutencao.objects.filter(gerente=gerente), predio='predio', casa='casa')
+    """
+    for modelo, caminho in caminhos.items():
+        ids = ocultos(modelo)
+        if ids:
+            queryset = queryset.exclude(**{f'{caminho}__in': ids})
+    return queryset
+
+
+def _invalidar_contextos(modelo, objeto_id, alias):
+    """
+    Os inquilinos das casas do prédio (ou da casa) deixam de ver a casa no
+    contexto em cache, ou voltam a vê-la se a remoção falhar.
+    """
+    casas = Casa.objects.using(alias)
+    if modelo == 'predio':
+        casas = casas.filter(predio_id=objeto_id)
+    elif modelo == 'casa':
+        casas = casas.filter(pk=objeto_id)
+    else:
+        return
+    invalidar_contextos_de_inquilinos(list(casas.values_list('inquilino_id', flat=True)), using=alias)
+
+
+def _livres():
+    return Q(estado='pendente') | Q(
+        Q(atividade_em__isnull=True) | Q(atividade_em__lt=timezone.now() - ABANDONADA_APOS), estado='em_curso'
+    )
+
+
+def por_processar():
+    """
+    Remoções pendentes e as em curso que foram abandonadas, por ordem de pedido.
+    """
+    return Remocao.objects.using('default').filter(_livres()).order_by('pedida_em')
+
+
+def reclamar(remocao):
+    """
+    Passa a remoção a 'em_curso' se ainda estiver livre (pendente ou
+    abandonada), com um único UPDATE condicional: de dois processos que a
+    tentem reclamar, só um consegue. Devolve True se a reclamou.
+    """
+    return bool(
+        Remocao.objects.using('default')
+        .filter(_livres(), pk=remocao.pk)
+        .update(estado='em_curso', erro='', atividade_em=timezone.now())
+    )
+
+
+def processar(remocao, lote=LOTE, progresso=None):
+    """
+    Executa uma remoção agendada, com o progresso gravado na própria Remocao
+    (linhas e passo). Uma remoção que falhe fica em 'falhou', com o erro, e o
+    objeto volta a aparecer nas listagens. Devolve None, sem fazer nada, se
+    outro processo já a estiver a executar.
+    """
+    if not reclamar(remocao):
+        return None
+    registos = Remocao.objects.using('default').filter(pk=remocao.pk)
+
+    def registar(passo, linhas):
+        registos.update(passo=passo[:100], linhas=linhas, atividade_em=timezone.now())
+        if progresso:
+            progresso(passo, linhas)
+
+    try:
+        linhas = remover(remocao.modelo, [remocao.objeto_id], remocao.base, lote, registar)
+    except Exception as erro:
+        registos.update(estado='falhou', erro=str(erro))
+        # O objeto volta às listagens, ao índice de pesquisa e aos contextos.
+        pesquisa.registar_alteracao(remocao.base, remocao.modelo, [remocao.objeto_id])
+        _invalidar_contextos(remocao.modelo, remocao.objeto_id, remocao.base)
+        raise
+    registos.update(estado='concluida', passo='', linhas=linhas, concluida_em=timezone.now())
+    return linhas
+
+
+def _processar_em_fundo(remocao_id):
+    try:
+        processar(Remocao.objects.using('default').get(pk=remocao_id))
+    except Exception:
+        logger.exception('Falha na remoção em massa %s.', remocao_id)
+    finally:
+        close_old_connections()
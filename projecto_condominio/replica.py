@@ -0,0 +1,191 @@
+"""
+Leituras de relatórios e listagens numa réplica só de leitura.
+
+A réplica ('replica' em settings.DATABASES) é uma cópia do db.sqlite3 feita
+com a API de backup online do SQLite pelo comando `atualizar_replica`. As
+views marcadas com @leitura_em_replica leem da réplica, exceto quando o
+utilizador escreveu algo depois da última atualização da cópia: nesse caso
+continuam a ler da base principal até a réplica apanhar a escrita
+(leitura das próprias escritas, "sticky-after-write").
+
+A réplica só é usada se estiver em condições (ver replica_utilizavel()):
+- não pode ser mais antiga do que settings.REPLICA_IDADE_MAXIMA (se o
+  atualizar_replica parar, as leituras voltam todas à base principal em vez
+  de mostrarem dados cada vez mais atrasados);
+- tem de ter todas as migrações aplicadas na base principal (depois de um
+  migrate, até à cópia seguinte, o esquema da réplica está atrasado e as
+  consultas falhariam com colunas ou tabelas em falta).
+Em ambos os casos fica um aviso no log.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+ALIAS = 'replica'
+
+# Instante da última escrita do utilizador, guardado na sessão.
+CHAVE_ULTIMA_ESCRITA = 'ultima_escrita'
+
+# Idade máxima da réplica (segundos), se não estiver em settings.REPLICA_IDADE_MAXIMA.
+IDADE_MAXIMA = 5 * 60
+# Intervalo (segundos) entre comparações das migrações com a mesma cópia da
+# réplica: um migrate na base principal é detetado ao fim deste tempo.
+VERIFICAR_MIGRACOES_A_CADA = 60
+
+logger = logging.getLogger(__name__)
+
+_ler_da_replica = ContextVar('ler_da_replica', default=False)
+
+# Última comparação das migrações: (instante da réplica, quando, resultado).
+_verificacao = (None, 0.0, False)
+_verificacao_lock = threading.Lock()
+# Instante da réplica para a qual já foi registado o aviso de atraso.
+_avisada = None
+
+
+def instante_da_replica():
+    """
+    Instante (epoch) da última atualização da réplica, ou None se não existir.
+    """
+    config = settings.DATABASES.get(ALIAS)
+    if not config:
+        return None
+    try:
+        return os.path.getmtime(config['NAME'])
+    except OSError:
+        return None
+
+
+def _migracoes(alias):
+    return set(MigrationRecorder(connections[alias]).applied_migrations())
+
+
+def _esquema_em_dia(instante):
+    """
+    True se a réplica (a cópia de `instante`) tem todas as migrações da base
+    principal. O resultado é reutilizado durante VERIFICAR_MIGRACOES_A_CADA.
+    """
+    global _verificacao
+    agora = time.monotonic()
+    with _verificacao_lock:
+        verificada, quando, em_dia = _verificacao
+    if verificada == instante and agora - quando < VERIFICAR_MIGRACOES_A_CADA:
+        return em_dia
+    em_falta = _migracoes('default') - _migracoes(ALIAS)
+    em_dia = not em_falta
+    if not em_dia and verificada != instante:
+        logger.warning(
+            'A réplica não tem %d migrações da base principal (por exemplo %s.%s): as leituras ficam na '
+            'base principal até à próxima cópia.', len(em_falta), *min(em_falta),
+        )
+    with _verificacao_lock:
+        _verificacao = (instante, agora, em_dia)
+    return em_dia
+
+
+def replica_utilizavel():
+    """
+    Instante da réplica se as leituras a podem usar: existe, não é mais
+    antiga do que REPLICA_IDADE_MAXIMA e tem o esquema da base principal.
+    Senão, None.
+    """
+    global _avisada
+    instante = instante_da_replica()
+    if instante is None:
+        return None
+    idade = time.time() - instante
+    if idade > getattr(settings, 'REPLICA_IDADE_MAXIMA', IDADE_MAXIMA):
+        if _avisada != instante:
+            _avisada = instante
+            logger.warning(
+                'A réplica tem %.0f s (o atualizar_replica parou?): as leituras ficam na base principal.', idade
+            )
+        return None
+    if not _esquema_em_dia(instante):
+        return None
+    return instante
+
+
+@contextmanager
+def em_replica():
+    """
+    Lê da réplica dentro do bloco (por exemplo, num comando de gestão só de
+    leitura). Sem réplica utilizável, o bloco corre na base principal.
+    """
+    token = _ler_da_replica.set(replica_utilizavel() is not None)
+    try:
+        yield
+    finally:
+        _ler_da_replica.reset(token)
+
+
+def leitura_em_replica(view):
+    """
+    Decorador para views só de leitura (dashboards, relatórios, listagens).
+    """
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        replica = replica_utilizavel()
+        ultima_escrita = request.session.get(CHAVE_ULTIMA_ESCRITA, 0)
+        usar = replica is not None and ultima_escrita < replica
+        token = _ler_da_replica.set(usar)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _ler_da_replica.reset(token)
+    return _view
+
+
+class ReplicaRouter:
+    """
+    Envia as leituras para a réplica quando o pedido atual o permite.
+    As escritas vão sempre para a base principal.
+    """
+
+    # Sessões, permissões, etc. são sempre lidas da base principal.
+    APPS = {'administrador', 'gerente', 'inquilino'}
+
+    def db_for_read(self, model, **hints):
+        if _ler_da_replica.get() and model._meta.app_label in self.APPS:
+            return ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # A réplica é uma cópia da 'default': as relações entre as duas são válidas.
+        bases = {obj1._state.db, obj2._state.db}
+        if bases <= {'default', ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # O esquema chega à réplica com a própria cópia.
+        if db == ALIAS:
+            return False
+        return None
+
+
+class RegistoDeEscritasMiddleware:
+    """
+    Regista na sessão o instante dos pedidos que alteram dados (POST), para
+    que as leituras seguintes do mesmo utilizador vejam essas alterações.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method == 'POST' and hasattr(request, 'session'):
+            request.session[CHAVE_ULTIMA_ESCRITA] = time.time()
+        return response
@@ -40,6 +40,9 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "projecto_condominio.sharding.ShardMiddleware",
+    "projecto_condominio.replica.RegistoDeEscritasMiddleware",
+    "inquilino.contexto.ContextoInquilinoMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -73,9 +76,67 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+    },
+    # Cópia só de leitura para relatórios e listagens, atualizada com
+    # `python manage.py atualizar_replica` (ver projecto_condominio/replica.py).
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "replica.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    },
+}
+
+# Bases de dados por gerente (ver projecto_condominio/sharding.py).
+# Cada ficheiro gerente_<id>.sqlite3 nesta pasta é registado como um shard.
+SHARDS_DIR = BASE_DIR / "shards"
+if SHARDS_DIR.is_dir():
+    for _shard in sorted(SHARDS_DIR.glob("gerente_*.sqlite3")):
+        DATABASES[_shard.stem] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": _shard,
+        }
+
+# Idade máxima (segundos) da réplica: mais antiga do que isto, as leituras
+# voltam à base principal e fica um aviso no log.
+REPLICA_IDADE_MAXIMA = 5 * 60
+
+DATABASE_ROUTERS = [
+    "projecto_condominio.sharding.PortfolioRouter",
+    "projecto_condominio.replica.ReplicaRouter",
+]
+
+
+# Cache
+# Partilhada entre todos os processos através de um ficheiro SQLite próprio,
+# separado do db.sqlite3, para não competir com as escritas de negócio.
+CACHES = {
+    "default": {
+        "BACKEND": "projecto_condominio.cache.SQLiteCache",
+        "LOCATION": BASE_DIR / "cache.sqlite3",
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "MAX_ENTRIES": 50000,
+            "CULL_FREQUENCY": 4,
+        },
     }
 }
 
+# Sessões lidas da cache; a base de dados só é usada nas escritas e quando
+# a sessão não está em cache.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Tempo (segundos) que o contexto do inquilino (inquilino, casa e contrato
+# ativo, ver inquilino/contexto.py) fica em cache entre pedidos; 0 desliga.
+CONTEXTO_INQUILINO_TIMEOUT = 60 * 60
+
+# Limites das tentativas de login (ver projecto_condominio/throttling.py).
+# As chaves omitidas usam os valores predefinidos desse módulo.
+LOGIN_THROTTLE = {
+    "UTILIZADOR_CAPACIDADE": 5,
+    "UTILIZADOR_POR_MINUTO": 2,
+    "BACKOFF_MAXIMO": 15 * 60,
+}
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -112,6 +173,47 @@ STATICFILES_DIRS = [
 # Quando fizer collectstatic para produção, os ficheiros vão aqui
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
+# Recibos e declarações anuais em PDF (ver inquilino/documentos.py): cache em
+# disco endereçada pelo conteúdo, o seu tamanho máximo (os ficheiros usados
+# há mais tempo são apagados) e número de processos que geram os ficheiros.
+DOCUMENTOS_DIR = BASE_DIR / "documentos"
+DOCUMENTOS_LIMITE = 500 * 1024 * 1024
+DOCUMENTOS_WORKERS = 2
+
+# Ficheiros enviados pelos utilizadores (fotos das manutenções, ver
+# gerente/fotos.py). Não são servidos publicamente: passam por uma view
+# que verifica as permissões.
+MEDIA_ROOT = BASE_DIR / "media"
+
+# Remoções de prédios, casas, inquilinos e gerentes (ver
+# projecto_condominio/remocao.py): com True são executadas numa thread do
+# processo logo depois do pedido; com False ficam escondidas das listagens
+# até o comando `remover_em_massa --pendentes` (cron) as executar. O cron é
+# necessário nos dois casos: retoma as remoções cuja thread se perdeu quando
+# o worker foi reciclado.
+REMOCOES_EM_FUNDO = True
+
+# Emails das notificações (ver inquilino/notificacoes.py), enviados em lote
+# pelo comando `enviar_notificacoes` (cron). Em desenvolvimento ficam em
+# ficheiros em EMAIL_FILE_PATH; em produção, usar o backend SMTP
+# (django.core.mail.backends.smtp.EmailBackend e EMAIL_HOST/EMAIL_PORT).
+EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+EMAIL_FILE_PATH = BASE_DIR / "emails"
+DEFAULT_FROM_EMAIL = "condominio@localhost"
+
+# Com True, o wsgi.py/asgi.py aquece as views e os templates e constrói o
+# índice da pesquisa ao ser importado (ver projecto_condominio/arranque.py).
+# Em produção, ativar com DJANGO_PREPARAR_NO_ARRANQUE=1 (de preferência com
+# `gunicorn --preload`); desligado, importar o módulo não tem efeitos.
+PREPARAR_NO_ARRANQUE = os.environ.get("DJANGO_PREPARAR_NO_ARRANQUE") == "1"
+
+# Tempos de arranque de referência (python manage.py medir_arranque
+# --guardar-referencia). Dependem da máquina, por isso não estão no git.
+ARRANQUE_REFERENCIA = BASE_DIR / "arranque_referencia.json"
+
+# O mesmo para os cálculos de datas (python manage.py medir_calculos).
+CALCULOS_REFERENCIA = BASE_DIR / "calculos_referencia.json"
+
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
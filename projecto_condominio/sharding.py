@@ -0,0 +1,195 @@
+"""
+Divisão opcional dos dados por gerente (um ficheiro SQLite por portfólio).
+
+Cada gerente pode ter a sua própria base de dados em SHARDS_DIR
+(gerente_<id>.sqlite3) com os modelos do portfólio: Predio, Casa, Inquilino,
+Contratos, Manutencao (fotos, transições e tempos de resolução), Ocupacao e PagamentoRenda (e os arquivos). Os utilizadores, grupos,
+sessões e perfis de Gerente ficam na base de dados central ('default'); cada
+shard guarda apenas cópias das linhas centrais que o seu portfólio referencia,
+para que as chaves estrangeiras continuem válidas no SQLite.
+
+Enquanto não existir nenhum shard, o router não escolhe base de dados e tudo
+continua a correr na 'default'. Os shards são criados pelo comando
+`python manage.py dividir_por_gerente`.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+PREFIXO = 'gerente_'
+
+MODELOS_DO_PORTFOLIO = {
+    'administrador.predio',
+    'gerente.casa',
+    'gerente.inquilino',
+    'gerente.contratos',
+    'gerente.manutencao',
+    'gerente.manutencaoarquivo',
+    'gerente.fotomanutencao',
+    'gerente.transicaomanutencao',
+    'gerente.resolucaodiaria',
+    'gerente.ocupacao',
+    'inquilino.pagamentorenda',
+    'inquilino.pagamentorendaarquivo',
+}
+
+# Gerente cujo portfólio está a ser usado no pedido/tarefa atual.
+gerente_atual = ContextVar('gerente_atual', default=None)
+
+
+def alias_do_gerente(gerente_id):
+    return f'{PREFIXO}{gerente_id}'
+
+
+def shards_configurados():
+    return [alias for alias in settings.DATABASES if alias.startswith(PREFIXO)]
+
+
+def todas_as_bases():
+    return ['default'] + shards_configurados()
+
+
+def tem_base_propria(gerente_id):
+    return alias_do_gerente(gerente_id) in settings.DATABASES
+
+
+def gerentes_com_base_propria():
+    return [int(alias[len(PREFIXO):]) for alias in shards_configurados()]
+
+
+def registar_shard(gerente_id):
+    """
+    Acrescenta (em tempo de execução) a base de dados de um gerente às
+    configurações, com as mesmas opções da 'default'.
+    """
+    alias = alias_do_gerente(gerente_id)
+    if alias not in settings.DATABASES:
+        config = dict(connections.settings['default'])
+        config['NAME'] = settings.SHARDS_DIR / f'{alias}.sqlite3'
+        settings.DATABASES[alias] = config
+        connections.settings[alias] = config
+    return alias
+
+
+@contextmanager
+def usar_gerente(gerente_id):
+    """
+    Executa o bloco no portfólio de um gerente:
+
+        with usar_gerente(gerente.id):
+            Casa.objects.filter(...)
+    """
+    token = gerente_atual.set(gerente_id)
+    try:
+        yield
+    finally:
+        gerente_atual.reset(token)
+
+
+def em_todas_as_bases(queryset):
+    """
+    Avalia o mesmo queryset na base central e em cada shard e junta os
+    resultados numa lista (agregação entre shards para o administrador).
+    """
+    # A parte central fica a cargo dos routers (pode ser lida da réplica).
+    resultado = list(queryset)
+    for alias in shards_configurados():
+        resultado.extend(queryset.using(alias))
+    return resultado
+
+
+class PortfolioRouter:
+    """
+    Envia os modelos do portfólio para o shard do gerente atual, se existir.
+    """
+
+    def _shard(self, model):
+        if model._meta.label_lower not in MODELOS_DO_PORTFOLIO:
+            return None
+        gerente_id = gerente_atual.get()
+        if gerente_id is None:
+            return None
+        alias = alias_do_gerente(gerente_id)
+        return alias if alias in settings.DATABASES else None
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Os shards têm cópias das linhas centrais que referenciam.
+        if shards_configurados():
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Os shards têm o esquema completo (as tabelas centrais guardam as cópias).
+        return None
+
+
+class ShardMiddleware:
+    """
+    Escolhe o shard do utilizador autenticado: o do próprio gerente ou o do
+    gerente do inquilino. O resultado fica guardado na sessão.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not shards_configurados() or not request.user.is_authenticated:
+            return self.get_response(request)
+
+        gerente_id = request.session.get('gerente_shard')
+        if gerente_id is None:
+            gerente_id = self._localizar(request.user)
+            if gerente_id is not None:
+                request.session['gerente_shard'] = gerente_id
+
+        with usar_gerente(gerente_id):
+            return self.get_response(request)
+
+    def _localizar(self, user):
+        from administrador.models import Gerente
+        from gerente.models import Inquilino
+
+        gerente_id = Gerente.objects.filter(user=user).values_list('id', flat=True).first()
+        if gerente_id is not None:
+            return gerente_id
+        for alias in todas_as_bases():
+            gerente_id = (
+                Inquilino.objects.using(alias).filter(user=user)
+                .values_list('gerente_id', flat=True).first()
+            )
+            if gerente_id is not None:
+                return gerente_id
+        return None
+
+
+@receiver(post_save, sender='auth.User')
+@receiver(post_save, sender='administrador.Gerente')
+def replicar_para_shards(sender, instance, using, raw=False, **kwargs):
+    """
+    Mantém atualizadas as cópias de utilizadores e gerentes nos shards que
+    já as têm, e copia para o shard atual as linhas criadas durante o pedido
+    (por exemplo, o User de um inquilino novo).
+    """
+    if raw or using != 'default' or not shards_configurados():
+        return
+    alvos = {
+        alias for alias in shards_configurados()
+        if sender._default_manager.using(alias).filter(pk=instance.pk).exists()
+    }
+    if gerente_atual.get() is not None:
+        alias = alias_do_gerente(gerente_atual.get())
+        if alias in settings.DATABASES:
+            alvos.add(alias)
+    for alias in alvos:
+        instance.save_base(using=alias, raw=True)
+    instance._state.db = using
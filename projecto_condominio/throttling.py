@@ -0,0 +1,170 @@
+"""
+Limitação das tentativas de login, antes de calcular o hash da password.
+
+Cada POST aos três login_* consome uma tentativa de dois limites: um por IP
+e outro por nome de utilizador. Cada limite permite CAPACIDADE tentativas
+seguidas e recupera POR_MINUTO tentativas por minuto (como um "token
+bucket"), por isso um utilizador normal nunca o atinge, mas uma rajada de
+tentativas é rejeitada sem chegar ao authenticate() (PBKDF2). Além disso,
+falhas consecutivas no mesmo IP ou utilizador bloqueiam novas tentativas
+durante um período que duplica a cada falha (backoff exponencial), até um
+máximo. Um login com sucesso só limpa as falhas do utilizador: as do IP
+ficam, para que uma conta válida não sirva para recomeçar as tentativas
+contra outras.
+
+O estado vive na cache partilhada ('default'), por isso é comum a todos os
+workers. Só se usam operações atómicas da cache (add, incr e decr): uma
+leitura seguida de escrita deixaria vários workers gastar o mesmo token.
+Cada limite é uma janela deslizante aproximada: o contador da janela atual
+mais a parte do contador da anterior que ainda cabe na janela, com janelas
+do tempo que um bucket vazio leva a encher. Os contadores (tentativas,
+rejeitadas, falhas, sucessos) podem ser consultados com
+`python manage.py contadores_login`.
+
+Os limites podem ser ajustados em settings.LOGIN_THROTTLE.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+PREDEFINICOES = {
+    # Tentativas seguidas permitidas e recarga (tentativas por minuto).
+    'IP_CAPACIDADE': 20,
+    'IP_POR_MINUTO': 10,
+    'UTILIZADOR_CAPACIDADE': 5,
+    'UTILIZADOR_POR_MINUTO': 2,
+    # Falhas consecutivas toleradas antes do backoff, e a sua escala.
+    'FALHAS_LIVRES': 3,
+    'BACKOFF_INICIAL': 2,
+    'BACKOFF_MAXIMO': 15 * 60,
+}
+
+CONTADORES = ('tentativas', 'rejeitadas', 'falhas', 'sucessos')
+
+PREFIXO = 'login'
+
+
+def _config(nome):
+    return getattr(settings, 'LOGIN_THROTTLE', {}).get(nome, PREDEFINICOES[nome])
+
+
+def _chaves(request, username):
+    """
+    Identificadores de IP e de utilizador. O nome é resumido com SHA-1 para
+    que a chave da cache tenha sempre um tamanho e caracteres válidos.
+    """
+    ip = request.META.get('REMOTE_ADDR') or 'desconhecido'
+    utilizador = hashlib.sha1((username or '').strip().lower().encode()).hexdigest()
+    return [('ip', ip), ('utilizador', utilizador)]
+
+
+def _incrementar(chave, timeout):
+    """
+    Incremento atómico de um contador da cache, criado a 0 se não existir.
+    """
+    cache.add(chave, 0, timeout=timeout)
+    try:
+        return cache.incr(chave)
+    except ValueError:
+        # A entrada expirou ou foi despejada entre o add() e o incr().
+        cache.add(chave, 1, timeout=timeout)
+        return 1
+
+
+def _contar(nome):
+    _incrementar(f'{PREFIXO}:contador:{nome}', None)
+
+
+def _consumir_token(tipo, valor, agora):
+    """
+    Conta uma tentativa e devolve 0, ou devolve os segundos até haver uma
+    tentativa disponível (e a tentativa não conta).
+    """
+    capacidade = _config(f'{tipo.upper()}_CAPACIDADE')
+    por_segundo = _config(f'{tipo.upper()}_POR_MINUTO') / 60
+    # Uma janela é o tempo que um bucket vazio leva a encher.
+    janela = capacidade / por_segundo
+    numero, decorrido = divmod(agora, janela)
+    chave = f'{PREFIXO}:bucket:{tipo}:{valor}'
+    atual = f'{chave}:{int(numero)}'
+
+    usadas = _incrementar(atual, timeout=math.ceil(janela * 2))
+    anteriores = cache.get(f'{chave}:{int(numero) - 1}', 0)
+    # As tentativas da janela anterior contam na proporção em que ainda a sobrepõem.
+    restante = 1 - decorrido / janela
+    if anteriores * restante + usadas <= capacidade:
+        return 0
+
+    # Devolve a tentativa: um cliente rejeitado não deve ficar mais tempo bloqueado.
+    try:
+        usadas = cache.decr(atual)
+    except ValueError:
+        usadas = 0
+    # Espera até a parte da janela anterior deixar lugar para mais uma; se a
+    # atual já está cheia, é a partir dela, na janela seguinte.
+    if usadas + 1 <= capacidade:
+        inicio, anteriores, livres = numero * janela, anteriores, capacidade - usadas - 1
+    else:
+        inicio, anteriores, livres = (numero + 1) * janela, usadas, capacidade - 1
+    disponivel = inicio + janela * max(0, 1 - livres / anteriores)
+    return max(1, math.ceil(disponivel - agora))
+
+
+def tempo_de_espera(request, username):
+    """
+    Chamado antes do authenticate(). Devolve 0 se a tentativa pode seguir, ou
+    os segundos que o cliente tem de esperar (a tentativa é rejeitada).
+    """
+    agora = time.time()
+    _contar('tentativas')
+    chaves = _chaves(request, username)
+
+    espera = 0
+    for tipo, valor in chaves:
+        bloqueado_ate = cache.get(f'{PREFIXO}:bloqueio:{tipo}:{valor}', 0)
+        espera = max(espera, math.ceil(bloqueado_ate - agora))
+    if espera <= 0:
+        espera = max(_consumir_token(tipo, valor, agora) for tipo, valor in chaves)
+
+    if espera > 0:
+        _contar('rejeitadas')
+    return max(espera, 0)
+
+
+def registar_resultado(request, username, sucesso):
+    """
+    Chamado depois do authenticate(). Uma falha aumenta o número de falhas
+    consecutivas do IP e do utilizador (e, passado o limite, o bloqueio); um
+    sucesso limpa as do utilizador.
+    """
+    _contar('sucessos' if sucesso else 'falhas')
+    for tipo, valor in _chaves(request, username):
+        chave_falhas = f'{PREFIXO}:falhas:{tipo}:{valor}'
+        if sucesso:
+            if tipo == 'utilizador':
+                cache.delete_many([chave_falhas, f'{PREFIXO}:bloqueio:{tipo}:{valor}'])
+            continue
+
+        maximo = _config('BACKOFF_MAXIMO')
+        falhas = _incrementar(chave_falhas, timeout=maximo * 2)
+        # O prazo conta a partir da última falha, e não da primeira.
+        cache.touch(chave_falhas, timeout=maximo * 2)
+        excesso = falhas - _config('FALHAS_LIVRES')
+        if excesso > 0:
+            bloqueio = min(maximo, _config('BACKOFF_INICIAL') * 2 ** (excesso - 1))
+            cache.set(f'{PREFIXO}:bloqueio:{tipo}:{valor}', time.time() + bloqueio, timeout=bloqueio)
+
+
+def contadores():
+    """
+    Totais acumulados desde o último reinício dos contadores.
+    """
+    valores = cache.get_many([f'{PREFIXO}:contador:{nome}' for nome in CONTADORES])
+    return {nome: valores.get(f'{PREFIXO}:contador:{nome}', 0) for nome in CONTADORES}
+
+
+def reiniciar_contadores():
+    cache.delete_many([f'{PREFIXO}:contador:{nome}' for nome in CONTADORES])
@@ -2,10 +2,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 
+from . import views
+
 urlpatterns = [
     path("", TemplateView.as_view(template_name='home.html'), name='home'),
     path("admin/", admin.site.urls),
     path('administrador/',include('administrador.urls')),
     path('gerente/',include('gerente.urls')),
     path('inquilino/',include('inquilino.urls')),
+    path('pesquisa/', views.pesquisar, name='pesquisa'),
 ]
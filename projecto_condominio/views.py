@@ -0,0 +1,54 @@
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseForbidden, JsonResponse
+from django.urls import reverse
+
+from administrador.models import Gerente
+from administrador.views import is_admin
+from gerente.views import is_gerente
+from . import pesquisa
+
+TIPOS = {'predio': 'Prédio', 'casa': 'Casa', 'inquilino': 'Inquilino'}
+
+
+def _url_do_resultado(documento, administrador):
+    if administrador:
+        if documento.tipo in ('predio', 'casa'):
+            return reverse('editar_predio', args=[documento.predio_id])
+        if documento.gerente_id is not None:
+            return reverse('editar_gerente', args=[documento.gerente_id])
+        return None
+    if documento.tipo == 'predio':
+        return reverse('ver_casas')
+    if documento.tipo == 'casa':
+        return reverse('editar_casa', args=[documento.id])
+    return reverse('editar_inquilino', args=[documento.id])
+
+
+@login_required(login_url='home')
+def pesquisar(request):
+    """
+    Pesquisa global (JSON) de prédios, casas e inquilinos. O administrador
+    pesquisa em tudo; um gerente só no seu portfólio.
+    """
+    administrador = is_admin(request.user)
+    if administrador:
+        ambito = pesquisa.TODOS
+    elif is_gerente(request.user):
+        try:
+            ambito = request.user.gerente.id
+        except Gerente.DoesNotExist:
+            return JsonResponse({'resultados': []})
+    else:
+        return HttpResponseForbidden()
+
+    termo = request.GET.get('q', '').strip()[:100]
+    resultados = [
+        {
+            'tipo': TIPOS[documento.tipo],
+            'texto': documento.texto,
+            'detalhe': documento.detalhe,
+            'url': _url_do_resultado(documento, administrador),
+        }
+        for documento in pesquisa.pesquisar(termo, ambito)
+    ]
+    return JsonResponse({'resultados': resultados})
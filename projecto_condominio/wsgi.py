@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "projecto_condominio.settings")
 
 application = get_wsgi_application()
+
+# Com PREPARAR_NO_ARRANQUE (variável de ambiente DJANGO_PREPARAR_NO_ARRANQUE=1),
+# aquece as views e os templates e constrói o índice da pesquisa antes do
+# primeiro pedido (projecto_condominio/arranque.py).
+from projecto_condominio.arranque import preparar_worker  # noqa: E402
+
+preparar_worker()